@@ -34,30 +34,26 @@
 
 import copy
 import logging
+import re
 import numpy as np
+from collections import OrderedDict
 import inkex
 from svgutils.compose import *
-from mapping_commands import CommandExport
 
 from utils import *
 from ref_and_specs import *
 from configuration_file import *
 from mg_maths import *
+from icon_cache import *
+from validation import *
+from memory_guard import *
+from progress import *
+from renderers import *
+from splicing import *
+from pruning import *
 
 #######################################################################################################################
 
-def get_command_names(mappings, logit):
-    """
-    Get all commands in mappings
-    Each mapping has the form 
-    """
-    command_names = list()
-    for mapping in mappings :
-        for command in get_mapping_commands(mapping, logit) :
-            if command not in command_names :
-                command_names.append(command)
-    return command_names
-    
 def get_text_marker_pairs(command, logit):
     """
     Get a list of text and marker pairs
@@ -111,10 +107,9 @@ def set_transform_matrix(element, TS_matrix):
     transform = inkex.transforms.Transform()
     matrix = [[x for x in row] for row in TS_matrix]
     transform._set_matrix(matrix)
-    # Set the new transform matrix
-    hexad = list(transform.to_hexad())
-    new_transform = f"matrix({hexad[0]},{hexad[1]},{hexad[2]},{hexad[3]},{hexad[4]},{hexad[5]})"
-    element.set('transform', new_transform)
+    # Set the new transform matrix in the same format whether 
+    # the element is already in the document or not
+    element.set('transform', str(transform))
 
 def reset_commands(layer_ref):
     """
@@ -140,22 +135,31 @@ def compute_new_style(original_style, style_combination, logit) :
 
 #######################################################################################################################
 
-def add_command_to_layer(layer_ref, new_command, logit):
+def get_command_placeholder(layer_ref):
     """
-    Add a command to a layer
+    Return the placeholder of the command in a layer
     """
     # Find child of layer with 'mgrep-path-element' with 
-    # the value of 'start-command', 'end-command' or 'command'
-    start_command = layer_ref.source.find(f".//*[@mgrep-path-element='start-command']")
-    end_command = layer_ref.source.find(f".//*[@mgrep-path-element='end-command']")
-    command = layer_ref.source.find(f".//*[@mgrep-path-element='command']")
-    
-    commands = [start_command, end_command, command]
-    
-    for cmd in commands :
+    # the value of 'start-command', 'end-command' or 'command'.
+    # The command is moved to each of them in turn
+    # and thus ends on the last one found
+    command_placeholder = None
+    for path_element in [START_COMMAND, END_COMMAND, COMMAND] :
+        cmd = layer_ref.source.find(f".//*[@mgrep-path-element='{path_element}']")
         if cmd is not None :
-            # Insert the new command before the current command
-            move_command_to_placeholder(cmd, new_command, logit)
+            command_placeholder = cmd
+    return command_placeholder
+
+def place_command(command_placeholder, new_command, logit, label=None):
+    """
+    Move a command to its placeholder and its texts to their markers,
+    or add its outlined label if given
+    """
+    translation = get_placeholder_translation(command_placeholder, new_command)
+    move_command_to_placeholder(command_placeholder, new_command, logit)
+    if label is not None :
+        add_label(new_command, label, translation)
+        return
     
     # The text origin and transform matrix is 
     # overwritten by the insertion. 
@@ -166,6 +170,50 @@ def add_command_to_layer(layer_ref, new_command, logit):
     for text, marker in text_marker_pairs :
         move_text_to_marker(text, marker, logit)
             
+def get_placeholder_translation(command_placeholder, new_command):
+    """
+    Return the translation from the centroid of the command icon template to the placeholder
+    """
+    placeholder_centroid = np.array([float(command_placeholder.get('cx')), float(command_placeholder.get('cy'))])
+    template = new_command.find(".//*[@mgrep-icon='template']")
+    template_centroid = np.array([float(template.get('cx')), float(template.get('cy'))])
+    return placeholder_centroid - template_centroid
+
+def get_label_id(command):
+    """
+    Return the id of the outlined label of a command
+    """
+    return f"mgrep-label-{command}"
+
+def get_label_texts(command_icon):
+    """
+    Return the visible texts of a command icon
+    """
+    return [text for text in command_icon.xpath(".//svg:text[@mgrep-command]", namespaces=inkex.NSS)
+            if "display:none" not in (text.get('style') or "")]
+
+def get_composed_transform(element, ancestor):
+    """
+    Return the transform from the coordinates of an element to the ones of one of its ancestors
+    """
+    transform = inkex.Transform()
+    while element is not ancestor :
+        transform = inkex.Transform(element.get('transform')) @ transform
+        element = element.getparent()
+    return transform
+
+def add_label(command_icon, label, translation=None):
+    """
+    Add the outlined label of a command to its icon, translated if wanted
+    """
+    label_group = etree.fromstring(label)
+    if translation is not None :
+        translated_group = etree.SubElement(command_icon, inkex.addNS('g', 'svg'))
+        translated_group.set('transform', str(inkex.Transform(translate=tuple(translation))))
+        translated_group.append(label_group)
+    else :
+        command_icon.append(label_group)
+
 def move_command_to_placeholder(command_placeholder, new_command, logit):
     """
     Move the command to the placeholder
@@ -179,31 +227,106 @@ def move_command_to_placeholder(command_placeholder, new_command, logit):
     
     # Get translation to apply to the command icon to match the centroid of the command icon template        
     T_matrix = get_translation_matrix(command_centroid, placeholder_centroid)
+    apply_matrix_to_xml(new_command, T_matrix, logit)
+
+def get_command_definition_id(command):
+    """
+    Return the id of the definition of a command icon
+    """
+    return f"mgrep-command-{command}"
+
+def create_command_use(command_placeholder, command_definition):
+    """
+    Create a hidden <use> element next to the placeholder, translated 
+    so that the command definitions it refers to match the placeholder
+    """
+    placeholder_centroid = np.array([float(command_placeholder.get('cx')), float(command_placeholder.get('cy'))])
+    template = command_definition.find(".//*[@mgrep-icon='template']")
+    template_centroid = np.array([float(template.get('cx')), float(template.get('cy'))])
     
-    for xml in new_command.findall(".//{*}path") :
-        parsed_path = svg.path.parse_path(xml.get("d"))
-        parsed_path = apply_matrix_to_path(parsed_path, [], T_matrix, logit)
-        xml.set('d', parsed_path.d())
-    for xml in new_command.findall(".//{*}circle") :
-        path_cx = xml.get("cx")
-        path_cy = xml.get("cy")
-        circle = compute_point_transformation(convert_to_complex(path_cx, path_cy), [], T_matrix, logit)
-        xml.set("cx", str(circle.real))
-        xml.set("cy", str(circle.imag))
-        
+    command_use = inkex.Use()
+    command_use.set('transform', str(inkex.Transform(translate=tuple(placeholder_centroid - template_centroid))))
+    command_use.set('style', "display:none")
+    parent = command_placeholder.getparent()
+    parent.insert(parent.index(command_placeholder)+1, command_use)
+    return command_use
+
+def add_command_to_placeholder(command_placeholder, placed_command):
+    """
+    Add a placed command to the document next to its placeholder
+    """
     # Add child to the parent of the template layer
     # The +1 is to insert the icon above the template
     #element to make our icon visible
     parent = command_placeholder.getparent()
-    parent.insert(parent.index(command_placeholder)+1, new_command)
+    parent.insert(parent.index(command_placeholder)+1, placed_command)
+
+DECIMAL_NUMBER = re.compile(r"-?\d*\.\d+(?:[eE][-+]?\d+)?")
+
+def trim_numbers(value, precision) :
+    """
+    Return the given attribute value with its decimal numbers rounded to the given precision
+    """
+    def trim(match) :
+        number = f"{float(match.group(0)):.{precision}f}".rstrip("0").rstrip(".")
+        return "0" if number in ["", "-0"] else number
+    return DECIMAL_NUMBER.sub(trim, value)
+
+def minify_element(element, precision) :
+    """
+    Round the coordinates of the paths of an element and remove its hidden command markers and texts
+    """
+    for path in element.iter(f"{{{inkex.NSS['svg']}}}path") :
+        if path.get('d') is not None :
+            path.set('d', trim_numbers(path.get('d'), precision))
+    remove_hidden_command_parts(element)
+
+def remove_hidden_command_parts(element) :
+    """
+    Remove the hidden markers and texts of the command icons under an element
+    """
+    for hidden in element.xpath(".//*[@mgrep-command and contains(@style, 'display:none')]") :
+        hidden.getparent().remove(hidden)
+
+#######################################################################################################################
+
+class PlacementCache(object):
+    """
+    A least recently used cache of the commands already placed on their placeholders.
+    The placed commands are the same during a run : each mapping only inserts copies of them.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+    
+    def get(self, key, place) :
+        """
+        Return a copy of the placed command of the given key, placing it if needed
+        """
+        placed_command = self.entries.get(key)
+        if placed_command is None :
+            placed_command = place()
+            if self.max_size <= 0 :
+                return placed_command
+            self.entries[key] = placed_command
+            if len(self.entries) > self.max_size :
+                self.entries.popitem(last=False)
+        else :
+            self.entries.move_to_end(key)
+        return copy.deepcopy(placed_command)
 
 #######################################################################################################################
 
 class ComputeSVG():
-    def __init__(self, export: CommandExport):
+    def __init__(self, export: "CommandExport"):
         self.export = export
         # Get the name of the svg file
         self.svg_name = self.export.svg.name.split(".")[0]
+        # Outlined labels of the commands, if converted
+        self.labels = dict()
+        self.splicer = None
+        self.command_boxes = dict()
         
     def compute(self):
         """
@@ -215,25 +338,292 @@ class ComputeSVG():
         logit = logging.warning if self.export.options.debug else logging.info
         logit(f"Options: {str(self.export.options)}")
         
+        mappings = self.prepare(logit)
+        try :
+            self.export_mappings(mappings, logit)
+        finally :
+            self.remove_definitions()
+    
+    def export_mappings(self, mappings, logit) :
+        """
+        Export the given mappings of the prepared document
+        """
+        self.export.output.start(mappings, self.get_mapping_label)
+        # Mappings only differing on gestures without command placeholder look the same
+        groups = MappingGroups(mappings, self.get_drawn_slots())
+        logit(f"{len(groups)} distinct renders for {len(mappings)} mappings")
+        self.export.progress.start(len(mappings), len(groups))
+        self.export.reset_previews()
+        memory_guard = MemoryGuard(self.export.options.max_memory, logit)
+        self.splicer = self.create_splicer(logit) if self.export.options.splice else None
+        if self.export.has_previews() :
+            # Every mapping is first quickly rendered at a low resolution
+            logit(f"Rendering the previews at {self.export.options.preview_dpi:g} dpi")
+            for mapping in groups.get_rendered_mappings() :
+                self.export_mapping(mapping, self.export.preview, logit)
+                memory_guard.check(self.export.scheduler)
+        for mapping in groups.get_rendered_mappings() :
+            # Actually do the export into the destination path.
+            logit(f"Exporting {self.get_mapping_label(mapping)}")
+            self.export_mapping(mapping, self.export.export, logit)
+            memory_guard.check(self.export.scheduler)
+        
+        # The other mappings of each group point to the files of the rendered one
+        self.export.scheduler.wait()
+        for mapping, equivalent_mapping in groups.get_equivalent_mappings() :
+            self.export.output.alias(self.get_mapping_label(equivalent_mapping), self.get_mapping_label(mapping))
+            self.export.progress.aliased()
+    
+    def export_mapping(self, mapping, export, logit) :
+        """
+        Build the document of a mapping and export it with the given function of the export
+        """
+        if len(self.export.crop_boxes) > 0 :
+            self.export.mapping_crop_boxes[self.get_mapping_label(mapping)] = self.get_crop_boxes(mapping, logit)
+        if self.splicer is not None :
+            with self.export.progress.time(SERIALIZE) :
+                svg_document = self.splice_mapping(mapping, logit)
+            export(self.get_mapping_label(mapping), logit, svg_document)
+            return
+        with self.export.progress.time(BUILD) :
+            self.change_mapping(mapping, logit)
+        export(self.get_mapping_label(mapping), logit)
+        # Release the command subtrees of the mapping before the next one
+        self.reset_mapping()
+    
+    def create_splicer(self, logit) :
+        """
+        Return the splicer assembling the documents of the mappings from 
+        the document split around the command placeholders
+        """
+        if self.export.options.use_defs :
+            raise RuntimeError("The documents using <defs> only change references, they cannot be spliced")
+        placeholders = OrderedDict()
+        for mg_layer_refs in self.mg_layer_refs.values() :
+            for charac_layer_refs in mg_layer_refs.values() :
+                for layer_ref in charac_layer_refs :
+                    command_placeholder = get_command_placeholder(layer_ref)
+                    if command_placeholder is not None :
+                        placeholders[layer_ref] = command_placeholder
+        return DocumentSplicer(self.export.document, placeholders, logit)
+    
+    def splice_mapping(self, mapping, logit) :
+        """
+        Return the serialized svg of a mapping assembled by the splicer, without changing the document
+        """
+        fragments = dict()
+        for mg_charac, command in mapping :
+            mg, charac = mg_charac
+            for layer_ref in self.mg_layer_refs.get(mg, dict()).get(charac, []) :
+                command_placeholder = self.splicer.placeholders.get(layer_ref)
+                if command_placeholder is None :
+                    continue
+                key = (command, layer_ref.id, command_placeholder.get('id'))
+                fragments[layer_ref] = self.splicer.get_fragment(layer_ref, key, 
+                    lambda : self.create_placed_command(command, command_placeholder, logit))
+        return self.splicer.assemble(fragments)
+    
+    def prepare(self, logit) :
+        """
+        Index the layers of the document, load the mappings 
+        and the command icons, and return the mappings
+        """
+        self.index_document(logit)
+        self.minify_document(logit)
+        self.prune_document(logit)
+        # Get a dictionnary of the wanted diversified styles with their characteristics
+        # checked against the layers and the icons before anything is rendered
+        rows = get_configuration_rows(self.export.options.config, logit)
+        available_icons = get_available_icons(self.export.options.icon, self.export.options.icon_cache, logit)
+        mappings = check_configuration(rows, self.mg_layer_refs, available_icons, logit)
+        # Get all commands in mappings
+        command_names = get_command_names(mappings, logit)
+        self.load_icons(command_names, logit)
+        return mappings
+    
+    def index_document(self, logit) :
+        """
+        Index the microgesture layers of the document
+        """
         # Get a dictionnary of each exported family with their
         # element layers also put in a dictionnary corresponding 
         # to the element considered
         layer_refs = self.get_document_layer_refs(logit)
         self.mg_layer_refs = get_mg_layer_refs(layer_refs, logit)
+    
+    def minify_document(self, logit) :
+        """
+        Round the coordinates of the paths of the document once for all the mappings if wanted
+        """
+        if self.export.options.minify :
+            logit(f"Rounding the path coordinates to {self.export.options.precision} decimals")
+            minify_element(self.export.document.getroot(), self.export.options.precision)
+    
+    def prune_document(self, logit) :
+        """
+        Remove what is never rendered from the document once for all the mappings if wanted
+        """
+        if self.export.options.prune :
+            original_size = len(etree.tostring(self.export.document))
+            removed = prune_svg(self.export.document.getroot())
+            pruned_size = len(etree.tostring(self.export.document))
+            logit(f"Pruned {removed} elements, the document went from {original_size} to {pruned_size} bytes "
+                  f"({100 * (1 - pruned_size / max(original_size, 1)):.1f}% smaller)")
+    
+    def load_icons(self, command_names, logit) :
+        """
+        Load the command template and the icons of the given commands
+        """
+        self.icon_library = IconLibrary.load(TEMPLATE_PATH, self.export.options.icon, command_names, 
+                                             self.export.options.icon_cache, logit)
+        self.placement_cache = PlacementCache(self.export.options.placement_cache)
+        self.labels = self.outline_labels(command_names, logit) if self.export.options.outline_text else dict()
+        if self.export.options.use_defs :
+            self.define_commands(command_names, logit)
+    
+    def outline_labels(self, command_names, logit) :
+        """
+        Convert the labels of the command icons to paths once for all the mappings,
+        already moved to their markers, and return them by command
+        """
+        labels_document = etree.Element(inkex.addNS('svg', 'svg'), nsmap={None: inkex.NSS['svg']})
+        for command in command_names :
+            command_icon = self.create_command(command, logit)
+            for text, marker in get_text_marker_pairs(command_icon, logit) :
+                move_text_to_marker(text, marker, logit)
+            label_group = etree.SubElement(labels_document, inkex.addNS('g', 'svg'))
+            label_group.set('id', get_label_id(command))
+            for text in get_label_texts(command_icon) :
+                text.set('transform', str(get_composed_transform(text, command_icon)))
+                text.set('id', f"{text.get('id')}-{command}")
+                label_group.append(text)
         
-        # Get a dictionnary of the wanted diversified styles with their characteristics
-        mappings = get_mappings(self.export.options.config, logit)
-        # Get all commands in mappings
-        command_names = get_command_names(mappings, logit)
-        # Add the command icons to the svg
-        self.command_template_ref = self.get_svg_layers_ref("./Icon/Icon.svg", logit)[0]
-        self.icon_SVG_refs = self.get_icon_SVGs_refs(self.export.options.icon, command_names, logit)
+        try :
+            outlined_document = etree.fromstring(convert_text_to_paths(etree.tostring(labels_document), 
+                                                                       self.export.options.timeout))
+        except (OSError, subprocess.SubprocessError, etree.XMLSyntaxError) as error :
+            logging.warning(f"Could not convert the command labels to paths, the texts are kept: {error}")
+            return dict()
+        
+        labels = dict()
+        for command in command_names :
+            label_group = outlined_document.find(f".//*[@id='{get_label_id(command)}']")
+            if label_group is None or len(label_group.xpath(".//svg:text", namespaces=inkex.NSS)) > 0 :
+                logging.warning(f"The label of the {command} command was not converted to paths, its text is kept")
+                continue
+            del label_group.attrib['id']
+            label_group.tail = None
+            labels[command] = etree.tostring(label_group)
+        logit(f"Converted the labels of {len(labels)} command icons to paths")
+        return labels
+    
+    def define_commands(self, command_names, logit) :
+        """
+        Add each command icon to the <defs> of the document once, and a hidden <use>
+        next to each placeholder, whose reference is changed for each mapping
+        """
+        command_definitions = []
+        for command in command_names :
+            command_definition = self.create_command(command, logit)
+            if command in self.labels :
+                add_label(command_definition, self.labels[command])
+            for text, marker in get_text_marker_pairs(command_definition, logit) :
+                move_text_to_marker(text, marker, logit)
+            if self.export.options.minify :
+                minify_element(command_definition, self.export.options.precision)
+            elif self.export.options.prune :
+                remove_hidden_command_parts(command_definition)
+            command_definition.set('id', get_command_definition_id(command))
+            command_definition.set('mgrep-command', "definition")
+            self.export.svg.defs.append(command_definition)
+            command_definitions.append(command_definition)
+        logit(f"Defined {len(command_definitions)} command icons")
         
-        for mapping in mappings :
+        # The template is the same for every command, thus so is the translation of a placeholder
+        self.command_uses = dict()
+        for mg_layer_refs in self.mg_layer_refs.values() :
+            for charac_layer_refs in mg_layer_refs.values() :
+                for layer_ref in charac_layer_refs :
+                    command_placeholder = get_command_placeholder(layer_ref)
+                    if command_placeholder is not None and len(command_definitions) > 0 :
+                        self.command_uses[layer_ref] = create_command_use(command_placeholder, command_definitions[0])
+    
+    def get_crop_boxes(self, mapping, logit) :
+        """
+        Return the crop boxes of a mapping : the boxes of the cropped elements 
+        of the source document widened to the commands placed in them
+        """
+        crop_boxes = OrderedDict(self.export.crop_boxes)
+        if len(crop_boxes) == 0 :
+            return crop_boxes
+        margin = self.export.options.crop_margin
+        for mg_charac, command in mapping :
+            mg, charac = mg_charac
+            for layer_ref in self.mg_layer_refs.get(mg, dict()).get(charac, []) :
+                command_placeholder = get_command_placeholder(layer_ref)
+                if command_placeholder is None :
+                    continue
+                ancestor_ids = set(ancestor.get('id') for ancestor in command_placeholder.iterancestors())
+                for crop_id in ancestor_ids & set(crop_boxes) :
+                    command_box = self.get_command_box(command, layer_ref, command_placeholder, logit)
+                    if command_box is None :
+                        continue
+                    left, top, right, bottom = crop_boxes[crop_id]
+                    crop_boxes[crop_id] = (min(left, command_box.left - margin), min(top, command_box.top - margin),
+                                           max(right, command_box.right + margin), max(bottom, command_box.bottom + margin))
+        return crop_boxes
+    
+    def get_command_box(self, command, layer_ref, command_placeholder, logit) :
+        """
+        Return the bounding box in the user units of the page of a command placed 
+        on a placeholder, computed once per command and placeholder
+        """
+        key = (command, layer_ref.id, command_placeholder.get('id'))
+        if key not in self.command_boxes :
+            # The placed commands are not inkex elements, thus they are measured in a document of their own
+            wrapper = etree.Element(inkex.addNS('svg', 'svg'), nsmap={None: inkex.NSS['svg']})
+            group = etree.SubElement(wrapper, inkex.addNS('g', 'svg'))
+            group.set('transform', str(command_placeholder.getparent().composed_transform()))
+            group.append(self.create_placed_command(command, command_placeholder, logit))
+            self.command_boxes[key] = inkex.load_svg(etree.tostring(wrapper)).getroot()[0].bounding_box()
+        return self.command_boxes[key]
+    
+    def remove_definitions(self) :
+        """
+        Remove the command definitions and their <use> elements added to the document
+        """
+        for command_definition in self.export.svg.xpath('//*[@mgrep-command="definition"]') :
+            command_definition.getparent().remove(command_definition)
+        for command_use in getattr(self, "command_uses", dict()).values() :
+            if command_use.getparent() is not None :
+                command_use.getparent().remove(command_use)
+        self.command_uses = dict()
+    
+    def get_drawn_slots(self) :
+        """
+        Return the (microgesture, characteristic) slots having at least one command placeholder in the document
+        """
+        return set((mg, charac) for mg, charac_layer_refs in self.mg_layer_refs.items() 
+                   for charac, layer_refs in charac_layer_refs.items()
+                   if any(get_command_placeholder(layer_ref) is not None for layer_ref in layer_refs))
+    
+    def get_mapping_label(self, mapping) :
+        """
+        Return the label of the files exported for a mapping
+        """
+        return f"{get_mapping_name(mapping)}_{self.svg_name}"
+    
+    def build_mapping_document(self, mapping, logit) :
+        """
+        Return the serialized svg of a mapping
+        """
+        if self.splicer is not None :
+            return self.splice_mapping(mapping, logit)
+        try :
             self.change_mapping(mapping, logit)
-            # Actually do the export into the destination path.
-            logit(f"Exporting {get_mapping_name(mapping)}_{self.svg_name}")
-            self.export.export(f"{get_mapping_name(mapping)}_{self.svg_name}", logit)
+            return etree.tostring(self.export.document)
+        finally :
+            # A failed mapping must not leave its commands in the document shared by the next ones
             self.reset_mapping()
     
     def change_mapping(self, mapping, logit) :
@@ -243,14 +633,50 @@ class ComputeSVG():
         """
         for mg_charac, command in mapping :
            mg, charac = mg_charac
-           for layer_ref in self.mg_layer_refs[mg][charac] :
-                command_icon = self.create_command(command, logit)
-                add_command_to_layer(layer_ref, command_icon, logit)
+           for layer_ref in self.mg_layer_refs.get(mg, dict()).get(charac, []) :
+                if self.export.options.use_defs :
+                    self.show_command_use(layer_ref, command)
+                    continue
+                command_placeholder = get_command_placeholder(layer_ref)
+                if command_placeholder is None :
+                    continue
+                # Placeholder ids are not unique among the microgesture layers
+                # thus the placed commands are also identified by their layer
+                key = (command, layer_ref.id, command_placeholder.get('id'))
+                placed_command = self.placement_cache.get(key, lambda : self.create_placed_command(command, command_placeholder, logit))
+                add_command_to_placeholder(command_placeholder, placed_command)
+    
+    def create_placed_command(self, command, command_placeholder, logit) :
+        """
+        Create a command icon placed on the given placeholder
+        """
+        command_icon = self.create_command(command, logit)
+        place_command(command_placeholder, command_icon, logit, self.labels.get(command))
+        if self.export.options.minify :
+            minify_element(command_icon, self.export.options.precision)
+        elif self.export.options.prune :
+            # The markers and the hidden texts are only needed to place the texts
+            remove_hidden_command_parts(command_icon)
+        return command_icon
                 
+    def show_command_use(self, layer_ref, command) :
+        """
+        Show the given command on the placeholder of a layer through its <use>
+        """
+        command_use = self.command_uses.get(layer_ref)
+        if command_use is not None :
+            command_use.set(inkex.addNS('href', 'xlink'), f"#{get_command_definition_id(command)}")
+            command_use.attrib.pop('style', None)
+    
     def reset_mapping(self) :
         """
         Reset the mapping of the svg
         """
+        if self.export.options.use_defs :
+            for command_use in self.command_uses.values() :
+                command_use.attrib.pop(inkex.addNS('href', 'xlink'), None)
+                command_use.set('style', "display:none")
+            return
         for mg_layer_refs in self.mg_layer_refs.values() :
             for charac_layer_refs in mg_layer_refs.values() :
                 for layer_ref in charac_layer_refs :
@@ -261,7 +687,7 @@ class ComputeSVG():
         Create a command icon
         """
         # Copy the template
-        new_command_document = etree.fromstring(etree.tostring(self.command_template_ref.source))
+        new_command_document = etree.fromstring(self.icon_library.template)
         # Replace the command texts by the command name
         for text in new_command_document.xpath('//svg:text', namespaces=inkex.NSS) :
             textspan = text.xpath('.//svg:tspan', namespaces=inkex.NSS)[0]
@@ -282,34 +708,18 @@ class ComputeSVG():
         left.set("style", "display:none")
         right.set("style", "display:none")
         
+        # Outlined labels replace the texts, which are then not laid out at render time
+        if command in self.labels :
+            for text in new_command_document.xpath('//svg:text[@mgrep-command]', namespaces=inkex.NSS) :
+                text.getparent().remove(text)
+        
         # Get the centroid of the command icon template
         template = new_command_document.xpath('//svg:circle[@mgrep-icon="template"]', namespaces=inkex.NSS)[0]
         
-        # Get all layers of the command icon
-        icon = etree.fromstring(etree.tostring(self.icon_SVG_refs[command].source))
-        # Get the centroid of the command icon
-        icon_centroid = icon.xpath('//svg:circle[@mgrep-icon="centroid"]', namespaces=inkex.NSS)[0]
-        
         # Get xml of the layer with the attribute 'mgrep-icon' = 'command'
-        icon_xml = icon.xpath('//svg:g[@mgrep-icon="command"]', namespaces=inkex.NSS)[0]
+        # already translated to match the centroid of the command icon template
+        icon_xml = etree.fromstring(self.icon_library.icons[command])
         
-        # Get translation to apply to the command icon to match the centroid of the command icon template
-        template_point = np.array([float(template.get('cx')), float(template.get('cy'))])
-        icon_centroid_point = np.array([float(icon_centroid.get('cx')), float(icon_centroid.get('cy'))])
-        
-        T_matrix = get_translation_matrix(icon_centroid_point, template_point)
-        
-        for xml in icon_xml.findall(".//{*}path") :
-            parsed_path = svg.path.parse_path(xml.get("d"))
-            parsed_path = apply_matrix_to_path(parsed_path, [], T_matrix, logit)
-            xml.set('d', parsed_path.d())
-        for xml in icon_xml.findall(".//{*}circle") :
-            path_cx = xml.get("cx")
-            path_cy = xml.get("cy")
-            circle = compute_point_transformation(convert_to_complex(path_cx, path_cy), [], T_matrix, logit)
-            xml.set("cx", str(circle.real))
-            xml.set("cy", str(circle.imag))
-            
         # Add child to the parent of the template layer
         # The +1 is to insert the icon above the template
         #element to make our icon visible
@@ -322,19 +732,6 @@ class ComputeSVG():
         
         return new_command
     
-    def get_icon_SVGs_refs(self, icon_folder_path, command_names, logit):
-        """
-        Returns the command icon SVG template and the command icons
-        """
-        # Get the command icon SVG template
-        commands = dict()
-        
-        for command in command_names :
-            icon_SVG = self.get_svg_layers_ref(f"{icon_folder_path}/{command}.svg", logit)[0]
-            commands[command] = icon_SVG
-            
-        return commands
-        
     ###############################
     
     def get_document_layer_refs(self, logit) -> list:
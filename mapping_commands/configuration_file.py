@@ -34,10 +34,16 @@
 
 import itertools
 import csv
+import hashlib
 import os
+import re
 import sys
+from collections import OrderedDict
+
+import numpy as np
 
 from utils import *
+from enumeration import *
 
 #######################################################################################################################
 
@@ -71,6 +77,57 @@ def compute_all_mappings(mappings) :
             
     return [list(zip(mg_characs, p)) for p in itertools.permutations(commands)]
 
+class MappingGroups(object):
+    """
+    The mappings grouped by their commands on the drawn slots, the first mapping of each group
+    being rendered and the others being its equivalent mappings. Only the index of the rendered 
+    mapping of each mapping is kept, the mappings are iterated again to go through the groups.
+    """
+
+    def __init__(self, mappings, drawn_slots):
+        self.mappings = mappings
+        self.drawn_slots = drawn_slots
+        # A digest of the commands on the drawn slots stands for each mapping
+        digests = bytearray()
+        for mapping in mappings :
+            digests += hashlib.blake2b(self.get_key(mapping).encode("utf-8"), digest_size=16).digest()
+        _, first_indices, groups, sizes = np.unique(np.frombuffer(bytes(digests), dtype="V16"), 
+                                                    return_index=True, return_inverse=True, return_counts=True)
+        self.count = len(sizes)
+        self.rendered_indices = first_indices[groups]
+        self.has_equivalents = (sizes > 1)[groups]
+    
+    def __len__(self) :
+        return self.count
+    
+    def get_key(self, mapping) :
+        """
+        Return the name of the commands of the mapping on the drawn slots
+        """
+        return get_mapping_name(sorted((mg_charac, command) for mg_charac, command in mapping if mg_charac in self.drawn_slots))
+    
+    def get_rendered_mappings(self) :
+        """
+        Yield the first mapping of each group, in the order of the configuration
+        """
+        for index, mapping in enumerate(self.mappings) :
+            if self.rendered_indices[index] == index :
+                yield mapping
+    
+    def get_equivalent_mappings(self) :
+        """
+        Yield the (rendered mapping, equivalent mapping) pairs, only keeping 
+        the rendered mappings of the groups having equivalent mappings
+        """
+        rendered_mappings = dict()
+        for index, mapping in enumerate(self.mappings) :
+            if not self.has_equivalents[index] :
+                continue
+            if self.rendered_indices[index] == index :
+                rendered_mappings[index] = mapping
+            else :
+                yield rendered_mappings[self.rendered_indices[index]], mapping
+
 def get_mapping_name(mapping) :
     """
     Return a name to describe the given mapping
@@ -93,6 +150,18 @@ def get_mapping_commands(mapping, logit) :
         commands.append(command)
     return commands
 
+def get_command_names(mappings, logit):
+    """
+    Get all commands in mappings
+    Each mapping has the form 
+    """
+    command_names = list()
+    for mapping in mappings :
+        for command in get_mapping_commands(mapping, logit) :
+            if command not in command_names :
+                command_names.append(command)
+    return command_names
+
 def compute_default_mappings() :
     """
     Return the command mappings corresponding to the default configuration
@@ -103,29 +172,102 @@ def get_mappings(file_path, logit) :
     """
     Return the command mappings corresponding to the given configuration file if it exists and is valid
     """
+    return [parse_mapping_row(row) for _, row in get_configuration_rows(file_path, logit)]
+
+def has_configuration_file(file_path) :
+    """
+    Return whether a configuration file is given, the default value being a directory
+    """
+    return file_path != "" and not os.path.isdir(os.path.expanduser(file_path))
+
+class LazyRows(object):
+    """
+    Numbered rows read again from their source at each iteration, thus never all in memory
+    """
+
+    def __init__(self, read_rows, *args):
+        self.read_rows = read_rows
+        self.args = args
+    
+    def __iter__(self) :
+        return self.read_rows(*self.args)
+
+class LazyMappings(object):
+    """
+    The mappings of the rows of a configuration except the skipped lines, 
+    parsed again at each iteration, thus never all in memory
+    """
+
+    def __init__(self, rows, skipped_lines, count):
+        self.rows = rows
+        self.skipped_lines = skipped_lines
+        self.count = count
+    
+    def __len__(self) :
+        return self.count
+    
+    def __iter__(self) :
+        for line, row in self.rows :
+            if line not in self.skipped_lines :
+                yield parse_mapping_row(row)
+
+def get_configuration_rows(file_path, logit) :
+    """
+    Return the numbered rows of the given configuration file,
+    or the rows of the default configuration if no file is given.
+    The rows of a file are lazily read again at each iteration.
+    """
     logit(f"The given file is {file_path}")
+    if not has_configuration_file(file_path) :
+        logit("No configuration file given, using the default mappings")
+        return [(index+1, [f"{mg}_{charac}-{command}" for (mg, charac), command in mapping]) 
+                for index, mapping in enumerate(compute_default_mappings())]
+    if file_path[-5:] == ".json" :
+        enumerator = load_constraints(file_path)
+        if len(enumerator.forbidden) > MAX_COUNTED_PAIRS :
+            logit(f"More than {MAX_COUNTED_PAIRS} forbidden pairs, the mappings are counted by enumerating them")
+        logit(f"Enumerating the {enumerator.count()} mappings allowed by the constraints of {file_path}")
+        return LazyRows(get_rows_from_enumerator, enumerator)
     if file_path[-4:] != ".csv" :
-        logit(f"ERROR: The configuration file must be a csv file. The given file is {file_path}")
-        return compute_default_mappings()
-    else :
-        logit(f"Loading the configuration file {file_path}")
-        return get_mappings_from_file(file_path)
+        raise RuntimeError(f"The configuration file must be a csv or json file. The given file is {file_path}")
+    
+    logit(f"Loading the configuration file {file_path}")
+    return LazyRows(get_rows_from_file, os.path.expanduser(file_path))
 
-def get_mappings_from_file(file_path) :
+def get_rows_from_enumerator(enumerator) :
+    """
+    Yield the numbered rows of the mappings enumerated from constraints
     """
-    Return the command mappings corresponding to the given configuration file
+    for index, mapping in enumerate(enumerator) :
+        yield index+1, [f"{mg}_{charac}-{command}" for (mg, charac), command in mapping]
+
+def get_rows_from_file(file_path) :
+    """
+    Yield the non empty rows of the given configuration file with their line number
     """
-    mappings = []
     with open(file_path, 'r') as csvfile:
         reader = csv.reader(csvfile, delimiter=',')
         for row in reader:
-            combination = []
-            for mg_command in row:
-                mg_charac, command = mg_command.split('-')
-                mg, charac = mg_charac.split('_')
-                combination.append(((mg, charac), command))
-            mappings.append(combination)
-    return mappings
+            if len(row) > 0 :
+                yield reader.line_num, row
+
+def parse_mapping_row(row) :
+    """
+    Return the command mapping described by a row of the configuration file
+    of the form ["microgesture1_characteristic1-command1", "microgesture2_characteristic2-command2", ...]
+    """
+    combination = []
+    for mg_command in row:
+        mg_charac, command = mg_command.strip().split('-')
+        mg, charac = mg_charac.split('_')
+        combination.append(((mg, charac), command))
+    return combination
+
+def parse_mapping_name(name) :
+    """
+    Return the command mapping described by a name given by get_mapping_name
+    """
+    return [((mg, charac), command) for mg, charac, command in re.findall(r"([^_-]+)_([^_-]+)-([^_-]+)", name)]
 
 #######################################################################################################################
 
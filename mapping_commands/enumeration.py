@@ -0,0 +1,288 @@
+#! /usr/bin/env python3
+#######################################################################################################################
+#  Copyright (c) 2023 Vincent LAMBERT
+#  License: MIT
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+# 
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+# 
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+#
+#######################################################################################################################
+# NOTES
+#
+# Developing extensions:
+#   SEE: https://inkscape.org/develop/extensions/
+#   SEE: https://wiki.inkscape.org/wiki/Python_modules_for_extensions
+#   SEE: https://wiki.inkscape.org/wiki/Using_the_Command_Line
+#
+# Implementation References:
+#   SEE: https://github.com/nshkurkin/inkscape-export-layer-combos
+
+import csv
+import itertools
+import json
+import os
+import sys
+
+from utils import *
+
+#######################################################################################################################
+
+# Above this number of forbidden pairs, the count is done by enumerating
+# the mappings rather than by inclusion-exclusion over the pairs
+MAX_COUNTED_PAIRS = 16
+
+#######################################################################################################################
+
+def parse_slot(slot) :
+    """
+    Return the (microgesture, characteristic) of a slot of the form "microgesture_characteristic"
+    """
+    parts = slot.strip().split('_')
+    if len(parts) != 2 or "" in parts :
+        raise RuntimeError(f"The slot {slot} is not of the form microgesture_characteristic")
+    return tuple(parts)
+
+def parse_assignment(assignment) :
+    """
+    Return the (slot, command) of an assignment of the form "microgesture_characteristic-command"
+    """
+    parts = assignment.strip().split('-')
+    if len(parts) != 2 or parts[1] == "" :
+        raise RuntimeError(f"The assignment {assignment} is not of the form microgesture_characteristic-command")
+    return parse_slot(parts[0]), parts[1]
+
+def get_default_slots() :
+    """
+    Return every (microgesture, characteristic) slot
+    """
+    return [(mg, charac) for mg in MICROGESTURES for charac in MICROGESTURE_CHARACTERISTICS[mg]]
+
+def load_constraints(file_path) :
+    """
+    Return the enumerator of the mappings described by a json constraints file of the form
+    {"slots": ["tap_tip", ...], "commands": ["banana", ...], "size": 7, "pinned": {"tap_tip": "banana"}, 
+     "forbidden": [["tap_tip-banana", "swipe_up-kiwi"]], "allowed": {"swipe_up": ["kiwi", "plum"]}}
+    where every key is optional
+    """
+    with open(os.path.expanduser(file_path), 'r') as file :
+        constraints = json.load(file)
+    slots = [parse_slot(slot) for slot in constraints.get("slots", [])] or get_default_slots()
+    return MappingEnumerator(slots, 
+                             constraints.get("commands", COMMANDS), 
+                             constraints.get("size"), 
+                             dict((parse_slot(slot), command) for slot, command in constraints.get("pinned", dict()).items()),
+                             [tuple(parse_assignment(assignment) for assignment in pair) for pair in constraints.get("forbidden", [])],
+                             dict((parse_slot(slot), commands) for slot, commands in constraints.get("allowed", dict()).items()))
+
+#######################################################################################################################
+
+class MappingEnumerator():
+    """
+    Enumerate the mappings assigning distinct commands to `size` of the slots, 
+    with pinned assignments, forbidden pairs of assignments and allowed commands per slot
+    """
+    def __init__(self, slots, commands, size=None, pinned=None, forbidden=None, allowed=None) :
+        self.slots = list(slots)
+        self.commands = list(dict.fromkeys(commands))
+        self.size = len(self.slots) if size is None else size
+        self.pinned = dict(pinned or dict())
+        self.forbidden = list(forbidden or [])
+        allowed = allowed or dict()
+        self.check(allowed)
+        
+        # Commands each slot can take, as bitmasks over the commands
+        self.command_bits = dict((command, 1 << index) for index, command in enumerate(self.commands))
+        self.domains = []
+        for slot in self.slots :
+            domain = self.get_mask(allowed.get(slot, self.commands))
+            if slot in self.pinned :
+                domain &= self.command_bits[self.pinned[slot]]
+            self.domains.append(domain)
+        # A pinned command is taken by no other slot
+        for slot, command in self.pinned.items() :
+            for index, other_slot in enumerate(self.slots) :
+                if other_slot != slot :
+                    self.domains[index] &= ~self.command_bits[command]
+        # The assignments forbidden with each assignment, an assignment forbidden with itself is never done
+        self.conflicts = dict()
+        for first, second in self.forbidden :
+            if first == second :
+                self.domains[self.slots.index(first[0])] &= ~self.command_bits[first[1]]
+            self.conflicts.setdefault(first, []).append(second)
+            self.conflicts.setdefault(second, []).append(first)
+    
+    def check(self, allowed) :
+        """
+        Check that the constraints refer to the given slots and commands
+        """
+        if len(set(self.slots)) < len(self.slots) :
+            raise RuntimeError("The slots must be distinct")
+        if not 0 <= self.size <= len(self.slots) :
+            raise RuntimeError(f"The size of the mappings must be between 0 and {len(self.slots)}, not {self.size}")
+        if len(self.pinned) > self.size :
+            raise RuntimeError(f"{len(self.pinned)} pinned assignments do not fit in mappings of size {self.size}")
+        if len(set(self.pinned.values())) < len(self.pinned) :
+            raise RuntimeError("A command is pinned to several slots")
+        assignments = list(self.pinned.items()) + [assignment for pair in self.forbidden for assignment in pair]
+        assignments += [(slot, command) for slot, commands in allowed.items() for command in commands]
+        for slot, command in assignments :
+            if slot not in self.slots :
+                raise RuntimeError(f"Unknown slot {slot[0]}_{slot[1]} in the constraints")
+            if command not in self.commands :
+                raise RuntimeError(f"Unknown command {command} in the constraints")
+    
+    def get_mask(self, commands) :
+        """
+        Return the bitmask of the given commands
+        """
+        mask = 0
+        for command in commands :
+            mask |= self.command_bits[command]
+        return mask
+    
+    def get_commands(self, mask) :
+        """
+        Return the commands of a bitmask in the order of the commands
+        """
+        return [command for command in self.commands if mask & self.command_bits[command]]
+    
+    def __iter__(self) :
+        return self.enumerate()
+    
+    def enumerate(self) :
+        """
+        Lazily yield the valid mappings, in the order of the slots and of the commands.
+        Each assignment removes its command and its forbidden assignments from the domains 
+        of the next slots, and a branch is abandoned as soon as it cannot be completed
+        """
+        def search(index, domains, mapping) :
+            needed = self.size - len(mapping)
+            if needed == 0 :
+                if not any(slot in self.pinned for slot in self.slots[index:]) :
+                    yield list(mapping)
+                return
+            if not self.can_complete(index, domains, needed) :
+                return
+            slot = self.slots[index]
+            for command in self.get_commands(domains[index]) :
+                next_domains = self.propagate(index, command, domains)
+                if next_domains is not None :
+                    mapping.append((slot, command))
+                    yield from search(index+1, next_domains, mapping)
+                    mapping.pop()
+            # The slot is left out of the mapping if the others can still complete it
+            if slot not in self.pinned :
+                yield from search(index+1, domains, mapping)
+        
+        return search(0, self.domains, [])
+    
+    def can_complete(self, index, domains, needed) :
+        """
+        Return whether the slots from the given index can still take the needed number of distinct commands
+        """
+        remaining_domains = domains[index:]
+        if any(domain == 0 for slot, domain in zip(self.slots[index:], remaining_domains) if slot in self.pinned) :
+            return False
+        available = [domain for domain in remaining_domains if domain != 0]
+        union = 0
+        for domain in available :
+            union |= domain
+        return len(available) >= needed and bin(union).count("1") >= needed
+    
+    def propagate(self, index, command, domains) :
+        """
+        Return the domains of the slots after assigning a command to a slot,
+        or None if a pinned slot is left without command
+        """
+        bit = self.command_bits[command]
+        next_domains = list(domains)
+        for next_index in range(index+1, len(self.slots)) :
+            next_domains[next_index] &= ~bit
+        for other_slot, other_command in self.conflicts.get((self.slots[index], command), []) :
+            other_index = self.slots.index(other_slot)
+            if other_index > index :
+                next_domains[other_index] &= ~self.command_bits[other_command]
+        for next_index in range(index+1, len(self.slots)) :
+            if next_domains[next_index] == 0 and self.slots[next_index] in self.pinned :
+                return None
+        return next_domains
+    
+    #######################################################################################################################
+    
+    def count(self) :
+        """
+        Return the exact number of valid mappings without enumerating them, by inclusion-exclusion 
+        over the forbidden pairs of the number of mappings containing each set of pairs.
+        Beyond MAX_COUNTED_PAIRS forbidden pairs, the 2^n sets of pairs cost more than 
+        the enumeration, thus the mappings are enumerated to be counted
+        """
+        if len(self.forbidden) > MAX_COUNTED_PAIRS :
+            return sum(1 for _ in self.enumerate())
+        total = 0
+        for size in range(len(self.forbidden)+1) :
+            for pairs in itertools.combinations(self.forbidden, size) :
+                forced = dict()
+                if all(forced.setdefault(slot, command) == command for pair in pairs for slot, command in pair) :
+                    total += (-1) ** size * self.count_with(forced)
+        return total
+    
+    def count_with(self, forced) :
+        """
+        Return the number of mappings without forbidden pairs containing the forced assignments,
+        with a dynamic programming over the slots whose states are the bitmasks of the used commands
+        """
+        if len(set(forced.values())) < len(forced) :
+            return 0
+        counts = {0: 1}
+        for slot, domain in zip(self.slots, self.domains) :
+            if slot in forced :
+                domain &= self.command_bits[forced[slot]]
+            next_counts = dict()
+            for used, count in counts.items() :
+                # The slot is left out of the mapping
+                if slot not in self.pinned and slot not in forced :
+                    next_counts[used] = next_counts.get(used, 0) + count
+                free = domain & ~used
+                while free :
+                    bit = free & -free
+                    next_counts[used | bit] = next_counts.get(used | bit, 0) + count
+                    free ^= bit
+            counts = next_counts
+        return sum(count for used, count in counts.items() if bin(used).count("1") == self.size)
+
+#######################################################################################################################
+
+def _main():
+    if len(sys.argv) < 2 :
+        print("Usage: python enumeration.py CONSTRAINTS.json [--count | OUTPUT.csv]")
+        sys.exit(1)
+    enumerator = load_constraints(sys.argv[1])
+    if len(sys.argv) > 2 and sys.argv[2] == "--count" :
+        print(enumerator.count())
+        return
+    output = open(sys.argv[2], 'w', newline='') if len(sys.argv) > 2 else sys.stdout
+    writer = csv.writer(output, delimiter=',')
+    for mapping in enumerator :
+        writer.writerow([f"{mg}_{charac}-{command}" for (mg, charac), command in mapping])
+    if output is not sys.stdout :
+        output.close()
+
+if __name__ == "__main__":
+    _main()
+
+#######################################################################################################################
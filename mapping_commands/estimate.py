@@ -0,0 +1,184 @@
+#! /usr/bin/env python3
+#######################################################################################################################
+#  Copyright (c) 2023 Vincent LAMBERT
+#  License: MIT
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+# 
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+# 
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+#
+#######################################################################################################################
+# NOTES
+#
+# Developing extensions:
+#   SEE: https://inkscape.org/develop/extensions/
+#   SEE: https://wiki.inkscape.org/wiki/Python_modules_for_extensions
+#   SEE: https://wiki.inkscape.org/wiki/Using_the_Command_Line
+#
+# Implementation References:
+#   SEE: https://github.com/nshkurkin/inkscape-export-layer-combos
+
+import logging
+import random
+import subprocess
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from utils import *
+from configuration_file import *
+from icon_cache import *
+from validation import *
+from memory_guard import *
+from outputs import *
+
+#######################################################################################################################
+
+# Two-sided 95% Student t values by degrees of freedom, 1.96 beyond
+T_VALUES = {1 : 12.71, 2 : 4.30, 3 : 3.18, 4 : 2.78, 5 : 2.57, 6 : 2.45, 7 : 2.36, 8 : 2.31, 9 : 2.26}
+
+def get_stratified_sample(mappings, sample_size) :
+    """
+    Return the indices of a sample of the mappings stratified 
+    by the command of their first gesture
+    """
+    strata = OrderedDict()
+    count = 0
+    for index, mapping in enumerate(mappings) :
+        key = mapping[0][1] if len(mapping) > 0 else None
+        strata.setdefault(key, []).append(index)
+        count += 1
+    
+    generator = random.Random(0)
+    for indices in strata.values() :
+        generator.shuffle(indices)
+    
+    sample = []
+    depth = 0
+    while len(sample) < min(sample_size, count) :
+        for indices in strata.values() :
+            if depth < len(indices) and len(sample) < sample_size :
+                sample.append(indices[depth])
+        depth += 1
+    return sorted(sample)
+
+def get_confidence_interval(values) :
+    """
+    Return the mean of the values and its 95% confidence interval
+    """
+    mean = float(np.mean(values))
+    if len(values) < 2 :
+        return mean, mean, mean
+    margin = T_VALUES.get(len(values) - 1, 1.96) * float(np.std(values, ddof=1)) / np.sqrt(len(values))
+    return mean, max(mean - margin, 0), mean + margin
+
+def format_duration(seconds) :
+    """
+    Return a readable duration
+    """
+    seconds = int(round(seconds))
+    return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m{seconds % 60:02d}s"
+
+def format_size(size) :
+    """
+    Return a readable size
+    """
+    for unit in ["B", "KB", "MB", "GB"] :
+        if size < 1024 :
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+def run_render_commands(commands, document, timeout) :
+    """
+    Run the render commands of a mapping and return the output of the last one,
+    the functions of the in-process renderers being called like the scheduler does
+    """
+    output = document
+    for command in commands :
+        if callable(command) :
+            output = command(output)
+        else :
+            output = subprocess.run(command, input=output, capture_output=True, timeout=timeout, check=True).stdout
+    return output
+
+#######################################################################################################################
+
+def estimate_export(compute, logit) :
+    """
+    Check the configuration and render a small sample of its mappings
+    to project the time, disk space and memory needed by the full export
+    """
+    options = compute.export.options
+    compute.index_document(logit)
+    compute.minify_document(logit)
+    compute.prune_document(logit)
+    rows = get_configuration_rows(options.config, logit)
+    
+    # Check the references of the configuration
+    validation = validate_configuration(rows, compute.mg_layer_refs, get_available_icons(options.icon, options.icon_cache, logit), logit)
+    valid_mappings = validation.mappings
+    
+    report = [f"Estimate for {validation.row_count} mappings ({options.filetype}, {options.dpi} dpi, {options.workers} workers)"]
+    if len(validation.problems) > 0 or len(validation.warnings) > 0 :
+        report.append(str(validation))
+    if len(valid_mappings) == 0 :
+        report.append("  no mapping can be rendered")
+        logging.warning("\n".join(report))
+        return
+    
+    # Only one mapping of each group of equivalent mappings is rendered, the others are hardlinked
+    groups = MappingGroups(valid_mappings, compute.get_drawn_slots())
+    report.append(f"  distinct renders: {len(groups)}")
+    
+    # Render the sample
+    compute.load_icons(get_command_names(valid_mappings, logit), logit)
+    compute.export.output = SizeOutput()
+    build_times, render_times, sizes, document_sizes = [], [], [], []
+    sample = set(get_stratified_sample(groups.get_rendered_mappings(), options.estimate_samples))
+    sampled_mappings = [mapping for index, mapping in enumerate(groups.get_rendered_mappings()) if index in sample]
+    for mapping in sampled_mappings :
+        label = compute.get_mapping_label(mapping)
+        start = time.perf_counter()
+        document = compute.build_mapping_document(mapping, logit)
+        build_times.append(time.perf_counter() - start)
+        document_sizes.append(len(document))
+        
+        start = time.perf_counter()
+        for commands, on_output in compute.export.get_render_jobs(label) :
+            on_output(run_render_commands(commands, document, options.timeout))
+        render_times.append(time.perf_counter() - start)
+        sizes.append(compute.export.output.sizes.get(label, 0))
+    
+    # Project the sample on the whole configuration : the mappings are built
+    # one after the other while their renders run in parallel
+    count = len(groups)
+    workers = max(1, options.workers)
+    build = get_confidence_interval(build_times)
+    render = get_confidence_interval(render_times)
+    size = get_confidence_interval(sizes)
+    wall_times = [count * max(build[i], render[i] / min(workers, count)) for i in range(3)]
+    peak_memory = (get_peak_memory_usage() or 0) + 2 * workers * max(document_sizes)
+    
+    report.append(f"  sampled renders: {len(build_times)} (build {build[0]:.3f}s, render {render[0]:.3f}s per mapping)")
+    report.append(f"  wall time: {format_duration(wall_times[0])} ({format_duration(wall_times[1])} - {format_duration(wall_times[2])})")
+    report.append(f"  output size: {format_size(count * size[0])} ({format_size(count * size[1])} - {format_size(count * size[2])})")
+    report.append(f"  peak memory: {format_size(peak_memory)}")
+    logging.warning("\n".join(report))
+
+#######################################################################################################################
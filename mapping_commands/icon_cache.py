@@ -0,0 +1,335 @@
+#! /usr/bin/env python3
+#######################################################################################################################
+#  Copyright (c) 2023 Vincent LAMBERT
+#  License: MIT
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+# 
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+# 
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+#
+#######################################################################################################################
+# NOTES
+#
+# Developing extensions:
+#   SEE: https://inkscape.org/develop/extensions/
+#   SEE: https://wiki.inkscape.org/wiki/Python_modules_for_extensions
+#   SEE: https://wiki.inkscape.org/wiki/Using_the_Command_Line
+#
+# Implementation References:
+#   SEE: https://github.com/nshkurkin/inkscape-export-layer-combos
+
+import hashlib
+import os
+import pickle
+import sys
+
+import inkex
+import numpy as np
+from lxml import etree
+
+from utils import *
+from ref_and_specs import *
+from mg_maths import *
+
+#######################################################################################################################
+
+ICON_CACHE_VERSION = 1
+BUNDLE_ATTRIB = "mgrep-icon-bundle"
+BUNDLE_COMMAND_ATTRIB = "mgrep-bundle-command"
+BUNDLE_CENTROID_ATTRIB = "mgrep-bundle-centroid"
+# Key of the cached command list of a bundle, beside its compiled icons keyed by template centroid
+BUNDLE_COMMANDS_KEY = ("commands",)
+
+def get_file_stamp(file_path) :
+    """
+    Return the (modification time, size) stamp of a file
+    """
+    stat = os.stat(file_path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+def get_file_hash(file_path) :
+    """
+    Return the hash of the content of a file
+    """
+    with open(file_path, 'rb') as file :
+        return hashlib.sha1(file.read()).hexdigest()
+
+def get_point(element) :
+    """
+    Return the center of a circle element
+    """
+    return np.array([float(element.get('cx')), float(element.get('cy'))])
+
+def format_point(point) :
+    """
+    Return the string representation of a point used in the bundle attributes
+    """
+    return f"{point[0]},{point[1]}"
+
+def parse_point(point) :
+    """
+    Return the point described by a bundle attribute
+    """
+    return np.array([float(coordinate) for coordinate in point.split(",")])
+
+def get_first_layer(file_path) :
+    """
+    Return the first labelled layer of an SVG file
+    """
+    document = etree.parse(file_path)
+    for layer in document.xpath('//svg:g[@inkscape:groupmode="layer"]', namespaces=inkex.NSS) :
+        if LayerRef.get_layer_attrib_name(layer) in layer.attrib :
+            return layer
+    raise RuntimeError(f"The file '{file_path}' does not contain any layer")
+
+def is_icon_bundle(icon_path) :
+    """
+    Check if the given icon path is a bundle file instead of an icon folder
+    """
+    return os.path.isfile(icon_path)
+
+def get_icon_file(icon_folder_path, command) :
+    """
+    Return the path of the icon file of a command
+    """
+    return os.path.join(icon_folder_path, f"{command}.svg")
+
+def get_bundle_commands(bundle_path) :
+    """
+    Return the commands of the icons of a bundle file
+    """
+    bundle = etree.parse(bundle_path).getroot()
+    return sorted(bundle.xpath(f'./svg:g/@{BUNDLE_COMMAND_ATTRIB}', namespaces=inkex.NSS))
+
+def get_available_icons(icon_path, cache_dir, logit) :
+    """
+    Return the commands having an icon in the given icon folder or bundle,
+    the commands of a bundle being read from the compiled cache if it is up to date
+    """
+    icon_path = os.path.expanduser(icon_path)
+    if is_icon_bundle(icon_path) :
+        cache = CompiledCache(cache_dir, TEMPLATE_PATH, icon_path, logit)
+        commands = cache.get(icon_path, BUNDLE_COMMANDS_KEY, lambda : get_bundle_commands(icon_path))
+        cache.save()
+        return set(commands)
+    if os.path.isdir(icon_path) :
+        return set(file_name[:-4] for file_name in os.listdir(icon_path) if file_name.endswith(".svg"))
+    return set()
+
+#######################################################################################################################
+
+def compile_template(template_path, logit) :
+    """
+    Return the serialized command template layer
+    and the centroid of its icon placeholder
+    """
+    logit(f"Compiling the command template {template_path}")
+    layer = get_first_layer(template_path)
+    template = layer.xpath('.//svg:circle[@mgrep-icon="template"]', namespaces=inkex.NSS)[0]
+    return etree.tostring(layer), get_point(template)
+
+def compile_icon(icon_layer, template_point, logit) :
+    """
+    Return the serialized group with the attribute 'mgrep-icon' = 'command'
+    translated so that the icon centroid matches the template centroid
+    """
+    icon = etree.fromstring(etree.tostring(icon_layer))
+    icon_centroid = icon.xpath('//svg:circle[@mgrep-icon="centroid"]', namespaces=inkex.NSS)[0]
+    icon_xml = icon.xpath('//svg:g[@mgrep-icon="command"]', namespaces=inkex.NSS)[0]
+    
+    T_matrix = get_translation_matrix(get_point(icon_centroid), template_point)
+    apply_matrix_to_xml(icon_xml, T_matrix, logit)
+    return etree.tostring(icon_xml)
+
+def compile_icon_file(icon_file, template_point, logit) :
+    """
+    Return the compiled icon of an icon file
+    """
+    logit(f"Compiling the command icon {icon_file}")
+    return compile_icon(get_first_layer(icon_file), template_point, logit)
+
+def compile_icon_bundle(bundle_path, template_point, logit) :
+    """
+    Return the compiled icons of a bundle file in a dictionnary
+    The bundled icons are already translated, they are only
+    moved again if the bundle was made for another template
+    """
+    logit(f"Compiling the command icon bundle {bundle_path}")
+    bundle = etree.parse(bundle_path).getroot()
+    if BUNDLE_ATTRIB not in bundle.attrib :
+        raise RuntimeError(f"The file '{bundle_path}' is not a command icon bundle")
+    
+    icons = dict()
+    for entry in bundle.xpath(f'./svg:g[@{BUNDLE_COMMAND_ATTRIB}]', namespaces=inkex.NSS) :
+        icon_xml = entry.xpath('./svg:g[@mgrep-icon="command"]', namespaces=inkex.NSS)[0]
+        bundle_point = parse_point(entry.get(BUNDLE_CENTROID_ATTRIB))
+        if not np.allclose(bundle_point, template_point) :
+            T_matrix = get_translation_matrix(bundle_point, template_point)
+            apply_matrix_to_xml(icon_xml, T_matrix, logit)
+        icons[entry.get(BUNDLE_COMMAND_ATTRIB)] = etree.tostring(icon_xml)
+    return icons
+
+def create_icon_bundle(icon_folder_path, bundle_path, template_path, logit) :
+    """
+    Gather every icon of the icon folder in a single bundle file
+    """
+    _, template_point = compile_template(template_path, logit)
+    bundle = etree.Element(inkex.addNS("svg", "svg"), nsmap={None: inkex.NSS["svg"], "inkscape": inkex.NSS["inkscape"]})
+    bundle.set(BUNDLE_ATTRIB, str(ICON_CACHE_VERSION))
+    
+    for file_name in sorted(os.listdir(icon_folder_path)) :
+        if not file_name.endswith(".svg") :
+            continue
+        command = file_name[:-4]
+        icon_xml = etree.fromstring(compile_icon_file(os.path.join(icon_folder_path, file_name), template_point, logit))
+        entry = etree.SubElement(bundle, inkex.addNS("g", "svg"))
+        entry.set(BUNDLE_COMMAND_ATTRIB, command)
+        entry.set(BUNDLE_CENTROID_ATTRIB, format_point(template_point))
+        entry.set("style", "display:none")
+        entry.append(icon_xml)
+    
+    etree.ElementTree(bundle).write(bundle_path, xml_declaration=True, encoding="utf-8")
+
+#######################################################################################################################
+
+class IconLibrary(object):
+    """
+    The command template and the command icons, compiled once
+    and kept serialized so that each command can be copied at will.
+    The compiled sources are stored in an on-disk cache and only 
+    compiled again when their modification time and content changed.
+    """
+
+    def __init__(self, template, template_point, icons):
+        self.template = template
+        self.template_point = template_point
+        self.icons = icons
+
+    @staticmethod
+    def load(template_path, icon_path, command_names, cache_dir, logit) -> object:
+        """
+        Return the icon library of the given commands
+        """
+        icon_path = os.path.expanduser(icon_path)
+        cache = CompiledCache(cache_dir, template_path, icon_path, logit)
+        
+        template, template_point = cache.get(template_path, (), lambda : compile_template(template_path, logit))
+        point_key = tuple(template_point)
+        
+        if is_icon_bundle(icon_path) :
+            bundle = cache.get(icon_path, point_key, lambda : compile_icon_bundle(icon_path, template_point, logit))
+            icons = {command : bundle[command] for command in command_names if command in bundle}
+        else :
+            icons = dict()
+            for command in command_names :
+                icon_file = get_icon_file(icon_path, command)
+                icons[command] = cache.get(icon_file, point_key, lambda : compile_icon_file(icon_file, template_point, logit))
+        
+        cache.save()
+        return IconLibrary(template, template_point, icons)
+
+#######################################################################################################################
+
+class CompiledCache(object):
+    """
+    An on-disk cache of compiled sources.
+    Each entry is stored with the stamp and the hash of its 
+    source file : an entry is reused if its stamp did not change
+    or, if it did, if the content of the file is still the same.
+    The entries of an older content of a source are removed when it is compiled again.
+    """
+
+    def __init__(self, cache_dir, template_path, icon_path, logit):
+        self.logit = logit
+        self.entries = dict()
+        self.modified = False
+        self.cache_file = None
+        if not cache_dir :
+            return
+        
+        cache_dir = os.path.expanduser(cache_dir)
+        key = hashlib.sha1(f"{os.path.abspath(template_path)}|{os.path.abspath(icon_path)}".encode("utf-8")).hexdigest()
+        self.cache_file = os.path.join(cache_dir, f"icons-{key[:16]}.pickle")
+        if os.path.exists(self.cache_file) :
+            try :
+                with open(self.cache_file, 'rb') as file :
+                    content = pickle.load(file)
+                if content["version"] == ICON_CACHE_VERSION :
+                    self.entries = content["entries"]
+            except Exception as error :
+                logit(f"Ignoring the unreadable icon cache {self.cache_file}: {error}")
+
+    def get(self, file_path, key, compile_source) :
+        """
+        Return the compiled content of the given file, compiling it if needed
+        """
+        stamp = get_file_stamp(file_path)
+        entry = self.entries.get((file_path, key))
+        file_hash = None
+        if entry is not None :
+            if entry["stamp"] == stamp :
+                return entry["payload"]
+            file_hash = get_file_hash(file_path)
+            if entry["hash"] == file_hash :
+                entry["stamp"] = stamp
+                self.modified = True
+                return entry["payload"]
+        
+        if file_hash is None :
+            file_hash = get_file_hash(file_path)
+        payload = compile_source()
+        self.prune(file_path, file_hash)
+        self.entries[(file_path, key)] = {"stamp" : stamp, "hash" : file_hash, "payload" : payload}
+        self.modified = True
+        return payload
+    
+    def prune(self, file_path, file_hash) :
+        """
+        Remove the entries compiled from another content of the given file
+        """
+        for entry_key in [entry_key for entry_key, entry in self.entries.items() 
+                          if entry_key[0] == file_path and entry["hash"] != file_hash] :
+            del self.entries[entry_key]
+            self.modified = True
+    
+    def save(self) :
+        """
+        Write the cache on disk if it was modified
+        """
+        if self.cache_file is None or not self.modified :
+            return
+        os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+        temp_file = f"{self.cache_file}.{os.getpid()}.tmp"
+        with open(temp_file, 'wb') as file :
+            pickle.dump({"version" : ICON_CACHE_VERSION, "entries" : self.entries}, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_file, self.cache_file)
+        self.modified = False
+        self.logit(f"Icon cache written to {self.cache_file}")
+
+#######################################################################################################################
+
+def _main():
+    if len(sys.argv) < 3 :
+        print(f"Usage: {sys.argv[0]} ICON_FOLDER BUNDLE_FILE [TEMPLATE_FILE]")
+        exit(1)
+    template_path = sys.argv[3] if len(sys.argv) > 3 else TEMPLATE_PATH
+    create_icon_bundle(sys.argv[1], sys.argv[2], template_path, print)
+
+if __name__ == "__main__":
+    _main()
+
+#######################################################################################################################
@@ -36,13 +36,22 @@ import sys
 sys.path.append('/usr/share/inkscape/extensions')
 import inkex
 
-import copy
 import logging
 import os
-import tempfile
-import subprocess
+import threading
+from collections import OrderedDict
+from lxml import etree
 
 from compute_svg import *
+from estimate import *
+from watch import *
+from work_queue import *
+from render_queue import *
+from progress import *
+from outputs import *
+from rasters import *
+from renderers import *
+from utils import *
 
 #######################################################################################################################
 
@@ -55,102 +64,336 @@ class CommandExport(inkex.Effect):
         super().__init__()
         self.arg_parser.add_argument("--path", type=str, dest="path", default="~/", help="The directory to export into")
         self.arg_parser.add_argument('-f', '--filetype', type=str, dest='filetype', default='png', 
-                                     help='Exported file type. One of [png|jpeg|pdf]')
-        self.arg_parser.add_argument("--dpi", type=float, dest="dpi", default=90.0, help="DPI of exported image")
+                                     help='Exported file types separated by commas. Each one of [png|jpg|pdf|svg]')
+        self.arg_parser.add_argument("--outline_text", type=inkex.Boolean, dest="outline_text", default=False, help="Convert the command labels to paths once before the export")
+        self.arg_parser.add_argument("--splice", type=inkex.Boolean, dest="splice", default=False, help="Assemble the documents of the mappings from bytes serialized once")
+        self.arg_parser.add_argument("--use_defs", type=inkex.Boolean, dest="use_defs", default=False, help="Define each command icon once and reference it from the placeholders")
+        self.arg_parser.add_argument("--minify", type=inkex.Boolean, dest="minify", default=False, help="Round the path coordinates and remove the hidden command markers")
+        self.arg_parser.add_argument("--prune", type=inkex.Boolean, dest="prune", default=False, help="Remove the hidden elements, unused definitions and editor data from the rendered documents")
+        self.arg_parser.add_argument("--precision", type=int, dest="precision", default=3, help="Number of decimals kept in the path coordinates when minifying")
+        self.arg_parser.add_argument("--optimize_png", type=inkex.Boolean, dest="optimize_png", default=False, help="Recompress the exported PNG files")
+        self.arg_parser.add_argument("--png_level", type=int, dest="png_level", default=9, help="zlib level of the optimized PNG files")
+        self.arg_parser.add_argument("--png_filter", type=str, dest="png_filter", default="adaptive", help="Scanline filter of the optimized PNG files [none|sub|up|average|paeth|adaptive]")
+        self.arg_parser.add_argument("--png_colors", type=int, dest="png_colors", default=0, help="Number of colors of the palette of the optimized PNG files (0 to keep the colors)")
+        self.arg_parser.add_argument("--dpi", type=str, dest="dpi", default="90", help="DPIs of exported images separated by commas")
+        self.arg_parser.add_argument("--preview_dpi", type=float, dest="preview_dpi", default=0.0, help="DPI of the previews of the rasters rendered before them (0 for no preview)")
         self.arg_parser.add_argument("--temp", type=inkex.Boolean, dest="temp", default=True, help="SVG files used to export are temporary")
-        self.arg_parser.add_argument("--config", type=str, dest="config", default="~/", help="Configuration file used to export")
+        self.arg_parser.add_argument("--archive", type=str, dest="archive", default=NONE, help="Write the exported files in a single archive or NumPy dataset. One of [none|tar|zip|npy]")
+        self.arg_parser.add_argument("--config", type=str, dest="config", default="~/", help="Configuration file used to export (csv rows or json constraints, counted without enumerating them up to 16 forbidden pairs)")
         self.arg_parser.add_argument("--icon", type=str, dest="icon", default="~/", help="Icon folder")
+        self.arg_parser.add_argument("--icon_cache", type=str, dest="icon_cache", default=ICON_CACHE_DIR, help="Compiled icon cache folder (empty to disable)")
+        self.arg_parser.add_argument("--placement_cache", type=int, dest="placement_cache", default=512, help="Number of placed command icons kept in cache (0 to disable)")
+        self.arg_parser.add_argument("--workers", type=int, dest="workers", default=os.cpu_count() or 1, help="Number of renders running at once")
+        self.arg_parser.add_argument("--renderer", type=str, dest="renderer", default=INKSCAPE, help=f"Renderer of the exported files, one of {RENDERERS}")
+        self.arg_parser.add_argument("--renderer_tolerance", type=float, dest="renderer_tolerance", default=2.0, help="Mean difference per channel to the Inkscape raster allowed for the auto renderer")
+        self.arg_parser.add_argument("--timeout", type=float, dest="timeout", default=300.0, help="Time limit of each render in seconds")
+        self.arg_parser.add_argument("--retries", type=int, dest="retries", default=2, help="Number of retries of a failed render")
+        self.arg_parser.add_argument("--max_memory", type=int, dest="max_memory", default=0, help="Memory limit of the export in MB (0 for no limit)")
+        self.arg_parser.add_argument("--estimate", type=inkex.Boolean, dest="estimate", default=False, help="Only estimate the time, size and memory of the export")
+        self.arg_parser.add_argument("--estimate_samples", type=int, dest="estimate_samples", default=6, help="Number of mappings rendered to estimate the export")
+        self.arg_parser.add_argument("--watch", type=inkex.Boolean, dest="watch", default=False, help="Export again the mappings affected by each change of the sources, until interrupted")
+        self.arg_parser.add_argument("--watch_interval", type=float, dest="watch_interval", default=1.0, help="Interval between the checks of the watched files in seconds")
+        self.arg_parser.add_argument("--crops", type=str, dest="crops", default="", help="Also export the rasters cropped around each microgesture layer ('layers') or each of the given comma separated ids")
+        self.arg_parser.add_argument("--crop_margin", type=float, dest="crop_margin", default=0.0, help="Margin added around the cropped elements in user units")
+        self.arg_parser.add_argument("--queue", type=str, dest="queue", default="", help="SQLite work queue shared by the worker processes exporting the mappings")
+        self.arg_parser.add_argument("--queue_batch", type=int, dest="queue_batch", default=8, help="Number of mappings leased at once from the work queue")
+        self.arg_parser.add_argument("--queue_lease", type=float, dest="queue_lease", default=600.0, help="Seconds after which the mappings leased by a worker are leased again")
+        self.arg_parser.add_argument("--progress_interval", type=float, dest="progress_interval", default=10.0, help="Interval between progress reports in seconds (0 for none)")
+        self.arg_parser.add_argument("--status_file", type=str, dest="status_file", default="", help="JSON file in which the progress is reported, along with a Prometheus .prom textfile")
         self.arg_parser.add_argument("--debug", type=inkex.Boolean, dest="debug", default=False, help="Debug mode (verbose logging)")
     
+    def has_changed(self, ret):
+        """
+        The document is only changed to be exported, minified, pruned or given the command
+        definitions, thus it is never written back over the one opened in Inkscape
+        """
+        return False
+    
     def effect(self):
         """
         Execute the effect in the ComputeSVG class to keep the code clean and structured.
         """
-        compute = ComputeSVG(self)
-        compute.compute()
+        logit = logging.warning if self.options.debug else logging.info
+        self.png_optimizer = None
+        self.replaced_previews = set()
+        # The previews and the rasters replacing them are written from the render threads
+        self.preview_lock = threading.Lock()
+        if self.options.optimize_png :
+            self.png_optimizer = PngOptimizer(self.options.png_level, self.options.png_filter, self.options.png_colors, logging.warning)
+        self.crop_boxes = self.get_crop_boxes()
+        self.mapping_crop_boxes = dict()
+        self.renderer = create_renderer(self.options.renderer, etree.tostring(self.document), CALIBRATION_DPI, 
+                                        self.options.renderer_tolerance, self.options.timeout, logit)
+        if self.options.estimate :
+            try :
+                estimate_export(ComputeSVG(self), logit)
+            finally :
+                self.renderer.close()
+            return
+        
+        self.progress = ProgressTracker(self.options.progress_interval, self.options.status_file, logit)
+        self.scheduler = RenderScheduler(self.options.workers, self.options.timeout, self.options.retries, logit, self.progress)
+        self.output = create_output(self.options, self.svg.name.split(".")[0], logit, self.get_raster_shape)
+        try :
+            if self.options.watch :
+                ExportWatcher(self, logit).run()
+            elif self.options.queue != "" :
+                QueueWorker(self, logit).run()
+            else :
+                compute = ComputeSVG(self)
+                compute.compute()
+        finally :
+            self.scheduler.close()
+            self.renderer.close()
+            self.output.close()
+            self.progress.close()
+        if self.png_optimizer is not None :
+            self.png_optimizer.report()
+        self.scheduler.report_failures()
     
  ### Export functions ###
             
-    def export(self, label, logit):
+    def export(self, label, logit, svg_document=None):
         """
-        Export the representation
+        Export the representation, or the given serialized svg of it
         """
-        output_path = os.path.expanduser(self.options.path)
-        if not os.path.exists(os.path.join(output_path)):
-            logit(f"Creating directory path {output_path} because it does not exist")
-            os.makedirs(os.path.join(output_path))            
-            
-        with CustomNamedTemporaryFile(suffix=".{SVG}") as fp_svg:
-            if self.options.temp:
-                # logit(f"Writing SVG to temporary location {svg_path}")
-                svg_path = fp_svg.name
-            else :
-                svg_path = os.path.join(output_path, f"{label}.{SVG}")
-            
-            # Export to SVG
-            doc = copy.deepcopy(self.document)
-            doc.write(svg_path)
-            
-            # Export to filetype            
-            if self.options.filetype == PNG or self.options.filetype == PDF :
-                filetype_path = os.path.join(output_path, f"{label}.{self.options.filetype}")
-                command = f"inkscape --export-type=\"{self.options.filetype}\" -d {self.options.dpi} --export-filename=\"{filetype_path}\" \"{svg_path}\""
-                if os.name == "nt":
-                    p = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                else :
-                    p = subprocess.Popen(command.encode("utf-8"), shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                p.wait()
-            
-            if self.options.filetype == JPG :
-                with CustomNamedTemporaryFile(suffix=".{PNG}") as png_temp_file:
-                    command = f"inkscape --export-type=\"{PNG}\" -d {self.options.dpi} --export-filename=\"{png_temp_file.name}\" \"{svg_path}\""
-                    jpg_path = os.path.join(output_path, f"{label}.{JPG}")
-                    command = f"convert \"{png_temp_file.name}\" \"{jpg_path}\""
-                    if os.name == "nt":
-                        p = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                    else :
-                        p = subprocess.Popen(command.encode("utf-8"), shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                    p.wait()
-            
-
-######################################################################################################################
+        # The document is serialized here since the next mapping changes it,
+        # the files are written by the render thread pool
+        if svg_document is None :
+            with self.progress.time(SERIALIZE) :
+                svg_document = etree.tostring(self.document)
+        
+        # Export to filetypes
+        jobs = self.get_render_jobs(label)
+        self.progress.expect(label, len(jobs))
+        for commands, on_output in jobs :
+            self.scheduler.submit(label, svg_document, commands, on_output)
     
-
-class CustomNamedTemporaryFile: 
-    """
-    MODIFIED FROM : https://stackoverflow.com/questions/23212435/permission-denied-to-write-to-my-temporary-file
-    This custom implementation is needed because of the following limitation of tempfile.NamedTemporaryFile:
-
-    > Whether the name can be used to open the file a second time, while the named temporary file is still open,
-    > varies across platforms (it can be so used on Unix; it cannot on Windows NT or later).
-    """
-    def __init__(self, mode='wb', suffix="", delete=True):
-        self._mode = mode
-        self._delete = delete
-        self.suffix = suffix
-
-    def __enter__(self):
-        # If OS is Windows, use a the CustomNamedTemporaryFile.
-        if os.name == "nt":
-            file_name = os.path.join(tempfile.gettempdir(), os.urandom(24).hex())+self.suffix
-            # Ensure the file is created
-            open(file_name, "x").close()
-            # Open the file in the given mode
-            self._tempFile = open(file_name, self._mode)
-        else : # Otherwise, use the standard NamedTemporaryFile.
-            self._tempFile = tempfile.NamedTemporaryFile(self.suffix)
-        return self._tempFile
-
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        self._tempFile.close()
-        if self._delete:
-            os.remove(self._tempFile.name)
+    def reload_document(self):
+        """
+        Load the source document again
+        """
+        if self.file_io is not None :
+            self.file_io.close()
+        self.load_raw()
+        self.crop_boxes = self.get_crop_boxes()
+    
+    def has_previews(self):
+        """
+        Check if the rasters are previewed at a low resolution before being rendered
+        """
+        if self.options.preview_dpi <= 0 or not any(filetype in RASTER_FILETYPES for filetype in self.get_filetypes()) :
+            return False
+        if self.options.archive != NONE :
+            raise RuntimeError("The previews are replaced by the rasters, thus they can only be written as separate files")
+        return True
+    
+    def preview(self, label, logit, svg_document=None):
+        """
+        Render the preview of the representation, or of the given serialized svg of it
+        """
+        if svg_document is None :
+            with self.progress.time(SERIALIZE) :
+                svg_document = etree.tostring(self.document)
+        file_name = self.get_preview_file_name(label)
+        # The previews are not part of the renders of their mapping
+        if has_cairosvg() :
+            job = ([], lambda output : self.write_preview(label, file_name, rasterize_svg(output, self.options.preview_dpi)))
+        else :
+            job = ([self.get_render_command(PNG, self.options.preview_dpi)], lambda output : self.write_preview(label, file_name, output))
+        self.scheduler.submit(f"{label}_{PREVIEW}", svg_document, *job)
+    
+    def write_preview(self, label, file_name, content):
+        """
+        Write the preview of a mapping unless its rasters were already written
+        """
+        with self.preview_lock :
+            if label not in self.replaced_previews :
+                self.output.write(label, file_name, content)
+    
+    def get_preview_file_name(self, label):
+        return f"{label}_{PREVIEW}.{PNG}"
+    
+    def reset_previews(self):
+        """
+        Forget the previews replaced during a previous export, as in watch mode
+        """
+        with self.preview_lock :
+            self.replaced_previews = set()
+    
+    def replace_preview(self, label):
+        """
+        Remove the preview of a mapping once one of its rasters is written
+        """
+        if self.has_previews() :
+            with self.preview_lock :
+                self.replaced_previews.add(label)
+                self.output.remove(label, self.get_preview_file_name(label))
     
-    def close(self):
-        self._tempFile.close()
-        if self._delete:
-            os.remove(self._tempFile.name)
+    def get_crop_boxes(self):
+        """
+        Return the boxes of the wanted crops by id, in the user units of the page,
+        computed once from the source document and widened for each mapping to its commands
+        """
+        crops = str(self.options.crops).strip()
+        if crops == "" :
+            return OrderedDict()
+        if not any(filetype in RASTER_FILETYPES for filetype in self.get_filetypes()) :
+            raise RuntimeError("The crops are cut from the rasters, thus they need a png or jpg filetype")
+        if crops == "layers" :
+            elements = self.svg.xpath('//*[@mgrep-microgesture-layer]')
+        else :
+            elements = []
+            for element_id in [element_id.strip() for element_id in crops.split(",") if element_id.strip() != ""] :
+                element = self.svg.getElementById(element_id)
+                if element is None :
+                    raise RuntimeError(f"No element with the id '{element_id}' to crop")
+                elements.append(element)
+        
+        crop_boxes = OrderedDict()
+        margin = self.options.crop_margin
+        for element in elements :
+            bounding_box = element.bounding_box(element.getparent().composed_transform())
+            if bounding_box is None :
+                logging.warning(f"The element {element.get('id')} has no bounding box and is not cropped")
+                continue
+            crop_boxes[element.get('id')] = (bounding_box.left - margin, bounding_box.top - margin, 
+                                             bounding_box.right + margin, bounding_box.bottom + margin)
+        self.crop_viewbox = self.svg.get_viewbox()
+        return crop_boxes
     
+    def get_dpis(self):
+        """
+        Return the wanted DPIs from the highest to the lowest
+        """
+        return sorted(set(float(dpi) for dpi in str(self.options.dpi).split(",") if dpi.strip() != ""), reverse=True)
+    
+    def get_filetypes(self):
+        """
+        Return the wanted filetypes
+        """
+        filetypes = []
+        for filetype in str(self.options.filetype).split(",") :
+            filetype = filetype.strip()
+            if filetype not in FILETYPES :
+                raise RuntimeError(f"Unknown filetype '{filetype}'. Expected value is one of {FILETYPES}")
+            if filetype not in filetypes :
+                filetypes.append(filetype)
+        return filetypes
+    
+    def get_file_name(self, label, filetype, dpi):
+        """
+        Return the name of an exported file, tagged with its DPI when several are wanted
+        """
+        if filetype in RASTER_FILETYPES and len(self.get_dpis()) > 1 :
+            return f"{label}_{dpi:g}dpi.{filetype}"
+        return f"{label}.{filetype}"
+    
+    def get_render_command(self, filetype, dpi):
+        """
+        Return the command rendering a serialized svg as the given filetype with the selected renderer,
+        or with Inkscape if the renderer does not export this filetype
+        """
+        if filetype in self.renderer.filetypes :
+            return self.renderer.get_command(filetype, dpi)
+        return get_inkscape_command(filetype, dpi)
+    
+    def get_raster_shape(self):
+        """
+        Return the shape of the RGBA rasters of the mappings, from a render of the page at the highest DPI
+        """
+        image = load_raster(self.renderer.render(etree.tostring(self.document), PNG, self.get_dpis()[0]))
+        return (image.height, image.width, 4)
+    
+    def get_render_jobs(self, label):
+        """
+        Return the commands rendering the serialized svg of a mapping read 
+        from their standard input, each with the function handling their output.
+        The rasters are rendered once at the highest DPI and downsampled in-process
+        for the others, the vector files are rendered from the same svg.
+        """
+        jobs = []
+        dpis = self.get_dpis()
+        filetypes = self.get_filetypes()
+        raster_filetypes = [filetype for filetype in filetypes if filetype in RASTER_FILETYPES]
+        
+        # The svg needs no renderer
+        if SVG in filetypes or not self.options.temp :
+            jobs.append(([], lambda output : self.output.write(label, f"{label}.{SVG}", output)))
+        
+        if PDF in filetypes :
+            file_name = self.get_file_name(label, PDF, dpis[0])
+            jobs.append(([self.get_render_command(PDF, dpis[0])], lambda output : self.output.write(label, file_name, output)))
+        
+        if len(raster_filetypes) > 0 and has_pillow() :
+            jobs.append(([self.get_render_command(PNG, dpis[0])], lambda output : self.write_rasters(label, output, raster_filetypes, dpis)))
+        elif len(raster_filetypes) > 0 :
+            # Without Pillow, each crop is rendered by Inkscape from the area of its element
+            for crop_id in self.crop_boxes :
+                for dpi in dpis :
+                    file_name = self.get_file_name(f"{label}_{crop_id}", PNG, dpi)
+                    jobs.append(([get_inkscape_command(PNG, dpi) + [f"--export-id={crop_id}"]], 
+                                 lambda output, file_name=file_name : self.write_file(label, file_name, output)))
+            # Without Pillow, each raster is rendered by Inkscape
+            for dpi in dpis :
+                for filetype in raster_filetypes :
+                    commands = [self.get_render_command(PNG, dpi)]
+                    if filetype == JPG :
+                        commands.append(["convert", f"{PNG}:-", f"{JPG}:-"])
+                    file_name = self.get_file_name(label, filetype, dpi)
+                    jobs.append((commands, lambda output, file_name=file_name : self.write_raster(label, file_name, output)))
+        return jobs
+    
+    def write_rasters(self, label, png, filetypes, dpis):
+        """
+        Write the rasters of a mapping at every DPI from its PNG render at the highest one
+        """
+        image = None
+        for dpi in dpis :
+            resized_image = None
+            for filetype in filetypes :
+                file_name = self.get_file_name(label, filetype, dpi)
+                if filetype == PNG and dpi == dpis[0] :
+                    self.write_file(label, file_name, png)
+                    continue
+                if image is None :
+                    image = load_raster(png)
+                if resized_image is None :
+                    resized_image = resize_raster(image, dpi / dpis[0])
+                self.write_file(label, file_name, encode_raster(resized_image, filetype, dpi))
+        # The boxes are kept until the crops are written, a retried render needs them again
+        crop_boxes = self.mapping_crop_boxes.get(label, self.crop_boxes)
+        if len(crop_boxes) > 0 :
+            self.write_crops(label, image if image is not None else load_raster(png), crop_boxes, filetypes, dpis)
+        self.mapping_crop_boxes.pop(label, None)
+        self.replace_preview(label)
+    
+    def write_crops(self, label, image, crop_boxes, filetypes, dpis):
+        """
+        Write the crops of a mapping cut from its raster rendered at the highest DPI
+        """
+        for dpi in dpis :
+            resized_image = resize_raster(image, dpi / dpis[0])
+            for crop_id, crop_box in crop_boxes.items() :
+                cropped_image = crop_raster(resized_image, crop_box, self.crop_viewbox)
+                for filetype in filetypes :
+                    file_name = self.get_file_name(f"{label}_{crop_id}", filetype, dpi)
+                    self.write_file(label, file_name, encode_raster(cropped_image, filetype, dpi))
+    
+    def write_raster(self, label, file_name, content):
+        """
+        Write a raster of a mapping rendered by Inkscape in place of its preview
+        """
+        self.write_file(label, file_name, content)
+        self.replace_preview(label)
+    
+    def write_file(self, label, file_name, content):
+        """
+        Write an exported file of a mapping, optimizing it first if it is a PNG file
+        """
+        if self.png_optimizer is not None and file_name.endswith(f".{PNG}") :
+            content = self.png_optimizer.optimize(content)
+        self.output.write(label, file_name, content)
 
 #######################################################################################################################
 
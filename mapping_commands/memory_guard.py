@@ -0,0 +1,108 @@
+#! /usr/bin/env python3
+#######################################################################################################################
+#  Copyright (c) 2023 Vincent LAMBERT
+#  License: MIT
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+# 
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+# 
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+#
+#######################################################################################################################
+# NOTES
+#
+# Developing extensions:
+#   SEE: https://inkscape.org/develop/extensions/
+#   SEE: https://wiki.inkscape.org/wiki/Python_modules_for_extensions
+#   SEE: https://wiki.inkscape.org/wiki/Using_the_Command_Line
+#
+# Implementation References:
+#   SEE: https://github.com/nshkurkin/inkscape-export-layer-combos
+
+import gc
+import logging
+import os
+import sys
+
+from utils import *
+
+#######################################################################################################################
+
+MEGABYTE = 1024 * 1024
+
+def get_memory_usage() :
+    """
+    Return the current resident memory of the process in bytes, or None if it cannot be known.
+    It is read from /proc, or with psutil when it is installed.
+    """
+    try :
+        with open("/proc/self/statm") as statm :
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError) :
+        pass
+    try :
+        import psutil
+    except ImportError :
+        return None
+    return psutil.Process().memory_info().rss
+
+def get_peak_memory_usage() :
+    """
+    Return the peak resident memory of the process in bytes, or None if it cannot be known
+    """
+    try :
+        import resource
+    except ImportError :
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is given in bytes on macOS and in kilobytes elsewhere
+    return peak if sys.platform == "darwin" else peak * 1024
+
+#######################################################################################################################
+
+class MemoryGuard(object):
+    """
+    Keep the resident memory of the export under a limit given in megabytes (0 for no limit).
+    When the limit is reached, the pending renders are awaited and the released 
+    objects collected before giving up on the export.
+    The peak memory never goes down, thus without a measure of the current one the limit is not enforced.
+    """
+
+    def __init__(self, max_memory, logit):
+        self.max_memory = max_memory
+        self.logit = logit
+        if self.max_memory > 0 and get_memory_usage() is None :
+            logging.warning(f"The memory used cannot be measured without /proc or psutil, the {max_memory} MB limit is not enforced")
+            self.max_memory = 0
+
+    def check(self, scheduler) :
+        """
+        Check the memory used after the export of a mapping
+        """
+        if self.max_memory <= 0 :
+            return
+        memory = get_memory_usage()
+        if memory is None or memory <= self.max_memory * MEGABYTE :
+            return
+        
+        self.logit(f"Memory use of {memory / MEGABYTE:.0f} MB above {self.max_memory} MB, waiting for the pending renders")
+        scheduler.wait()
+        gc.collect()
+        memory = get_memory_usage()
+        if memory is not None and memory > self.max_memory * MEGABYTE :
+            raise RuntimeError(f"The export uses {memory / MEGABYTE:.0f} MB, more than the {self.max_memory} MB allowed")
+
+#######################################################################################################################
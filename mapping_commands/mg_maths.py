@@ -32,6 +32,8 @@
 # Implementation References:
 #   SEE: https://github.com/nshkurkin/inkscape-export-layer-combos
 
+import functools
+
 import inkex
 import inkex.bezier
 import numpy as np
@@ -41,7 +43,9 @@ from utils import *
 from shapely.geometry import Point, Polygon
 
 #######################################################################################################################
-        
+
+# Number of TRS matrices kept, one per path ends, reference vector and start position
+TRS_CACHE_SIZE = 1024
 
 def convert_to_complex(x, y) :
     """
@@ -124,6 +128,21 @@ def apply_matrix_to_path(parsed_path, bound_zones, TRS_matrix, logit) :
             path_segment.control2 = compute_point_transformation(path_segment.control2, bound_zones, TRS_matrix, logit)
     return parsed_path_copy
     
+def apply_matrix_to_xml(xml_element, TRS_matrix, logit) :
+    """
+    Apply the TRS_matrix to every path and circle under the given xml element
+    """
+    for xml in xml_element.findall(".//{*}path") :
+        parsed_path = svg.path.parse_path(xml.get("d"))
+        parsed_path = apply_matrix_to_path(parsed_path, [], TRS_matrix, logit)
+        xml.set('d', parsed_path.d())
+    for xml in xml_element.findall(".//{*}circle") :
+        path_cx = xml.get("cx")
+        path_cy = xml.get("cy")
+        circle = compute_point_transformation(convert_to_complex(path_cx, path_cy), [], TRS_matrix, logit)
+        xml.set("cx", str(circle.real))
+        xml.set("cy", str(circle.imag))
+    
 def apply_matrix_to_circle(parsed_circle, bound_zones, TRS_matrix, logit) :
     """
     Apply the TRS_matrix to the given circle
@@ -212,39 +231,26 @@ def get_TRS_matrix(path, reference_vector, start_position, logit) :
     Compute the matrixes to apply to the path to match the reference_vector
     and the start_position
     """
-    # Copy the path given to not alterate it
-    # svg.path.parse_path does not integrate a copy method
-    # so we have to parse the path.d() string
-    reference_path = svg.path.parse_path(path.d())
-    ## Translate to the origin before scaling and rotating
-    # Actualize the starting point position
-    start_point = convert_from_complex(reference_path[0].start)
-    # Translate each position
+    # Only the ends of the path matter, thus paths with the same ends share their matrix
+    return get_TRS_matrix_from_ends(path[0].start, path[-1].end, 
+                                    tuple(float(value) for value in reference_vector), 
+                                    tuple(float(value) for value in start_position)).copy()
+
+@functools.lru_cache(maxsize=TRS_CACHE_SIZE)
+def get_TRS_matrix_from_ends(start, end, reference_vector, start_position) :
+    """
+    Compute in closed form the matrix translating the start of a path to the origin,
+    rotating and scaling its start to end vector to match the reference_vector,
+    and translating the origin to the start_position
+    """
+    start_point = convert_from_complex(start)
+    initial_path_vector = vector(start_point, convert_from_complex(end))
     translation_matrix_to_origin = get_translation_matrix(start_point, [0, 0])
-    # Apply the matrix to the reference_path
-    reference_path = apply_matrix_to_path(reference_path, {}, translation_matrix_to_origin, logit)
-    
-    ## Scale and rotate the reference_path
-    # Compute the initial reference_path vector from actualized start and end positions
-    start_point = convert_from_complex(reference_path[0].start)
-    end_point = convert_from_complex(reference_path[-1].end)
-    initial_path_vector = vector(start_point, end_point)
-    # Compute the scaling matrix
     scaling_matrix = get_scaling_matrix(initial_path_vector, reference_vector)
-        
-    # Compute the rotation matrix
     rotation_matrix = get_rotation_matrix(initial_path_vector, reference_vector)
-    # Apply the matrixes to the reference_path
-    reference_path = apply_matrix_to_path(reference_path, {}, rotation_matrix @ scaling_matrix, logit)
-    
-    # ## Translate to the final position
-    # # Actualize the starting point position
-    start_point = convert_from_complex(reference_path[0].start)
-    # Compute the translation matrix
-    translation_matrix = get_translation_matrix(start_point, start_position)
-    # Compute the final matrix
-    TRS_matrix = translation_matrix @ rotation_matrix @ scaling_matrix @ translation_matrix_to_origin
-    return TRS_matrix
+    # The start of the path is at the origin after the rotation and the scaling
+    translation_matrix = get_translation_matrix([0, 0], start_position)
+    return translation_matrix @ rotation_matrix @ scaling_matrix @ translation_matrix_to_origin
 
 def compute_transformation(parsed_paths, parsed_circles, reference_vector, start_position, logit, trace_path=False, trace_end_path=False) :
     """
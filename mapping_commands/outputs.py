@@ -0,0 +1,339 @@
+#! /usr/bin/env python3
+#######################################################################################################################
+#  Copyright (c) 2023 Vincent LAMBERT
+#  License: MIT
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+# 
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+# 
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+#
+#######################################################################################################################
+# NOTES
+#
+# Developing extensions:
+#   SEE: https://inkscape.org/develop/extensions/
+#   SEE: https://wiki.inkscape.org/wiki/Python_modules_for_extensions
+#   SEE: https://wiki.inkscape.org/wiki/Using_the_Command_Line
+#
+# Implementation References:
+#   SEE: https://github.com/nshkurkin/inkscape-export-layer-combos
+
+import io
+import json
+import os
+import shutil
+import tarfile
+import threading
+import time
+import zipfile
+from collections import OrderedDict
+
+import numpy as np
+
+from utils import *
+
+#######################################################################################################################
+
+NONE = "none"
+TAR = "tar"
+ZIP = "zip"
+NPY = "npy"
+ARCHIVE_TYPES = [NONE, TAR, ZIP, NPY]
+ARCHIVE_INDEX = "index.json"
+# Filetypes already compressed, stored as they are in zip archives
+COMPRESSED_FILETYPES = [PNG, JPG]
+
+def create_output(options, document_name, logit, get_raster_shape=None) :
+    """
+    Return the output the exported files are written to,
+    get_raster_shape giving the shape of the rasters of a dataset
+    """
+    output_path = os.path.expanduser(options.path)
+    if not os.path.exists(output_path):
+        logit(f"Creating directory path {output_path} because it does not exist")
+        os.makedirs(output_path)
+    if options.archive == NONE :
+        return DirectoryOutput(output_path)
+    if options.archive == NPY :
+        if not any(filetype.strip() in RASTER_FILETYPES for filetype in options.filetype.split(",")) :
+            raise RuntimeError(f"A NumPy dataset can only be made of raster images. Expected filetype is one of {RASTER_FILETYPES}")
+        return DatasetOutput(os.path.join(output_path, document_name), get_raster_shape, logit)
+    if options.archive in ARCHIVE_TYPES :
+        return ArchiveOutput(os.path.join(output_path, f"{document_name}.{options.archive}"), options.archive, logit)
+    raise RuntimeError(f"Unknown archive type '{options.archive}'. Expected value is one of {ARCHIVE_TYPES}")
+
+def write_file(file_path, content):
+    """
+    Write the given content in a file
+    """
+    # The file may be a hardlink shared with another file of a previous export
+    if os.path.lexists(file_path) :
+        os.remove(file_path)
+    with open(file_path, 'wb') as file :
+        file.write(content)
+
+def get_alias_file_name(file_name, label, target_label) :
+    """
+    Return the name of a file of the target label renamed for the given label
+    """
+    return label + file_name[len(target_label):]
+
+#######################################################################################################################
+
+class DirectoryOutput(object):
+    """
+    Write each exported file in the export folder
+    """
+
+    def __init__(self, output_path):
+        self.output_path = output_path
+        self.file_names = dict()
+        self.lock = threading.Lock()
+    
+    def start(self, mappings, get_label, coordinating=True) :
+        """
+        Prepare the output for the given mappings
+        """
+        self.file_names = dict()
+    
+    def write(self, label, file_name, content) :
+        """
+        Write an exported file of the mapping of the given label
+        """
+        write_file(os.path.join(self.output_path, file_name), content)
+        with self.lock :
+            self.file_names.setdefault(label, []).append(file_name)
+    
+    def remove(self, label, file_name) :
+        """
+        Remove an exported file of the mapping of the given label
+        """
+        with self.lock :
+            if file_name in self.file_names.get(label, []) :
+                self.file_names[label].remove(file_name)
+        file_path = os.path.join(self.output_path, file_name)
+        if os.path.lexists(file_path) :
+            os.remove(file_path)
+    
+    def alias(self, label, target_label) :
+        """
+        Hardlink the files of the mapping of the target label under the given label,
+        or copy them if the file system does not support hardlinks
+        """
+        for file_name in self.file_names.get(target_label, []) :
+            target_path = os.path.join(self.output_path, file_name)
+            alias_path = os.path.join(self.output_path, get_alias_file_name(file_name, label, target_label))
+            if os.path.lexists(alias_path) :
+                os.remove(alias_path)
+            try :
+                os.link(target_path, alias_path)
+            except OSError :
+                shutil.copyfile(target_path, alias_path)
+    
+    def close(self) :
+        pass
+
+class SizeOutput(object):
+    """
+    Only measure the size of the exported files of each mapping
+    """
+
+    def __init__(self):
+        self.sizes = dict()
+    
+    def start(self, mappings, get_label, coordinating=True) :
+        pass
+    
+    def write(self, label, file_name, content) :
+        self.sizes[label] = self.sizes.get(label, 0) + len(content)
+    
+    def remove(self, label, file_name) :
+        pass
+    
+    def alias(self, label, target_label) :
+        pass
+    
+    def close(self) :
+        pass
+
+class ArchiveOutput(object):
+    """
+    Stream every exported file into a single tar or zip archive as soon as it is produced,
+    without temporary files. Already compressed images are stored without compressing them again.
+    An index member maps the label of each mapping to its entries in the archive.
+    """
+
+    def __init__(self, archive_path, archive_type, logit):
+        self.archive_path = archive_path
+        self.archive_type = archive_type
+        self.index = OrderedDict()
+        # Files are written from the render thread as well as from the main thread
+        self.lock = threading.Lock()
+        logit(f"Writing the exported files in the archive {archive_path}")
+        if archive_type == TAR :
+            self.archive = tarfile.open(archive_path, "w|")
+        else :
+            self.archive = zipfile.ZipFile(archive_path, "w", allowZip64=True)
+    
+    def start(self, mappings, get_label, coordinating=True) :
+        """
+        Prepare the output for the given mappings
+        """
+        pass
+    
+    def write(self, label, file_name, content) :
+        """
+        Add an exported file of the mapping of the given label to the archive
+        """
+        with self.lock :
+            self.add_member(file_name, content)
+            self.index.setdefault(label, []).append(file_name)
+    
+    def alias(self, label, target_label) :
+        """
+        Point the index entry of the given label to the files of the target label
+        """
+        with self.lock :
+            self.index[label] = list(self.index.get(target_label, []))
+    
+    def add_member(self, file_name, content) :
+        """
+        Add a file to the archive
+        """
+        if self.archive_type == TAR :
+            info = tarfile.TarInfo(file_name)
+            info.size = len(content)
+            info.mtime = int(time.time())
+            self.archive.addfile(info, io.BytesIO(content))
+        else :
+            info = zipfile.ZipInfo(file_name, time.localtime()[:6])
+            info.compress_type = zipfile.ZIP_STORED if file_name.rsplit(".", 1)[-1] in COMPRESSED_FILETYPES else zipfile.ZIP_DEFLATED
+            self.archive.writestr(info, content)
+    
+    def close(self) :
+        """
+        Add the index to the archive and close it
+        """
+        with self.lock :
+            self.add_member(ARCHIVE_INDEX, json.dumps(self.index, indent=1).encode("utf-8"))
+            self.archive.close()
+
+class DatasetOutput(object):
+    """
+    Write the raster of each mapping straight into a row of a preallocated 
+    N x H x W x C uint8 .npy memory map, so that consumers can load slices without decoding images.
+    A sidecar .mappings.npy array gives the index of the command of each gesture of each row,
+    or -1, and a .vocabulary.json file gives the gestures and commands these indices refer to.
+    Rows are disjoint, so that several writers can fill the same dataset : the coordinating 
+    process preallocates it once and the other ones open it in place.
+    Only the first raster of each mapping, at the highest DPI, is kept.
+    """
+
+    def __init__(self, dataset_path, get_raster_shape, logit):
+        self.dataset_path = dataset_path
+        self.get_raster_shape = get_raster_shape
+        self.logit = logit
+        self.rows = dict()
+        self.written = set()
+        self.images = None
+        self.lock = threading.Lock()
+    
+    def start(self, mappings, get_label, coordinating=True) :
+        """
+        Number the rows of the dataset, and if coordinating, 
+        write its sidecar files and preallocate its rows
+        """
+        if not coordinating :
+            self.rows = {get_label(mapping) : row for row, mapping in enumerate(mappings)}
+            return
+        
+        slots = list()
+        commands = list()
+        for mapping in mappings :
+            for mg_charac, command in mapping :
+                if mg_charac not in slots :
+                    slots.append(mg_charac)
+                if command not in commands :
+                    commands.append(command)
+        
+        encoded_mappings = np.lib.format.open_memmap(f"{self.dataset_path}.mappings.npy", mode="w+", 
+                                                     dtype=np.int16, shape=(len(mappings), len(slots)))
+        encoded_mappings[:] = -1
+        labels = list()
+        for row, mapping in enumerate(mappings) :
+            for mg_charac, command in mapping :
+                encoded_mappings[row, slots.index(mg_charac)] = commands.index(command)
+            labels.append(get_label(mapping))
+        encoded_mappings.flush()
+        del encoded_mappings
+        with open(f"{self.dataset_path}.vocabulary.json", 'w') as file :
+            json.dump({"gestures" : [f"{mg}_{charac}" for mg, charac in slots], "commands" : commands, "labels" : labels}, file, indent=1)
+        
+        self.rows = {label : row for row, label in enumerate(labels)}
+        shape = (len(labels),) + tuple(self.get_raster_shape())
+        self.logit(f"Allocating the dataset {self.dataset_path}.npy of shape {shape}")
+        with self.lock :
+            self.images = np.lib.format.open_memmap(f"{self.dataset_path}.npy", mode="w+", dtype=np.uint8, shape=shape)
+    
+    def open_images(self) :
+        """
+        Open in place the dataset preallocated by the coordinating process
+        """
+        if not os.path.exists(f"{self.dataset_path}.npy") :
+            raise RuntimeError(f"The dataset {self.dataset_path}.npy is not allocated by the coordinating process")
+        images = np.load(f"{self.dataset_path}.npy", mmap_mode="r+")
+        if len(images) < len(self.rows) :
+            raise RuntimeError(f"The dataset {self.dataset_path}.npy has {len(images)} rows instead of {len(self.rows)}")
+        return images
+    
+    def write(self, label, file_name, content) :
+        """
+        Decode an exported raster and write it in the row of its mapping
+        """
+        if file_name.rsplit(".", 1)[-1] not in RASTER_FILETYPES or label in self.written :
+            return
+        self.written.add(label)
+        try :
+            from PIL import Image
+        except ImportError :
+            raise RuntimeError("Pillow is needed to decode the images of a NumPy dataset")
+        image = np.asarray(Image.open(io.BytesIO(content)).convert("RGBA"))
+        
+        with self.lock :
+            if self.images is None :
+                self.images = self.open_images()
+            if image.shape != self.images.shape[1:] :
+                raise RuntimeError(f"The image of {label} has the shape {image.shape} instead of {self.images.shape[1:]}")
+        self.images[self.rows[label]] = image
+    
+    def alias(self, label, target_label) :
+        """
+        Copy the row of the target label in the row of the given label
+        """
+        if target_label in self.written and label not in self.written :
+            self.written.add(label)
+            self.images[self.rows[label]] = self.images[self.rows[target_label]]
+    
+    def close(self) :
+        """
+        Flush the dataset on disk
+        """
+        if self.images is not None :
+            self.images.flush()
+            self.images = None
+
+#######################################################################################################################
@@ -0,0 +1,298 @@
+#! /usr/bin/env python3
+#######################################################################################################################
+#  Copyright (c) 2023 Vincent LAMBERT
+#  License: MIT
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+# 
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+# 
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+#
+#######################################################################################################################
+# NOTES
+#
+# Developing extensions:
+#   SEE: https://inkscape.org/develop/extensions/
+#   SEE: https://wiki.inkscape.org/wiki/Python_modules_for_extensions
+#   SEE: https://wiki.inkscape.org/wiki/Using_the_Command_Line
+#
+# Implementation References:
+#   SEE: https://github.com/nshkurkin/inkscape-export-layer-combos
+
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque, OrderedDict
+
+import numpy as np
+
+from utils import *
+from memory_guard import *
+
+#######################################################################################################################
+
+BUILD = "build"
+SERIALIZE = "serialize"
+RENDER = "render"
+WRITE = "write"
+STAGES = [BUILD, SERIALIZE, RENDER, WRITE]
+# Number of recent durations kept per stage to compute the percentiles
+STAGE_WINDOW = 4096
+METRIC_PREFIX = "mapping_commands"
+
+#######################################################################################################################
+
+def get_prometheus_path(status_file) :
+    """
+    Return the path of the Prometheus textfile written next to the JSON status file
+    """
+    return os.path.splitext(status_file)[0] + ".prom"
+
+def write_file_atomically(file_path, content) :
+    """
+    Write a file through a temporary file so that readers never see it half written
+    """
+    temporary_path = f"{file_path}.tmp"
+    with open(temporary_path, 'w') as file :
+        file.write(content)
+    os.replace(temporary_path, file_path)
+
+def format_prometheus(status) :
+    """
+    Return the status of an export in the Prometheus text exposition format
+    """
+    lines = []
+    for name, kind, help_text, value in [
+            ("mappings_done", "gauge", "Mappings exported", status["mappings_done"]),
+            ("mappings_total", "gauge", "Mappings to export", status["mappings_total"]),
+            ("renders_done", "gauge", "Distinct mappings rendered", status["renders_done"]),
+            ("renders_total", "gauge", "Distinct mappings to render", status["renders_total"]),
+            ("render_jobs_done", "counter", "Render commands ended", status["render_jobs_done"]),
+            ("render_failures", "counter", "Render commands failed", status["render_failures"]),
+            ("renders_per_second", "gauge", "Render commands ended per second", status["renders_per_second"]),
+            ("eta_seconds", "gauge", "Estimated time left in seconds", status["eta_seconds"]),
+            ("elapsed_seconds", "gauge", "Time since the start of the export in seconds", status["elapsed_seconds"]),
+            ("memory_bytes", "gauge", "Resident memory of the export", status["memory_bytes"])] :
+        if value is None :
+            continue
+        lines.append(f"# HELP {METRIC_PREFIX}_{name} {help_text}")
+        lines.append(f"# TYPE {METRIC_PREFIX}_{name} {kind}")
+        lines.append(f"{METRIC_PREFIX}_{name} {value}")
+    
+    lines.append(f"# HELP {METRIC_PREFIX}_stage_seconds Time spent per mapping in each stage")
+    lines.append(f"# TYPE {METRIC_PREFIX}_stage_seconds summary")
+    for stage, stage_status in status["stages"].items() :
+        for key, quantile in [("p50", "0.5"), ("p95", "0.95")] :
+            if stage_status[key] is not None :
+                lines.append(f'{METRIC_PREFIX}_stage_seconds{{stage="{stage}",quantile="{quantile}"}} {stage_status[key]}')
+        lines.append(f'{METRIC_PREFIX}_stage_seconds_sum{{stage="{stage}"}} {stage_status["sum"]}')
+        lines.append(f'{METRIC_PREFIX}_stage_seconds_count{{stage="{stage}"}} {stage_status["count"]}')
+    return "\n".join(lines) + "\n"
+
+#######################################################################################################################
+
+class StageTimer(object):
+    """
+    Measure the time spent in a stage of the export
+    """
+
+    def __init__(self, progress, stage):
+        self.progress = progress
+        self.stage = stage
+    
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+    
+    def __exit__(self, *args):
+        self.progress.record(self.stage, time.perf_counter() - self.start)
+        return False
+
+class ProgressTracker(object):
+    """
+    Follow the progress of an export : the mappings done, the render commands per second,
+    the time left and the p50/p95 time per stage. The progress is reported every interval 
+    seconds on stderr and, if a status file is given, in this JSON file 
+    and in a Prometheus textfile of the same name with the .prom extension.
+    
+    Renders end in the render thread while the mappings are built in the main thread, 
+    thus every update holds the lock.
+    """
+
+    def __init__(self, interval, status_file, logit):
+        self.interval = interval
+        self.status_file = os.path.expanduser(status_file) if status_file else None
+        self.logit = logit
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.start_time = time.perf_counter()
+        self.reported = False
+        self.reset(0, 0)
+    
+    def reset(self, mappings_total, renders_total) :
+        """
+        Reset every counter for an export of the given number of mappings
+        """
+        self.mappings_total = mappings_total
+        self.renders_total = renders_total
+        self.renders_done = 0
+        self.aliases_done = 0
+        self.render_jobs_done = 0
+        self.render_failures = 0
+        self.pending_jobs = dict()
+        self.durations = OrderedDict((stage, deque(maxlen=STAGE_WINDOW)) for stage in STAGES)
+        self.sums = dict((stage, 0.0) for stage in STAGES)
+        self.counts = dict((stage, 0) for stage in STAGES)
+    
+    def start(self, mappings_total, renders_total) :
+        """
+        Start reporting the progress of the export of the given number of mappings, 
+        of which renders_total are rendered. The counters of a previous export,
+        as in watch mode, are reset.
+        """
+        with self.lock :
+            self.reset(mappings_total, renders_total)
+            self.start_time = time.perf_counter()
+        if self.interval > 0 and self.thread is None :
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+    
+    def add(self, mappings_count, renders_count) :
+        """
+        Add mappings to the export, as the jobs leased from a work queue
+        """
+        with self.lock :
+            self.mappings_total += mappings_count
+            self.renders_total += renders_count
+    
+    def run(self) :
+        """
+        Report the progress at a fixed interval until the tracker is closed
+        """
+        while not self.stopped.wait(self.interval) :
+            self.report()
+    
+    def time(self, stage) :
+        """
+        Return a context manager measuring the time spent in the given stage
+        """
+        return StageTimer(self, stage)
+    
+    def record(self, stage, seconds) :
+        with self.lock :
+            self.durations[stage].append(seconds)
+            self.sums[stage] += seconds
+            self.counts[stage] += 1
+    
+    def expect(self, label, job_count) :
+        """
+        Declare the number of render commands of a mapping, which is done once they all ended
+        """
+        with self.lock :
+            if job_count == 0 :
+                self.renders_done += 1
+            else :
+                self.pending_jobs[label] = self.pending_jobs.get(label, 0) + job_count
+    
+    def render_ended(self, label, success) :
+        """
+        Count an ended render command of a mapping
+        """
+        with self.lock :
+            self.render_jobs_done += 1
+            if not success :
+                self.render_failures += 1
+            if label in self.pending_jobs :
+                self.pending_jobs[label] -= 1
+                if self.pending_jobs[label] <= 0 :
+                    del self.pending_jobs[label]
+                    self.renders_done += 1
+    
+    def aliased(self, count=1) :
+        """
+        Count mappings exported as aliases of a rendered one
+        """
+        with self.lock :
+            self.aliases_done += count
+    
+    def get_status(self) :
+        """
+        Return the status of the export as a dictionnary
+        """
+        with self.lock :
+            elapsed = time.perf_counter() - self.start_time
+            rate = self.renders_done / elapsed if elapsed > 0 else 0.0
+            remaining = self.renders_total - self.renders_done
+            stages = OrderedDict()
+            for stage, durations in self.durations.items() :
+                percentiles = np.percentile(np.array(durations), [50, 95]) if len(durations) > 0 else [None, None]
+                stages[stage] = {"p50" : None if percentiles[0] is None else round(float(percentiles[0]), 6),
+                                 "p95" : None if percentiles[1] is None else round(float(percentiles[1]), 6),
+                                 "sum" : round(self.sums[stage], 6), "count" : self.counts[stage]}
+            return OrderedDict([
+                ("mappings_done", self.renders_done + self.aliases_done),
+                ("mappings_total", self.mappings_total),
+                ("renders_done", self.renders_done),
+                ("renders_total", self.renders_total),
+                ("render_jobs_done", self.render_jobs_done),
+                ("render_failures", self.render_failures),
+                ("renders_per_second", round(self.render_jobs_done / elapsed, 3) if elapsed > 0 else 0.0),
+                ("eta_seconds", round(remaining / rate, 1) if rate > 0 else None),
+                ("elapsed_seconds", round(elapsed, 1)),
+                ("memory_bytes", get_memory_usage()),
+                ("stages", stages)])
+    
+    def format_status(self, status) :
+        """
+        Return a one line summary of the status of the export
+        """
+        eta = "?" if status["eta_seconds"] is None else f"{status['eta_seconds']:.0f}s"
+        stages = " ".join(f"{stage} {stage_status['p50'] * 1000:.0f}/{stage_status['p95'] * 1000:.0f}ms" 
+                          for stage, stage_status in status["stages"].items() if stage_status["p50"] is not None)
+        return (f"{status['mappings_done']}/{status['mappings_total']} mappings, "
+                f"{status['renders_per_second']:.2f} renders/s, ETA {eta}, p50/p95 {stages}")
+    
+    def report(self) :
+        """
+        Write the progress on stderr and in the status files
+        """
+        status = self.get_status()
+        self.reported = True
+        sys.stderr.write(f"Progress: {self.format_status(status)}\n")
+        sys.stderr.flush()
+        if self.status_file is not None :
+            try :
+                write_file_atomically(self.status_file, json.dumps(status, indent=1))
+                write_file_atomically(get_prometheus_path(self.status_file), format_prometheus(status))
+            except OSError as error :
+                self.logit(f"Could not write the status files: {error}")
+    
+    def close(self) :
+        """
+        Stop the periodic reports and write the final status
+        """
+        self.stopped.set()
+        if self.thread is not None :
+            self.thread.join()
+            self.thread = None
+        # Short exports are not worth a progress line
+        if self.reported or self.status_file is not None :
+            self.report()
+
+#######################################################################################################################
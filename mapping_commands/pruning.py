@@ -0,0 +1,172 @@
+#! /usr/bin/env python3
+#######################################################################################################################
+#  Copyright (c) 2023 Vincent LAMBERT
+#  License: MIT
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+# 
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+# 
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+#
+#######################################################################################################################
+# NOTES
+#
+# Developing extensions:
+#   SEE: https://inkscape.org/develop/extensions/
+#   SEE: https://wiki.inkscape.org/wiki/Python_modules_for_extensions
+#   SEE: https://wiki.inkscape.org/wiki/Using_the_Command_Line
+#
+# Implementation References:
+#   SEE: https://github.com/nshkurkin/inkscape-export-layer-combos
+
+import re
+
+import inkex
+
+from utils import *
+
+#######################################################################################################################
+
+REFERENCE = re.compile(r"""(?:url\(\s*['"]?#|^#|;\s*#)([^)'"\s;]+)""")
+EDITOR_ELEMENTS = [inkex.addNS('metadata', 'svg'), inkex.addNS('guide', 'sodipodi'), inkex.addNS('grid', 'inkscape')]
+# The page color, opacity and pages of the named view are rendered, only the state of the editor is removed
+EDITOR_ATTRIBUTES = ['bordercolor', 'borderopacity', 'showgrid', 'showguides', inkex.addNS('zoom', 'inkscape'), 
+                     inkex.addNS('cx', 'inkscape'), inkex.addNS('cy', 'inkscape'), inkex.addNS('window-width', 'inkscape'), 
+                     inkex.addNS('window-height', 'inkscape'), inkex.addNS('window-x', 'inkscape'), 
+                     inkex.addNS('window-y', 'inkscape'), inkex.addNS('window-maximized', 'inkscape'), 
+                     inkex.addNS('current-layer', 'inkscape'), inkex.addNS('deskcolor', 'inkscape'), 
+                     inkex.addNS('showpageshadow', 'inkscape'), inkex.addNS('pageshadow', 'inkscape')]
+
+#######################################################################################################################
+
+def is_hidden(element) :
+    """
+    Check if an element is not displayed, which its descendants cannot override
+    """
+    return element.get('display') == "none" or inkex.Style(element.get('style') or "").get('display') == "none"
+
+def has_mgrep_attribute(element) :
+    """
+    Check if an element or one of its descendants has an attribute used by the export
+    """
+    return any(any(str(name).startswith("mgrep-") for name in descendant.attrib) 
+               for descendant in element.iter() if isinstance(descendant.tag, str))
+
+def get_ids(element) :
+    """
+    Return the ids of an element and of its descendants
+    """
+    return set(descendant.get('id') for descendant in element.iter() 
+               if isinstance(descendant.tag, str) and descendant.get('id') is not None)
+
+def get_own_references(element) :
+    """
+    Return the ids referenced by the attributes of an element, or by its text if it is a stylesheet
+    """
+    references = set()
+    for value in element.attrib.values() :
+        if "#" in value :
+            references.update(REFERENCE.findall(value))
+    if element.tag == inkex.addNS('style', 'svg') and element.text :
+        references.update(REFERENCE.findall(element.text))
+    return references
+
+def get_references(element) :
+    """
+    Return the ids referenced by an element and its descendants
+    """
+    references = set()
+    for descendant in element.iter() :
+        if isinstance(descendant.tag, str) :
+            references.update(get_own_references(descendant))
+    return references
+
+def is_in_defs(element) :
+    """
+    Check if an element is inside the <defs> of the document
+    """
+    return any(ancestor.tag == inkex.addNS('defs', 'svg') for ancestor in element.iterancestors())
+
+def prune_hidden_elements(root, references) :
+    """
+    Remove the hidden elements out of the <defs>, unless the export uses them or they are referenced
+    """
+    removed = 0
+    for element in list(root.iter()) :
+        # The descendants of a removed element are not in the document anymore
+        if not isinstance(element.tag, str) or element is root or element.getroottree().getroot() is not root :
+            continue
+        if element.tag == inkex.addNS('defs', 'svg') or not is_hidden(element) or is_in_defs(element) :
+            continue
+        if has_mgrep_attribute(element) or len(get_ids(element) & references) > 0 :
+            continue
+        removed += sum(1 for descendant in element.iter() if isinstance(descendant.tag, str))
+        element.getparent().remove(element)
+    return removed
+
+def prune_unused_definitions(root) :
+    """
+    Remove the definitions not referenced, even indirectly, by the elements out of the <defs>
+    """
+    definitions = [child for defs in root.iter(inkex.addNS('defs', 'svg')) for child in defs if isinstance(child.tag, str)]
+    definition_ids = dict((definition_id, definition) for definition in definitions for definition_id in get_ids(definition))
+    
+    references = set()
+    for element in root.iter() :
+        if isinstance(element.tag, str) and element.tag != inkex.addNS('defs', 'svg') and not is_in_defs(element) :
+            references.update(get_own_references(element))
+    
+    # The definitions referenced by the used ones are also used
+    used = set(definition for definition in definitions if has_mgrep_attribute(definition))
+    pending = list(references) + [reference for definition in used for reference in get_references(definition)]
+    while len(pending) > 0 :
+        definition = definition_ids.get(pending.pop())
+        if definition is not None and definition not in used :
+            used.add(definition)
+            pending.extend(get_references(definition))
+    
+    removed = 0
+    for definition in definitions :
+        if definition not in used :
+            removed += sum(1 for descendant in definition.iter() if isinstance(descendant.tag, str))
+            definition.getparent().remove(definition)
+    return removed
+
+def prune_editor_elements(root) :
+    """
+    Remove the metadata, the guides, the grids and the state of the editor, 
+    keeping the named view which holds the page background
+    """
+    removed = 0
+    for element in list(root.iter(*EDITOR_ELEMENTS)) :
+        removed += sum(1 for descendant in element.iter() if isinstance(descendant.tag, str))
+        element.getparent().remove(element)
+    for namedview in root.iter(inkex.addNS('namedview', 'sodipodi')) :
+        for name in EDITOR_ATTRIBUTES :
+            namedview.attrib.pop(name, None)
+    return removed
+
+def prune_svg(root) :
+    """
+    Remove what is never rendered from a document, keeping what the export uses,
+    and return the number of removed elements
+    """
+    removed = prune_editor_elements(root)
+    removed += prune_hidden_elements(root, get_references(root))
+    removed += prune_unused_definitions(root)
+    return removed
+
+#######################################################################################################################
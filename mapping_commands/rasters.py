@@ -0,0 +1,305 @@
+#! /usr/bin/env python3
+#######################################################################################################################
+#  Copyright (c) 2023 Vincent LAMBERT
+#  License: MIT
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+# 
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+# 
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+#
+#######################################################################################################################
+# NOTES
+#
+# Developing extensions:
+#   SEE: https://inkscape.org/develop/extensions/
+#   SEE: https://wiki.inkscape.org/wiki/Python_modules_for_extensions
+#   SEE: https://wiki.inkscape.org/wiki/Using_the_Command_Line
+#
+# Implementation References:
+#   SEE: https://github.com/nshkurkin/inkscape-export-layer-combos
+
+import io
+import struct
+import threading
+import time
+import zlib
+
+import numpy as np
+
+from utils import *
+
+#######################################################################################################################
+
+PILLOW_FORMATS = { PNG : "PNG",
+                   JPG : "JPEG"}
+JPG_BACKGROUND = (255, 255, 255)
+
+def has_pillow() :
+    """
+    Check if Pillow is available to process the rasters in-process
+    """
+    try :
+        import PIL.Image
+    except ImportError :
+        return False
+    return True
+
+def has_cairosvg() :
+    """
+    Check if CairoSVG is available to rasterize the svg documents in-process
+    """
+    try :
+        import cairosvg
+    except (ImportError, OSError) :
+        return False
+    return True
+
+def rasterize_svg(svg_document, dpi) :
+    """
+    Return the PNG image of a serialized svg document rendered in-process
+    """
+    import cairosvg
+    return cairosvg.svg2png(bytestring=svg_document, dpi=dpi)
+
+def load_raster(content) :
+    """
+    Return the image of an exported raster
+    """
+    from PIL import Image
+    image = Image.open(io.BytesIO(content))
+    image.load()
+    return image
+
+def resize_raster(image, scale) :
+    """
+    Return the image downsampled by the given scale
+    """
+    from PIL import Image
+    if scale == 1 :
+        return image
+    size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    return image.resize(size, Image.LANCZOS)
+
+def encode_raster(image, filetype, dpi) :
+    """
+    Return the content of the image exported as the given filetype
+    """
+    from PIL import Image
+    if filetype == JPG and image.mode != "RGB" :
+        # JPEG has no transparency, flatten the image on a white background
+        background = Image.new("RGB", image.size, JPG_BACKGROUND)
+        background.paste(image, mask=image.convert("RGBA").getchannel("A"))
+        image = background
+    buffer = io.BytesIO()
+    image.save(buffer, PILLOW_FORMATS[filetype], dpi=(dpi, dpi))
+    return buffer.getvalue()
+
+def get_raster_difference(first, second) :
+    """
+    Return the mean absolute difference per channel of two rasters, infinite if their sizes differ
+    """
+    first_image, second_image = load_raster(first).convert("RGBA"), load_raster(second).convert("RGBA")
+    if first_image.size != second_image.size :
+        return float("inf")
+    difference = np.abs(np.asarray(first_image, dtype=np.int16) - np.asarray(second_image, dtype=np.int16))
+    return float(difference.mean())
+
+def crop_raster(image, box, viewbox) :
+    """
+    Return the part of a page raster inside a box given in the user units of the page
+    """
+    x, y, width, height = viewbox
+    scale_x, scale_y = image.width / width, image.height / height
+    left, top = max(0, round((box[0] - x) * scale_x)), max(0, round((box[1] - y) * scale_y))
+    right, bottom = min(image.width, round((box[2] - x) * scale_x)), min(image.height, round((box[3] - y) * scale_y))
+    return image.crop((left, top, max(left+1, right), max(top+1, bottom)))
+
+#######################################################################################################################
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+PNG_FILTERS = { "none" : 0,
+                "sub" : 1,
+                "up" : 2,
+                "average" : 3,
+                "paeth" : 4,
+                "adaptive" : None}
+# PNG color type and bytes per pixel of the 8 bits image modes
+PNG_COLOR_TYPES = { "L" : (0, 1),
+                    "RGB" : (2, 3),
+                    "P" : (3, 1),
+                    "LA" : (4, 2),
+                    "RGBA" : (6, 4)}
+# Chunks of the original PNG kept in the optimized one
+PNG_KEPT_CHUNKS = [b"pHYs", b"sRGB", b"gAMA"]
+
+def read_png_chunks(content) :
+    """
+    Return the (type, data) chunks of a PNG file
+    """
+    if not content.startswith(PNG_SIGNATURE) :
+        raise ValueError("Not a PNG file")
+    chunks = []
+    position = len(PNG_SIGNATURE)
+    while position < len(content) :
+        length, chunk_type = struct.unpack(">I4s", content[position:position+8])
+        chunks.append((chunk_type, content[position+8:position+8+length]))
+        position += 12 + length
+    return chunks
+
+def write_png_chunks(chunks) :
+    """
+    Return the PNG file made of the given (type, data) chunks
+    """
+    parts = [PNG_SIGNATURE]
+    for chunk_type, data in chunks :
+        parts.append(struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", zlib.crc32(chunk_type + data)))
+    return b"".join(parts)
+
+def recompress_png(content, level) :
+    """
+    Return the PNG with its image data compressed again at the given zlib level,
+    the filtered scanlines being kept as they are. This only needs zlib.
+    """
+    chunks = read_png_chunks(content)
+    data = zlib.decompress(b"".join(data for chunk_type, data in chunks if chunk_type == b"IDAT"))
+    other_chunks = [(chunk_type, data) for chunk_type, data in chunks if chunk_type not in [b"IDAT", b"IEND"]]
+    return write_png_chunks(other_chunks + [(b"IDAT", zlib.compress(data, level)), (b"IEND", b"")])
+
+def filter_scanlines(pixels, bytes_per_pixel, png_filter) :
+    """
+    Return the filtered scanlines of an H x (W * bytes per pixel) array, 
+    each one preceded by its filter type. Every filter only depends on the unfiltered
+    neighbours of a byte, thus all the rows are filtered at once. The adaptive filter
+    picks for each row the filter with the lowest sum of absolute differences.
+    """
+    raw = pixels.astype(np.int16)
+    left = np.zeros_like(raw)
+    left[:, bytes_per_pixel:] = raw[:, :-bytes_per_pixel]
+    up = np.zeros_like(raw)
+    up[1:] = raw[:-1]
+    up_left = np.zeros_like(raw)
+    up_left[1:, bytes_per_pixel:] = raw[:-1, :-bytes_per_pixel]
+    
+    def paeth() :
+        estimate = left + up - up_left
+        distance_left, distance_up, distance_up_left = np.abs(estimate - left), np.abs(estimate - up), np.abs(estimate - up_left)
+        return np.where((distance_left <= distance_up) & (distance_left <= distance_up_left), left, 
+                        np.where(distance_up <= distance_up_left, up, up_left))
+    
+    predictors = { 0 : lambda : 0, 1 : lambda : left, 2 : lambda : up, 3 : lambda : (left + up) // 2, 4 : paeth}
+    filter_types = [PNG_FILTERS[png_filter]] if PNG_FILTERS[png_filter] is not None else sorted(predictors)
+    filtered = np.stack([((raw - predictors[filter_type]()) % 256).astype(np.uint8) for filter_type in filter_types])
+    
+    if len(filter_types) == 1 :
+        row_filters = np.full(raw.shape[0], filter_types[0], dtype=np.uint8)
+        rows = filtered[0]
+    else :
+        # Bytes are seen as signed differences to estimate how well each row compresses
+        costs = np.abs(filtered.view(np.int8).astype(np.int32)).sum(axis=2)
+        best = np.argmin(costs, axis=0)
+        row_filters = np.array(filter_types, dtype=np.uint8)[best]
+        rows = filtered[best, np.arange(raw.shape[0])]
+    return np.hstack([row_filters[:, None], rows]).tobytes()
+
+def encode_png(image, level, png_filter, kept_chunks=None) :
+    """
+    Return the PNG file of an 8 bits image, filtered and compressed as given,
+    with the given ancillary (type, data) chunks
+    """
+    if image.mode not in PNG_COLOR_TYPES :
+        image = image.convert("RGBA")
+    color_type, bytes_per_pixel = PNG_COLOR_TYPES[image.mode]
+    pixels = np.asarray(image, dtype=np.uint8).reshape(image.height, image.width * bytes_per_pixel)
+    
+    chunks = [(b"IHDR", struct.pack(">IIBBBBB", image.width, image.height, 8, color_type, 0, 0, 0))]
+    if image.mode == "P" :
+        palette = image.getpalette("RGBA")[:4 * (int(pixels.max()) + 1)]
+        chunks.append((b"PLTE", bytes(value for index, value in enumerate(palette) if index % 4 != 3)))
+        alphas = bytes(palette[3::4]).rstrip(b"\xff")
+        if len(alphas) > 0 :
+            chunks.append((b"tRNS", alphas))
+    chunks.extend(kept_chunks or [])
+    chunks.append((b"IDAT", zlib.compress(filter_scanlines(pixels, bytes_per_pixel, png_filter), level)))
+    chunks.append((b"IEND", b""))
+    return write_png_chunks(chunks)
+
+def optimize_png(content, level, png_filter, colors) :
+    """
+    Return the PNG recompressed with the given zlib level and filter, and quantized
+    to a palette of the given number of colors if it is not 0. 
+    The original is returned if it is smaller. Without Pillow, the image data 
+    is only compressed again.
+    """
+    if not has_pillow() :
+        optimized = recompress_png(content, level)
+        return optimized if len(optimized) < len(content) else content
+    
+    from PIL import Image
+    image = load_raster(content)
+    if colors > 0 :
+        image = image.convert("RGBA").quantize(colors, method=Image.Quantize.FASTOCTREE)
+    elif image.mode == "P" :
+        # The transparency of an existing palette may be given apart from it
+        image = image.convert("RGBA")
+    kept_chunks = [(chunk_type, data) for chunk_type, data in read_png_chunks(content) if chunk_type in PNG_KEPT_CHUNKS]
+    optimized = encode_png(image, level, png_filter, kept_chunks)
+    return optimized if len(optimized) < len(content) else content
+
+class PngOptimizer(object):
+    """
+    Recompress the exported PNG files. It is called from the threads handling 
+    the render outputs, thus it overlaps with the renders, and keeps the count 
+    of the bytes saved and the time spent.
+    """
+
+    def __init__(self, level, png_filter, colors, logit):
+        if png_filter not in PNG_FILTERS :
+            raise RuntimeError(f"Unknown PNG filter '{png_filter}'. Expected value is one of {list(PNG_FILTERS)}")
+        self.level = level
+        self.png_filter = png_filter
+        self.colors = colors
+        self.logit = logit
+        self.lock = threading.Lock()
+        self.count = 0
+        self.original_size = 0
+        self.optimized_size = 0
+        self.seconds = 0.0
+    
+    def optimize(self, content) :
+        """
+        Return the optimized content of a PNG file
+        """
+        start = time.perf_counter()
+        optimized = optimize_png(content, self.level, self.png_filter, self.colors)
+        with self.lock :
+            self.count += 1
+            self.original_size += len(content)
+            self.optimized_size += len(optimized)
+            self.seconds += time.perf_counter() - start
+        return optimized
+    
+    def report(self) :
+        """
+        Log the bytes saved and the time spent
+        """
+        if self.count == 0 :
+            return
+        saved = self.original_size - self.optimized_size
+        self.logit(f"PNG optimization: {self.count} files, {self.original_size} -> {self.optimized_size} bytes "
+                   f"({saved} saved, {100 * saved / max(1, self.original_size):.1f}%), {self.seconds:.2f}s spent")
+
+#######################################################################################################################
@@ -68,23 +68,19 @@ def get_mg_layer_refs(layer_refs, logit) :
 class LayerRef(object):
     """
     A wrapper around an Inkscape XML layer object plus some helper data for doing combination exports.
+    Its attributes are slotted to keep the layer index compact on large documents.
     """
 
+    __slots__ = ("source", "id", "label", "children", "parent", "mg_export_specs", "described_mg")
+
     def __init__(self, source: etree.Element):
         self.source = source
         self.id = source.attrib["id"]
         label_attrib_name = LayerRef.get_layer_attrib_name(source)
         self.label = source.attrib[label_attrib_name]
         self.children = list()
-        self.non_layer_children_style = dict()
-        self.non_layer_children_initial_path = dict()
         self.parent = None
 
-        self.export_specs = list()
-        self.request_hidden_state = False
-        self.requested_hidden = False
-        self.sibling_ids = list()
-
         self.mg_export_specs = MicrogestureExportSpec.create_specs(self)
         self.described_mg = source.attrib["mgrep-microgesture-layer"] if "mgrep-microgesture-layer" in source.attrib else None
 
@@ -104,6 +100,8 @@ class MicrogestureExportSpec(object):
 
     ATTR_ID = "mgrep-microgesture-layer"
 
+    __slots__ = ("spec", "layer", "microgesture", "characteristic")
+
     def __init__(self, spec: str, layer: object, microgesture: str, characteristic: str):
         self.spec = spec
         self.layer = layer
@@ -0,0 +1,226 @@
+#! /usr/bin/env python3
+#######################################################################################################################
+#  Copyright (c) 2023 Vincent LAMBERT
+#  License: MIT
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+# 
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+# 
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+#
+#######################################################################################################################
+# NOTES
+#
+# Developing extensions:
+#   SEE: https://inkscape.org/develop/extensions/
+#   SEE: https://wiki.inkscape.org/wiki/Python_modules_for_extensions
+#   SEE: https://wiki.inkscape.org/wiki/Using_the_Command_Line
+#
+# Implementation References:
+#   SEE: https://github.com/nshkurkin/inkscape-export-layer-combos
+
+import sys
+sys.path.append('/usr/share/inkscape/extensions')
+import inkex
+
+import json
+import logging
+import os
+import socketserver
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+from compute_svg import *
+from mapping_commands import CommandExport
+from renderers import *
+from utils import *
+
+#######################################################################################################################
+
+CONTENT_TYPES = { PNG : "image/png",
+                  PDF : "application/pdf",
+                  SVG : "image/svg+xml"}
+
+class RenderDaemon(CommandExport):
+    """
+    A long-running process keeping the parsed document, the layer index, 
+    the command icons and an Inkscape shell warm to render one mapping per request.
+    
+    Requests:
+        GET /mappings                          the names of the configured mappings
+        GET /render?name=NAME                  the image of a mapping named as in get_mapping_name
+        GET /render?mapping=ROW                the image of a mapping given as a configuration file row
+            [&filetype=png|pdf|svg][&dpi=DPI]
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.arg_parser.add_argument("--host", type=str, dest="host", default="127.0.0.1", help="Address the daemon listens to")
+        self.arg_parser.add_argument("--port", type=int, dest="port", default=8765, help="Port the daemon listens to")
+        self.arg_parser.add_argument("--socket", type=str, dest="socket", default="", help="Unix socket the daemon listens to instead of the port")
+        # A persistent Inkscape shell keeps the renders of the daemon warm
+        self.arg_parser.set_defaults(renderer=SHELL)
+    
+    def effect(self):
+        """
+        Load everything once and serve the render requests until interrupted
+        """
+        self.logit = logging.warning if self.options.debug else logging.info
+        self.load_compute()
+        self.renderer = create_renderer(self.options.renderer, etree.tostring(self.document), CALIBRATION_DPI, 
+                                        self.options.renderer_tolerance, self.options.timeout, self.logit)
+        
+        if self.options.socket :
+            if os.path.exists(self.options.socket) :
+                os.remove(self.options.socket)
+            server = UnixRenderServer(self.options.socket, RenderRequestHandler)
+            logging.warning(f"Render daemon listening on {self.options.socket}")
+        else :
+            server = HTTPServer((self.options.host, self.options.port), RenderRequestHandler)
+            logging.warning(f"Render daemon listening on http://{self.options.host}:{self.options.port}")
+        server.render_daemon = self
+        
+        try :
+            server.serve_forever()
+        except KeyboardInterrupt :
+            pass
+        finally :
+            server.server_close()
+            self.renderer.close()
+            if self.options.socket and os.path.exists(self.options.socket) :
+                os.remove(self.options.socket)
+        return False
+    
+    def load_compute(self):
+        """
+        Index the document and load the mappings and the command icons
+        """
+        self.source_stamp = self.get_source_stamp()
+        self.compute = ComputeSVG(self)
+        self.mappings = self.compute.prepare(self.logit)
+        self.mapping_names = [get_mapping_name(mapping) for mapping in self.mappings]
+    
+    def get_source_stamp(self):
+        """
+        Return the modification times of the source document and configuration file
+        """
+        stamp = []
+        for file_path in [self.options.input_file, os.path.expanduser(self.options.config)] :
+            if isinstance(file_path, str) and os.path.isfile(file_path) :
+                stamp.append(os.stat(file_path).st_mtime_ns)
+            else :
+                stamp.append(None)
+        return stamp
+    
+    def reload_if_changed(self):
+        """
+        Load the source document again if it changed since the last request
+        """
+        if self.get_source_stamp() == self.source_stamp :
+            return
+        logging.warning("The source files changed, reloading")
+        self.reload_document()
+        self.load_compute()
+    
+    def render(self, mapping, filetype, dpi):
+        """
+        Return the image of a mapping of the current sources
+        """
+        self.logit(f"Rendering {get_mapping_name(mapping)} as {filetype}")
+        svg_document = self.compute.build_mapping_document(mapping, self.logit)
+        if filetype == SVG :
+            return svg_document
+        return self.renderer.render(svg_document, filetype, dpi)
+
+#######################################################################################################################
+
+class UnixRenderServer(socketserver.UnixStreamServer):
+    """
+    An HTTP server listening to a Unix socket
+    """
+    pass
+
+class RenderRequestHandler(BaseHTTPRequestHandler):
+    """
+    The HTTP interface of the render daemon
+    """
+
+    def do_GET(self):
+        daemon = self.server.render_daemon
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        
+        if url.path == "/mappings" :
+            daemon.reload_if_changed()
+            self.send_content(json.dumps(daemon.mapping_names).encode("utf-8"), "application/json")
+        elif url.path == "/render" :
+            if "mapping" in query :
+                row = query["mapping"][0].split(",")
+            elif "name" in query :
+                row = [f"{mg}_{charac}-{command}" for (mg, charac), command in parse_mapping_name(query["name"][0])]
+                if len(row) == 0 :
+                    self.send_error(400, "Invalid mapping name", query["name"][0])
+                    return
+            else :
+                self.send_error(400, "A 'mapping' or 'name' parameter is required")
+                return
+            # The mapping is checked against the current layers
+            daemon.reload_if_changed()
+            # Only the icons loaded for the configuration can be drawn
+            report = validate_configuration([(1, row)], daemon.compute.mg_layer_refs, 
+                                            daemon.compute.icon_library.icons.keys(), daemon.logit)
+            if not report.is_valid() :
+                self.send_error(400, "Invalid mapping", str(report))
+                return
+            mapping = next(iter(report.mappings))
+            filetype = query.get("filetype", daemon.get_filetypes())[0]
+            if filetype not in CONTENT_TYPES :
+                self.send_error(400, f"Unsupported filetype '{filetype}'")
+                return
+            try :
+                dpi = float(query.get("dpi", daemon.get_dpis())[0])
+                content = daemon.render(mapping, filetype, dpi)
+            except Exception as error :
+                logging.exception("Render failed")
+                self.send_error(500, "Render failed", str(error))
+                return
+            self.send_content(content, CONTENT_TYPES[filetype])
+        else :
+            self.send_error(404)
+    
+    def send_content(self, content, content_type):
+        """
+        Send a successful response
+        """
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+    
+    def log_message(self, format, *args):
+        logging.info(format % args)
+
+#######################################################################################################################
+
+def _main():
+    daemon = RenderDaemon()
+    daemon.run()
+
+if __name__ == "__main__":
+    _main()
+
+#######################################################################################################################
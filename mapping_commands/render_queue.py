@@ -0,0 +1,209 @@
+#! /usr/bin/env python3
+#######################################################################################################################
+#  Copyright (c) 2023 Vincent LAMBERT
+#  License: MIT
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+# 
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+# 
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+#
+#######################################################################################################################
+# NOTES
+#
+# Developing extensions:
+#   SEE: https://inkscape.org/develop/extensions/
+#   SEE: https://wiki.inkscape.org/wiki/Python_modules_for_extensions
+#   SEE: https://wiki.inkscape.org/wiki/Using_the_Command_Line
+#
+# Implementation References:
+#   SEE: https://github.com/nshkurkin/inkscape-export-layer-combos
+
+import asyncio
+import concurrent.futures
+import logging
+import threading
+import time
+
+from utils import *
+from progress import *
+
+#######################################################################################################################
+
+RETRY_BACKOFF = 1.0
+
+class RenderError(Exception):
+    """
+    A render command that failed, timed out or exited with an error code
+    """
+    pass
+
+class RenderScheduler(object):
+    """
+    Run the render commands of the exported mappings in an asyncio event loop living 
+    in a background thread, so that the next mappings are built while the previous ones render.
+    
+    Each render is a pipeline of commands : the serialized svg is given to the first one
+    and the output of each command is given to the next one. A command is either a process
+    or a function of an in-process renderer run in a thread. The commands are run without 
+    a shell, their outputs are always drained, and a failing render is retried with 
+    an exponential backoff before being reported as a failure of its mapping.
+    """
+
+    def __init__(self, workers, timeout, retries, logit, progress=None):
+        self.workers = max(1, workers)
+        self.progress = progress
+        self.timeout = timeout
+        self.retries = max(0, retries)
+        self.logit = logit
+        self.failures = dict()
+        self.futures = list()
+        # Bound the number of pending renders so that the serialized 
+        # documents waiting to be rendered do not pile up in memory
+        self.pending = threading.BoundedSemaphore(2 * self.workers)
+        
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        self.semaphore = asyncio.run_coroutine_threadsafe(self.create_semaphore(), self.loop).result()
+    
+    async def create_semaphore(self):
+        return asyncio.Semaphore(self.workers)
+    
+    def submit(self, label, document, commands, on_output):
+        """
+        Schedule the render of a mapping
+        on_output is called with the output of the last command once it succeeded
+        """
+        self.pending.acquire()
+        # Forget the renders that already ended so that the list does not grow with the mappings
+        self.futures = [future for future in self.futures if not self.is_finished(future)]
+        future = asyncio.run_coroutine_threadsafe(self.run_render(label, document, commands, on_output), self.loop)
+        future.add_done_callback(lambda _ : self.pending.release())
+        self.futures.append(future)
+    
+    @staticmethod
+    def is_finished(future):
+        """
+        Check if a render ended, raising its unexpected errors
+        """
+        if future.done() :
+            future.result()
+            return True
+        return False
+    
+    async def run_render(self, label, document, commands, on_output):
+        """
+        Run the render pipeline of a mapping with retries, 
+        its render slot being released during the backoff
+        """
+        for attempt in range(self.retries + 1) :
+            async with self.semaphore :
+                try :
+                    start = time.perf_counter()
+                    output = document
+                    for command in commands :
+                        if callable(command) :
+                            output = await self.run_function(command, output)
+                        else :
+                            output = await self.run_command(command, output)
+                    self.record(RENDER, start)
+                    # Handle the output out of the event loop as it may process images
+                    start = time.perf_counter()
+                    await asyncio.get_running_loop().run_in_executor(None, on_output, output)
+                    self.record(WRITE, start)
+                    self.end_render(label, True)
+                    return True
+                except (RenderError, OSError) as error :
+                    if attempt == self.retries :
+                        logging.error(f"Render of {label} failed: {error}")
+                        self.failures[label] = str(error)
+                        self.end_render(label, False)
+                        return False
+                    delay = RETRY_BACKOFF * 2 ** attempt
+                    self.logit(f"Render of {label} failed ({error}), retrying in {delay}s")
+            await asyncio.sleep(delay)
+    
+    def record(self, stage, start):
+        """
+        Record the time spent in a stage of a render since the given start
+        """
+        if self.progress is not None :
+            self.progress.record(stage, time.perf_counter() - start)
+    
+    def end_render(self, label, success):
+        if self.progress is not None :
+            self.progress.render_ended(label, success)
+    
+    async def run_command(self, command, input):
+        """
+        Run a command with the given input and return its output
+        """
+        process = await asyncio.create_subprocess_exec(*command, stdin=asyncio.subprocess.PIPE, 
+                                                       stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+        try :
+            stdout, stderr = await asyncio.wait_for(process.communicate(input), self.timeout)
+        except asyncio.TimeoutError :
+            process.kill()
+            await process.communicate()
+            raise RenderError(f"{command[0]} timed out after {self.timeout}s")
+        if process.returncode != 0 :
+            raise RenderError(f"{command[0]} exited with code {process.returncode}: {stderr.decode('utf-8', 'replace').strip()}")
+        return stdout
+    
+    async def run_function(self, function, input):
+        """
+        Run an in-process render function with the given input in a thread and return its output
+        """
+        try :
+            return await asyncio.wait_for(asyncio.get_running_loop().run_in_executor(None, function, input), self.timeout)
+        except asyncio.TimeoutError :
+            raise RenderError(f"The in-process render timed out after {self.timeout}s")
+        except (RuntimeError, TimeoutError, ValueError) as error :
+            raise RenderError(f"The in-process render failed: {error}")
+    
+    def wait(self, timeout=None):
+        """
+        Wait for every scheduled render to end, or at most timeout seconds, 
+        and return whether they all ended
+        """
+        done, pending = concurrent.futures.wait(self.futures, timeout)
+        for future in self.futures :
+            if future in done :
+                future.result()
+        self.futures = [future for future in self.futures if future in pending]
+        return len(self.futures) == 0
+    
+    def close(self):
+        """
+        Wait for every scheduled render and stop the event loop
+        """
+        try :
+            self.wait()
+        finally :
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+            self.loop.close()
+    
+    def report_failures(self):
+        """
+        Raise an error listing the mappings that could not be rendered
+        """
+        if len(self.failures) > 0 :
+            details = "\n".join(f"  {label}: {error}" for label, error in sorted(self.failures.items()))
+            raise RuntimeError(f"{len(self.failures)} mappings could not be rendered:\n{details}")
+
+#######################################################################################################################
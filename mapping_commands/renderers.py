@@ -0,0 +1,362 @@
+#! /usr/bin/env python3
+#######################################################################################################################
+#  Copyright (c) 2023 Vincent LAMBERT
+#  License: MIT
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+# 
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+# 
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+#
+#######################################################################################################################
+# NOTES
+#
+# Developing extensions:
+#   SEE: https://inkscape.org/develop/extensions/
+#   SEE: https://wiki.inkscape.org/wiki/Python_modules_for_extensions
+#   SEE: https://wiki.inkscape.org/wiki/Using_the_Command_Line
+#
+# Implementation References:
+#   SEE: https://github.com/nshkurkin/inkscape-export-layer-combos
+
+import abc
+import logging
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+
+from utils import *
+from rasters import *
+
+#######################################################################################################################
+
+INKSCAPE = "inkscape"
+SHELL = "shell"
+CAIROSVG = "cairosvg"
+AUTO = "auto"
+RENDERERS = [INKSCAPE, SHELL, CAIROSVG, AUTO]
+# Lowest DPI of the calibration render of the auto renderer
+CALIBRATION_DPI = 96.0
+
+#######################################################################################################################
+
+class InkscapeShell(object):
+    """
+    A persistent Inkscape process driven through its interactive shell mode.
+    Consecutive renders reuse the same process and do not pay for the start of Inkscape.
+    """
+
+    PROMPT = b"> "
+
+    def __init__(self, logit, timeout=60.0):
+        self.logit = logit
+        self.timeout = timeout
+        self.process = None
+        self.output = None
+        self.work_dir = tempfile.mkdtemp(prefix="mapping_commands_")
+
+    def start(self):
+        """
+        Start the Inkscape shell and wait for its first prompt
+        """
+        self.logit("Starting the Inkscape shell")
+        self.process = subprocess.Popen(["inkscape", "--shell"], stdin=subprocess.PIPE, 
+                                        stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        self.output = queue.Queue()
+        threading.Thread(target=self.read_output, args=(self.process, self.output), daemon=True).start()
+        self.wait_for_prompt()
+    
+    @staticmethod
+    def read_output(process, output):
+        """
+        Forward the output of the shell to a queue so that it is always drained
+        """
+        while True :
+            chunk = process.stdout.read1(4096)
+            if not chunk :
+                output.put(None)
+                break
+            output.put(chunk)
+    
+    def wait_for_prompt(self):
+        """
+        Return the output of the shell until its next prompt
+        """
+        buffer = b""
+        deadline = time.monotonic() + self.timeout
+        while not buffer.endswith(self.PROMPT) :
+            remaining = deadline - time.monotonic()
+            try :
+                chunk = self.output.get(timeout=max(remaining, 0))
+            except queue.Empty :
+                self.close_process()
+                raise TimeoutError(f"The Inkscape shell did not answer within {self.timeout}s")
+            if chunk is None :
+                self.close_process()
+                raise RuntimeError(f"The Inkscape shell exited: {buffer.decode('utf-8', 'replace')}")
+            buffer += chunk
+        return buffer
+    
+    def run_actions(self, actions):
+        """
+        Run a list of Inkscape actions and return the output of the shell
+        """
+        if self.process is None or self.process.poll() is not None :
+            self.start()
+        self.process.stdin.write((";".join(actions) + "\n").encode("utf-8"))
+        self.process.stdin.flush()
+        return self.wait_for_prompt()
+    
+    def render(self, svg_document, filetype, dpi):
+        """
+        Render a serialized svg document and return the content of the exported file
+        """
+        svg_path = os.path.join(self.work_dir, f"render.{SVG}")
+        output_path = os.path.join(self.work_dir, f"render.{filetype}")
+        with open(svg_path, 'wb') as file :
+            file.write(svg_document)
+        if os.path.exists(output_path) :
+            os.remove(output_path)
+        
+        output = self.run_actions([f"file-open:{svg_path}", f"export-type:{filetype}", f"export-dpi:{dpi}",
+                                   f"export-filename:{output_path}", "export-do", "file-close"])
+        if not os.path.exists(output_path) :
+            raise RuntimeError(f"Inkscape did not export the {filetype} file: {output.decode('utf-8', 'replace')}")
+        with open(output_path, 'rb') as file :
+            return file.read()
+    
+    def close_process(self):
+        """
+        Stop the Inkscape process
+        """
+        if self.process is not None and self.process.poll() is None :
+            try :
+                self.process.stdin.write(b"quit\n")
+                self.process.stdin.flush()
+                self.process.wait(timeout=10)
+            except (OSError, subprocess.TimeoutExpired) :
+                self.process.kill()
+                self.process.wait()
+        if self.process is not None :
+            self.process.stdin.close()
+            self.process.stdout.close()
+        self.process = None
+    
+    def close(self):
+        """
+        Stop the Inkscape process and remove its working directory
+        """
+        self.close_process()
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+#######################################################################################################################
+
+def convert_text_to_paths(svg_document, timeout):
+    """
+    Convert the texts of a serialized svg document to paths with a single call to Inkscape
+    """
+    command = ["inkscape", "--pipe", f"--export-type={SVG}", "--export-text-to-path", "--export-plain-svg", 
+               "--export-filename=-"]
+    result = subprocess.run(command, input=svg_document, capture_output=True, timeout=timeout, check=True)
+    return result.stdout
+
+def get_inkscape_command(filetype, dpi):
+    """
+    Return the Inkscape command rendering a serialized svg read from its standard input
+    """
+    return ["inkscape", "--pipe", f"--export-type={filetype}", "-d", str(dpi), "--export-filename=-"]
+
+#######################################################################################################################
+
+class Renderer(abc.ABC):
+    """
+    A backend rendering serialized svg documents to some filetypes
+    """
+    name = None
+    filetypes = []
+    
+    def __init__(self, logit, timeout):
+        self.logit = logit
+        self.timeout = timeout
+    
+    @staticmethod
+    def is_available():
+        return True
+    
+    @abc.abstractmethod
+    def render(self, svg_document, filetype, dpi):
+        """
+        Return the content of the given serialized svg rendered as the given filetype
+        """
+    
+    def get_command(self, filetype, dpi):
+        """
+        Return the command of a render pipeline of the scheduler rendering its input as the given filetype,
+        either the arguments of a process or a function run in-process
+        """
+        return lambda svg_document : self.render(svg_document, filetype, dpi)
+    
+    def close(self):
+        pass
+
+class InkscapeRenderer(Renderer):
+    """
+    An Inkscape process per render
+    """
+    name = INKSCAPE
+    filetypes = [PNG, PDF]
+    
+    @staticmethod
+    def is_available():
+        return shutil.which("inkscape") is not None
+    
+    def render(self, svg_document, filetype, dpi):
+        result = subprocess.run(get_inkscape_command(filetype, dpi), input=svg_document, capture_output=True, 
+                                timeout=self.timeout)
+        if result.returncode != 0 :
+            raise RuntimeError(f"inkscape exited with code {result.returncode}: {result.stderr.decode('utf-8', 'replace').strip()}")
+        return result.stdout
+    
+    def get_command(self, filetype, dpi):
+        # The scheduler runs the processes itself without blocking its event loop
+        return get_inkscape_command(filetype, dpi)
+
+class ShellRenderer(Renderer):
+    """
+    Persistent Inkscape shells, one per concurrent render
+    """
+    name = SHELL
+    filetypes = [PNG, PDF]
+    
+    def __init__(self, logit, timeout):
+        super().__init__(logit, timeout)
+        self.idle_shells = queue.Queue()
+        self.shells = []
+        self.lock = threading.Lock()
+    
+    @staticmethod
+    def is_available():
+        return shutil.which("inkscape") is not None
+    
+    def render(self, svg_document, filetype, dpi):
+        try :
+            shell = self.idle_shells.get_nowait()
+        except queue.Empty :
+            shell = InkscapeShell(self.logit, self.timeout)
+            with self.lock :
+                self.shells.append(shell)
+        try :
+            output = shell.render(svg_document, filetype, dpi)
+        except (RuntimeError, TimeoutError, OSError) :
+            # The shell may be left in an unknown state, the next render starts it again
+            shell.close_process()
+            self.idle_shells.put(shell)
+            raise
+        self.idle_shells.put(shell)
+        return output
+    
+    def close(self):
+        with self.lock :
+            for shell in self.shells :
+                shell.close()
+            self.shells = []
+
+class CairoRenderer(Renderer):
+    """
+    CairoSVG rendering in-process
+    """
+    name = CAIROSVG
+    filetypes = [PNG, PDF]
+    
+    @staticmethod
+    def is_available():
+        return has_cairosvg()
+    
+    def render(self, svg_document, filetype, dpi):
+        import cairosvg
+        if filetype == PDF :
+            return cairosvg.svg2pdf(bytestring=svg_document, dpi=dpi)
+        return rasterize_svg(svg_document, dpi)
+
+RENDERER_CLASSES = { INKSCAPE : InkscapeRenderer,
+                     SHELL : ShellRenderer,
+                     CAIROSVG : CairoRenderer}
+
+def create_renderer(name, svg_document, dpi, tolerance, timeout, logit):
+    """
+    Return the renderer of the given name, or the fastest one rendering the given 
+    serialized svg like Inkscape within the given tolerance if the name is auto
+    """
+    if name not in RENDERERS :
+        raise RuntimeError(f"Unknown renderer '{name}'. Expected value is one of {RENDERERS}")
+    if name != AUTO :
+        renderer_class = RENDERER_CLASSES[name]
+        if not renderer_class.is_available() :
+            raise RuntimeError(f"The {name} renderer is not available")
+        return renderer_class(logit, timeout)
+    return calibrate_renderers(svg_document, dpi, tolerance, timeout, logit)
+
+def calibrate_renderers(svg_document, dpi, tolerance, timeout, logit):
+    """
+    Render the given serialized svg with every available renderer and return the fastest one 
+    whose raster differs from the one of an Inkscape process by at most tolerance per channel on average
+    """
+    reference_renderer = InkscapeRenderer(logit, timeout)
+    if not has_pillow() :
+        logging.warning("Pillow is needed to compare the renderers, using the inkscape renderer")
+        return reference_renderer
+    
+    results = []
+    reference = None
+    for renderer_class in [InkscapeRenderer, ShellRenderer, CairoRenderer] :
+        if not renderer_class.is_available() :
+            continue
+        renderer = reference_renderer if renderer_class is InkscapeRenderer else renderer_class(logit, timeout)
+        try :
+            # The first render starts what the next ones reuse
+            renderer.render(svg_document, PNG, dpi)
+            start = time.perf_counter()
+            output = renderer.render(svg_document, PNG, dpi)
+            duration = time.perf_counter() - start
+        except (RuntimeError, TimeoutError, OSError, subprocess.SubprocessError) as error :
+            logging.warning(f"The {renderer.name} renderer failed the calibration: {error}")
+            renderer.close()
+            continue
+        if renderer is reference_renderer :
+            reference = output
+        difference = 0.0 if reference is None else get_raster_difference(reference, output)
+        logit(f"Calibration of the {renderer.name} renderer: {duration*1000:.0f}ms, difference {difference:.2f}")
+        results.append((duration, renderer, difference))
+    
+    candidates = [(duration, renderer) for duration, renderer, difference in results
+                  if reference is not None and difference <= tolerance]
+    if len(candidates) == 0 :
+        logging.warning("No renderer matched the inkscape renderer, using it")
+        for _, renderer, _ in results :
+            renderer.close()
+        return reference_renderer
+    duration, selected = min(candidates, key=lambda candidate : candidate[0])
+    for _, renderer, _ in results :
+        if renderer is not selected :
+            renderer.close()
+    logging.warning(f"Selected the {selected.name} renderer ({duration*1000:.0f}ms per calibration render)")
+    return selected
+
+#######################################################################################################################
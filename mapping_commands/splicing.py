@@ -0,0 +1,146 @@
+#! /usr/bin/env python3
+#######################################################################################################################
+#  Copyright (c) 2023 Vincent LAMBERT
+#  License: MIT
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+# 
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+# 
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+#
+#######################################################################################################################
+# NOTES
+#
+# Developing extensions:
+#   SEE: https://inkscape.org/develop/extensions/
+#   SEE: https://wiki.inkscape.org/wiki/Python_modules_for_extensions
+#   SEE: https://wiki.inkscape.org/wiki/Using_the_Command_Line
+#
+# Implementation References:
+#   SEE: https://github.com/nshkurkin/inkscape-export-layer-combos
+
+from collections import OrderedDict
+
+from lxml import etree
+
+from utils import *
+
+#######################################################################################################################
+
+SLOT_MARKER = "mgrep-slot"
+
+#######################################################################################################################
+
+def get_slot_marker(index) :
+    """
+    Return the serialization of the processing instruction marking a slot
+    """
+    return etree.tostring(etree.ProcessingInstruction(SLOT_MARKER, str(index)))
+
+class DocumentSplicer():
+    """
+    Assemble the serialization of a document with elements added after some of its placeholders
+    from bytes serialized once : the static chunks of the document between the placeholders 
+    and the fragment of each element added after a placeholder
+    """
+    def __init__(self, document, placeholders, logit) :
+        self.document = document
+        # Placeholder of each slot, in the order of the slots
+        self.placeholders = OrderedDict(placeholders)
+        self.logit = logit
+        self.fragments = dict()
+        if len(set(map(id, self.placeholders.values()))) < len(self.placeholders) :
+            raise RuntimeError("Several slots share a placeholder, their elements cannot be spliced")
+        self.split_document()
+    
+    def split_document(self) :
+        """
+        Serialize the document once with a marker after each placeholder 
+        and split it into static chunks on these markers
+        """
+        markers = []
+        for index, placeholder in enumerate(self.placeholders.values()) :
+            marker = etree.ProcessingInstruction(SLOT_MARKER, str(index))
+            parent = placeholder.getparent()
+            parent.insert(parent.index(placeholder)+1, marker)
+            markers.append(marker)
+        try :
+            document = etree.tostring(self.document)
+        finally :
+            for marker in markers :
+                marker.getparent().remove(marker)
+        
+        positions = []
+        for index, slot in enumerate(self.placeholders) :
+            marker = get_slot_marker(index)
+            if document.count(marker) != 1 :
+                raise RuntimeError(f"The slot marker {marker.decode()} is not found once in the document")
+            positions.append((document.index(marker), len(marker), slot))
+        positions.sort(key=lambda position : position[0])
+        
+        # The chunk of index i precedes the i-th slot in the order of the document
+        self.chunks = []
+        self.slot_indexes = dict()
+        start = 0
+        for position, length, slot in positions :
+            self.chunks.append(document[start:position])
+            self.slot_indexes[slot] = len(self.chunks) - 1
+            start = position + length
+        self.chunks.append(document[start:])
+        self.document_bytes = b"".join(self.chunks)
+        self.logit(f"Split the document into {len(self.chunks)} chunks around {len(positions)} slots")
+    
+    def get_offset(self, slot) :
+        """
+        Return the offset of a slot in the serialization of the document without markers
+        """
+        return sum(len(chunk) for chunk in self.chunks[:self.slot_indexes[slot]+1])
+    
+    def get_fragment(self, slot, key, create_element) :
+        """
+        Return the serialization of the element created for a slot, as it is 
+        written in the document, created and serialized once per key
+        """
+        if key not in self.fragments :
+            element = create_element()
+            placeholder = self.placeholders[slot]
+            parent = placeholder.getparent()
+            parent.insert(parent.index(placeholder)+1, element)
+            try :
+                document = etree.tostring(self.document)
+            finally :
+                parent.remove(element)
+            
+            # The document only differs by the fragment inserted at the offset of the slot
+            offset = self.get_offset(slot)
+            length = len(document) - len(self.document_bytes)
+            if document[:offset] != self.document_bytes[:offset] or document[offset+length:] != self.document_bytes[offset:] :
+                raise RuntimeError(f"The fragment of {key} is not inserted at the offset of its slot")
+            self.fragments[key] = document[offset:offset+length]
+        return self.fragments[key]
+    
+    def assemble(self, fragments) :
+        """
+        Return the serialization of the document with the given fragments by slot
+        """
+        parts = [None] * (2 * len(self.chunks) - 1)
+        parts[::2] = self.chunks
+        parts[1::2] = [b""] * (len(self.chunks) - 1)
+        for slot, fragment in fragments.items() :
+            parts[2 * self.slot_indexes[slot] + 1] = fragment
+        return b"".join(parts)
+
+#######################################################################################################################
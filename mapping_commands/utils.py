@@ -73,10 +73,16 @@ MARKER_TYPES=[TRAJ_START, TRAJ_END, ACTUATOR, RECEIVER]
 COORDINATES = "coordinates"
 CIRCLE_RADIUS = "r"
 
+TEMPLATE_PATH = "./Icon/Icon.svg"
+ICON_CACHE_DIR = "~/.cache/mapping_commands"
+
 PNG="png"
 JPG="jpg"
 PDF="pdf"
 SVG="svg"
+FILETYPES = [PNG, JPG, PDF, SVG]
+RASTER_FILETYPES = [PNG, JPG]
+PREVIEW="preview"
 
 DESIGN="design"
 TRACE="trace"
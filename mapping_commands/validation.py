@@ -0,0 +1,217 @@
+#! /usr/bin/env python3
+#######################################################################################################################
+#  Copyright (c) 2023 Vincent LAMBERT
+#  License: MIT
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+# 
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+# 
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+#
+#######################################################################################################################
+# NOTES
+#
+# Developing extensions:
+#   SEE: https://inkscape.org/develop/extensions/
+#   SEE: https://wiki.inkscape.org/wiki/Python_modules_for_extensions
+#   SEE: https://wiki.inkscape.org/wiki/Using_the_Command_Line
+#
+# Implementation References:
+#   SEE: https://github.com/nshkurkin/inkscape-export-layer-combos
+
+from collections import OrderedDict
+
+import numpy as np
+
+from utils import *
+from configuration_file import *
+from icon_cache import *
+
+#######################################################################################################################
+
+MALFORMED = "malformed"
+UNKNOWN_GESTURE = "unknown_gesture"
+DUPLICATE_GESTURE = "duplicate_gesture"
+MISSING_ICON = "missing_icon"
+MISSING_LAYER = "missing_layer"
+ERROR_TYPES = [MALFORMED, UNKNOWN_GESTURE, DUPLICATE_GESTURE, MISSING_ICON]
+
+# Number of rows checked at once, to keep the entries of large configurations out of memory
+VALIDATION_CHUNK_SIZE = 4096
+# Number of errors written in the report, the others are only counted
+MAX_REPORTED_ERRORS = 20
+
+#######################################################################################################################
+
+class ValidationError(RuntimeError):
+    """
+    Raised when the configuration does not match the document or the icons
+    """
+    def __init__(self, report):
+        super().__init__(str(report))
+        self.report = report
+
+class ValidationReport(object):
+    """
+    Errors found in the configuration, grouped by row of the configuration file,
+    and warnings grouped by gesture since they concern every row using it
+    """
+    def __init__(self, row_count=0):
+        self.row_count = row_count
+        self.problems = OrderedDict()
+        # [message, number of rows, first line] by kind and gesture
+        self.warnings = OrderedDict()
+        self.mappings = []
+    
+    def add(self, line, kind, entry, message) :
+        self.problems.setdefault(line, []).append((kind, entry, message))
+    
+    def warn(self, line, kind, key, message, count=1) :
+        """
+        Count a warning for count rows, the first of them being at the given line
+        """
+        warning = self.warnings.setdefault((kind, key), [message, 0, line])
+        warning[1] += count
+        warning[2] = min(warning[2], line)
+    
+    def get_invalid_lines(self) :
+        """
+        Return the lines of the rows having at least one error
+        """
+        return sorted(self.problems)
+    
+    def is_valid(self) :
+        return len(self.problems) == 0
+    
+    def to_dict(self) :
+        return {"rows" : self.row_count, 
+                "invalid_rows" : len(self.problems),
+                "problems" : [{"line" : line, "type" : kind, "entry" : entry, "message" : message} 
+                              for line, problems in sorted(self.problems.items()) for kind, entry, message in problems],
+                "warnings" : [{"type" : kind, "gesture" : key, "message" : message, "rows" : count, "first_line" : line} 
+                              for (kind, key), (message, count, line) in self.warnings.items()]}
+    
+    def __str__(self) :
+        lines = [f"Configuration check: {len(self.problems)} invalid rows out of {self.row_count}"]
+        error_count = 0
+        for line, problems in sorted(self.problems.items()) :
+            for kind, entry, message in problems :
+                if error_count < MAX_REPORTED_ERRORS :
+                    lines.append(f"  row {line}: error: {entry}: {message}")
+                error_count += 1
+        if error_count > MAX_REPORTED_ERRORS :
+            lines.append(f"  ... and {error_count - MAX_REPORTED_ERRORS} more errors")
+        for (kind, key), (message, count, line) in self.warnings.items() :
+            lines.append(f"  warning: {message}, used by {count} rows, first at line {line}")
+        return "\n".join(lines)
+
+#######################################################################################################################
+
+def split_entry(entry) :
+    """
+    Return the microgesture, characteristic and command of a configuration entry
+    of the form "microgesture_characteristic-command", or None if it is malformed
+    """
+    parts = entry.strip().split('-')
+    if len(parts) != 2 or len(parts[0].split('_')) != 2 or parts[1] == "" :
+        return None
+    mg, charac = parts[0].split('_')
+    return mg, charac, parts[1]
+
+def get_document_slots(mg_layer_refs) :
+    """
+    Return the "microgesture_characteristic" slots having at least one layer in the document
+    """
+    return [f"{mg}_{charac}" for mg, charac_layer_refs in mg_layer_refs.items() 
+            for charac, layer_refs in charac_layer_refs.items() if len(layer_refs) > 0]
+
+def validate_configuration(rows, mg_layer_refs, available_icons, logit) :
+    """
+    Check every row of the configuration against the layers of the document
+    and the available command icons, and return the report of the problems found
+    along with the mappings of the valid rows, lazily parsed from the rows
+    """
+    report = ValidationReport()
+    known_slots = np.array([f"{mg}_{charac}" for mg in MICROGESTURES for charac in MICROGESTURE_CHARACTERISTICS[mg]])
+    document_slots = np.array(get_document_slots(mg_layer_refs), dtype=str)
+    icons = np.array(sorted(available_icons), dtype=str)
+    chunk = []
+    for line, row in rows :
+        report.row_count += 1
+        chunk.append((line, row))
+        if len(chunk) == VALIDATION_CHUNK_SIZE :
+            validate_rows(report, chunk, known_slots, document_slots, icons)
+            chunk = []
+    validate_rows(report, chunk, known_slots, document_slots, icons)
+    
+    invalid_lines = set(report.get_invalid_lines())
+    report.mappings = LazyMappings(rows, invalid_lines, report.row_count - len(invalid_lines))
+    logit(str(report))
+    return report
+
+def validate_rows(report, rows, known_slots, document_slots, icons) :
+    """
+    Add the problems of the given rows to the report, checking all their entries at once
+    """
+    lines, slots, commands, entries = [], [], [], []
+    for line, row in rows :
+        for entry in row :
+            parsed = split_entry(entry)
+            if parsed is None :
+                report.add(line, MALFORMED, entry, 'expected "microgesture_characteristic-command"')
+                continue
+            mg, charac, command = parsed
+            lines.append(line)
+            slots.append(f"{mg}_{charac}")
+            commands.append(command)
+            entries.append(entry)
+    if len(entries) == 0 :
+        return
+    
+    lines = np.array(lines, dtype=np.int64)
+    slots = np.array(slots, dtype=str)
+    commands = np.array(commands, dtype=str)
+    is_known = np.isin(slots, known_slots)
+    has_layer = np.isin(slots, document_slots)
+    has_icon = np.isin(commands, icons)
+    # An entry is a duplicate if its slot was already given earlier in the same row
+    keys = np.char.add(np.char.add(lines.astype(str), "|"), slots)
+    _, first_indices = np.unique(keys, return_index=True)
+    is_duplicate = np.ones(len(keys), dtype=bool)
+    is_duplicate[first_indices] = False
+    
+    for index in np.flatnonzero(~is_known) :
+        report.add(int(lines[index]), UNKNOWN_GESTURE, entries[index], f"unknown gesture '{slots[index]}'")
+    for index in np.flatnonzero(is_duplicate) :
+        report.add(int(lines[index]), DUPLICATE_GESTURE, entries[index], f"gesture '{slots[index]}' is given twice")
+    for index in np.flatnonzero(~has_icon) :
+        report.add(int(lines[index]), MISSING_ICON, entries[index], f"no icon for command '{commands[index]}'")
+    missing_layers = np.flatnonzero(is_known & ~has_layer)
+    for slot in np.unique(slots[missing_layers]) :
+        slot_lines = np.unique(lines[missing_layers][slots[missing_layers] == slot])
+        report.warn(int(slot_lines[0]), MISSING_LAYER, str(slot), f"no layer for gesture '{slot}', nothing is drawn", len(slot_lines))
+
+def check_configuration(rows, mg_layer_refs, available_icons, logit) :
+    """
+    Return the mappings of the configuration, raising a ValidationError 
+    listing every bad row if any of them is invalid
+    """
+    report = validate_configuration(rows, mg_layer_refs, available_icons, logit)
+    if not report.is_valid() :
+        raise ValidationError(report)
+    return report.mappings
+
+#######################################################################################################################
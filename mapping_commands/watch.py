@@ -0,0 +1,225 @@
+#! /usr/bin/env python3
+#######################################################################################################################
+#  Copyright (c) 2023 Vincent LAMBERT
+#  License: MIT
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+# 
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+# 
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+#
+#######################################################################################################################
+# NOTES
+#
+# Developing extensions:
+#   SEE: https://inkscape.org/develop/extensions/
+#   SEE: https://wiki.inkscape.org/wiki/Python_modules_for_extensions
+#   SEE: https://wiki.inkscape.org/wiki/Using_the_Command_Line
+#
+# Implementation References:
+#   SEE: https://github.com/nshkurkin/inkscape-export-layer-combos
+
+import hashlib
+import logging
+import os
+import time
+
+import inkex
+from lxml import etree
+
+from utils import *
+from configuration_file import *
+from icon_cache import *
+from compute_svg import *
+from outputs import *
+
+#######################################################################################################################
+
+DOCUMENT = "document"
+TEMPLATE = "template"
+ICON = "icon"
+SLOT = "slot"
+
+def get_file_stamps(file_paths) :
+    """
+    Return the modification time of each of the given files, None for the missing ones
+    """
+    stamps = dict()
+    for file_path in file_paths :
+        stamps[file_path] = os.stat(file_path).st_mtime_ns if os.path.isfile(file_path) else None
+    return stamps
+
+def get_hash(*values) :
+    """
+    Return a hash of the given strings or bytes
+    """
+    digest = hashlib.sha1()
+    for value in values :
+        digest.update(value if isinstance(value, bytes) else str(value).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+def get_mapping_dependencies(mapping, drawn_slots) :
+    """
+    Return what the outputs of a mapping depend on besides the document and the template :
+    the icon of each of its commands and the placeholders of each of its drawn slots
+    """
+    dependencies = set()
+    for mg_charac, command in mapping :
+        dependencies.add((ICON, command))
+        if mg_charac in drawn_slots :
+            dependencies.add((SLOT, mg_charac))
+    return dependencies
+
+#######################################################################################################################
+
+class ExportWatcher(object):
+    """
+    Export every mapping, then watch the source document, the configuration file and the icons,
+    and export again only the mappings affected by each change.
+    
+    A dependency map gives for the label of each mapping the icons and the slots it uses. 
+    Every layer is drawn in every output, thus an edit of the document outside of the command 
+    placeholders affects every mapping, while moving the placeholder of a slot only affects 
+    the mappings giving a command to this slot, and an edited icon only the mappings using its command.
+    """
+
+    def __init__(self, export, logit):
+        if export.options.archive != NONE :
+            raise RuntimeError("The watch mode writes separate files and cannot update an archive")
+        self.export = export
+        self.logit = logit
+        self.stamps = dict()
+        self.fingerprints = dict()
+        self.dependencies = dict()
+    
+    def get_watched_files(self) :
+        """
+        Return the source document, the configuration file, the command template and the icon files
+        """
+        options = self.export.options
+        file_paths = [options.input_file, os.path.abspath(TEMPLATE_PATH)]
+        if has_configuration_file(options.config) :
+            file_paths.append(os.path.expanduser(options.config))
+        icon_path = os.path.expanduser(options.icon)
+        if is_icon_bundle(icon_path) :
+            file_paths.append(icon_path)
+        elif os.path.isdir(icon_path) :
+            file_paths.extend(sorted(os.path.join(icon_path, file_name) for file_name in os.listdir(icon_path) 
+                                     if file_name.endswith(".svg")))
+        return file_paths
+    
+    def get_fingerprints(self, compute) :
+        """
+        Return a hash of each part of the prepared document and icons the outputs depend on
+        """
+        placeholders = dict()
+        for mg, charac_layer_refs in compute.mg_layer_refs.items() :
+            for charac, layer_refs in charac_layer_refs.items() :
+                for layer_ref in layer_refs :
+                    command_placeholder = get_command_placeholder(layer_ref)
+                    if command_placeholder is not None :
+                        placeholders.setdefault((mg, charac), []).append(command_placeholder)
+        
+        fingerprints = dict()
+        for mg_charac, command_placeholders in placeholders.items() :
+            fingerprints[(SLOT, mg_charac)] = get_hash(*[etree.tostring(command_placeholder, with_tail=False) 
+                                                        for command_placeholder in command_placeholders])
+        
+        # The rest of the document, without the placeholders and what the export added to it
+        skipped = set(command_placeholder for command_placeholders in placeholders.values() 
+                      for command_placeholder in command_placeholders)
+        skipped.update(getattr(compute, "command_uses", dict()).values())
+        document_hash = hashlib.sha1()
+        for element in compute.export.document.getroot().iter() :
+            if element in skipped or element.get('mgrep-command') == "definition" :
+                continue
+            if any(ancestor.get('mgrep-command') == "definition" for ancestor in element.iterancestors()) :
+                continue
+            document_hash.update(get_hash(element.tag, sorted(element.attrib.items()), element.text).encode("utf-8"))
+        fingerprints[(DOCUMENT,)] = document_hash.hexdigest()
+        
+        fingerprints[(TEMPLATE,)] = get_hash(compute.icon_library.template)
+        for command, icon in compute.icon_library.icons.items() :
+            fingerprints[(ICON, command)] = get_hash(icon)
+        return fingerprints
+    
+    def export_mappings(self, compute, mappings) :
+        """
+        Export the given mappings and wait for their renders
+        """
+        if len(mappings) > 0 :
+            compute.export_mappings(mappings, self.logit)
+        self.export.scheduler.wait()
+        if len(self.export.scheduler.failures) > 0 :
+            logging.error(f"{len(self.export.scheduler.failures)} mappings could not be rendered")
+            self.export.scheduler.failures.clear()
+    
+    def update(self, full=False) :
+        """
+        Load the sources again and export the mappings affected by their changes since the last update
+        """
+        compute = ComputeSVG(self.export)
+        mappings = compute.prepare(self.logit)
+        fingerprints = self.get_fingerprints(compute)
+        drawn_slots = compute.get_drawn_slots()
+        dependencies = dict((compute.get_mapping_label(mapping), get_mapping_dependencies(mapping, drawn_slots)) 
+                            for mapping in mappings)
+        
+        changes = set(key for key in set(fingerprints) | set(self.fingerprints) 
+                      if fingerprints.get(key) != self.fingerprints.get(key))
+        if full or (DOCUMENT,) in changes or (TEMPLATE,) in changes :
+            affected_mappings = mappings
+        else :
+            affected_mappings = [mapping for mapping in mappings 
+                                 if compute.get_mapping_label(mapping) not in self.dependencies
+                                 or len(dependencies[compute.get_mapping_label(mapping)] & changes) > 0]
+        changed = ", ".join(sorted(" ".join("_".join(part) if isinstance(part, tuple) else part for part in key) for key in changes))
+        logging.warning(f"Exporting {len(affected_mappings)} of {len(mappings)} mappings" 
+                        + ("" if full else f" (changed: {changed or 'configuration'})"))
+        
+        self.fingerprints = fingerprints
+        self.dependencies = dependencies
+        try :
+            self.export_mappings(compute, affected_mappings)
+        finally :
+            compute.remove_definitions()
+    
+    def run(self) :
+        """
+        Export every mapping, then export the affected mappings again 
+        whenever a watched file changes, until interrupted
+        """
+        self.stamps = get_file_stamps(self.get_watched_files())
+        self.update(full=True)
+        logging.warning(f"Watching {len(self.stamps)} files for changes")
+        try :
+            while True :
+                time.sleep(self.export.options.watch_interval)
+                stamps = get_file_stamps(self.get_watched_files())
+                if stamps == self.stamps :
+                    continue
+                self.stamps = stamps
+                self.export.reload_document()
+                try :
+                    self.update()
+                except RuntimeError as error :
+                    # Wait for the next change rather than stopping on an invalid edit
+                    logging.error(str(error))
+        except KeyboardInterrupt :
+            pass
+
+#######################################################################################################################
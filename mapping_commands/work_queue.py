@@ -0,0 +1,344 @@
+#! /usr/bin/env python3
+#######################################################################################################################
+#  Copyright (c) 2023 Vincent LAMBERT
+#  License: MIT
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+# 
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+# 
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+#
+#######################################################################################################################
+# NOTES
+#
+# Developing extensions:
+#   SEE: https://inkscape.org/develop/extensions/
+#   SEE: https://wiki.inkscape.org/wiki/Python_modules_for_extensions
+#   SEE: https://wiki.inkscape.org/wiki/Using_the_Command_Line
+#
+# Implementation References:
+#   SEE: https://github.com/nshkurkin/inkscape-export-layer-combos
+
+import logging
+import os
+import socket
+import sqlite3
+import time
+
+from utils import *
+from configuration_file import *
+from memory_guard import *
+from compute_svg import *
+from outputs import *
+
+#######################################################################################################################
+
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+# Seconds waited for the lock of the database shared by the workers
+QUEUE_LOCK_TIMEOUT = 60.0
+# Seconds between two attempts to lease a batch while the other workers hold the last ones
+QUEUE_POLL_INTERVAL = 1.0
+# Number of renewals of the leases of a batch within a lease duration while its renders run
+LEASE_RENEWALS = 4
+
+#######################################################################################################################
+
+def get_worker_id() :
+    """
+    Return an identifier of the current process unique among the hosts sharing a queue
+    """
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+def format_mapping_row(mapping) :
+    """
+    Return a mapping as a row of the configuration file
+    """
+    return ",".join(f"{mg}_{charac}-{command}" for (mg, charac), command in mapping)
+
+class WorkQueue(object):
+    """
+    A queue of mapping jobs in a SQLite database shared by worker processes, 
+    on one host or on several hosts sharing a mount. A worker leases a batch of jobs 
+    for a limited time and marks them done, the jobs of an expired lease are leased again.
+    """
+    
+    def __init__(self, path, lease_duration, logit):
+        self.path = os.path.expanduser(path)
+        self.lease_duration = lease_duration
+        self.logit = logit
+        # Transactions are explicitly begun to take the write lock before reading the jobs to lease
+        self.connection = sqlite3.connect(self.path, timeout=QUEUE_LOCK_TIMEOUT, isolation_level=None)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS jobs (label TEXT PRIMARY KEY, mapping TEXT NOT NULL, "
+                                "aliases TEXT NOT NULL, state TEXT NOT NULL, worker TEXT, lease_expiry REAL, "
+                                "attempts INTEGER NOT NULL DEFAULT 0)")
+        # A single row recording the worker setting the queue up and whether it is done
+        self.connection.execute("CREATE TABLE IF NOT EXISTS setup (id INTEGER PRIMARY KEY CHECK (id = 0), "
+                                "worker TEXT, expiry REAL, done INTEGER NOT NULL)")
+    
+    def claim_setup(self, worker) :
+        """
+        Return True if the worker has to set the queue up, False once the queue is set up, 
+        or None while another worker sets it up. The setup of a worker which did not end it 
+        within the lease duration is claimed again.
+        """
+        now = time.time()
+        self.connection.execute("BEGIN IMMEDIATE")
+        try :
+            setup = self.connection.execute("SELECT worker, expiry, done FROM setup").fetchone()
+            if setup is None and self.connection.execute("SELECT 1 FROM jobs LIMIT 1").fetchone() is not None :
+                # A queue filled before the setup was recorded
+                self.connection.execute("INSERT INTO setup (id, worker, done) VALUES (0, NULL, 1)")
+                claimed = False
+            elif setup is None or (not setup[2] and setup[1] < now) :
+                self.connection.execute("INSERT OR REPLACE INTO setup (id, worker, expiry, done) VALUES (0, ?, ?, 0)", 
+                                        (worker, now + self.lease_duration))
+                claimed = True
+            else :
+                claimed = False if setup[2] else None
+            self.connection.execute("COMMIT")
+        except sqlite3.Error :
+            self.connection.execute("ROLLBACK")
+            raise
+        return claimed
+    
+    def fill(self, worker, jobs, on_setup=None) :
+        """
+        Add the given (label, mapping, aliases) jobs, except the ones already in the queue, 
+        and return whether the worker set the queue up. The first worker calls on_setup before 
+        adding its jobs, out of any transaction, while the others wait for the setup to be done.
+        """
+        claimed = self.claim_setup(worker)
+        while claimed is None :
+            time.sleep(QUEUE_POLL_INTERVAL)
+            claimed = self.claim_setup(worker)
+        if claimed and on_setup is not None :
+            try :
+                on_setup()
+            except BaseException :
+                # Let another worker set the queue up
+                self.connection.execute("UPDATE setup SET expiry = 0 WHERE worker = ? AND done = 0", (worker,))
+                raise
+        
+        self.connection.execute("BEGIN IMMEDIATE")
+        try :
+            added = self.connection.total_changes
+            self.connection.executemany("INSERT OR IGNORE INTO jobs (label, mapping, aliases, state) VALUES (?, ?, ?, ?)", 
+                                        ((label, mapping, aliases, PENDING) for label, mapping, aliases in jobs))
+            added = self.connection.total_changes - added
+            if claimed :
+                self.connection.execute("UPDATE setup SET done = 1, expiry = NULL WHERE worker = ?", (worker,))
+            self.connection.execute("COMMIT")
+        except sqlite3.Error :
+            self.connection.execute("ROLLBACK")
+            raise
+        self.logit(f"Added {added} jobs to the queue {self.path}")
+        return claimed
+    
+    def lease(self, worker, batch_size) :
+        """
+        Lease up to batch_size pending jobs or jobs of expired leases, and return them
+        """
+        now = time.time()
+        self.connection.execute("BEGIN IMMEDIATE")
+        try :
+            rows = self.connection.execute("SELECT label, mapping, aliases, state, worker FROM jobs WHERE state = ? "
+                                           "OR (state = ? AND lease_expiry < ?) ORDER BY rowid LIMIT ?", 
+                                           (PENDING, LEASED, now, batch_size)).fetchall()
+            self.connection.executemany("UPDATE jobs SET state = ?, worker = ?, lease_expiry = ?, attempts = attempts + 1 WHERE label = ?", 
+                                        [(LEASED, worker, now + self.lease_duration, row[0]) for row in rows])
+            self.connection.execute("COMMIT")
+        except sqlite3.Error :
+            self.connection.execute("ROLLBACK")
+            raise
+        for label, _, _, state, previous_worker in rows :
+            if state == LEASED :
+                logging.warning(f"Reclaimed {label} from the expired lease of {previous_worker}")
+        return [(label, mapping, aliases) for label, mapping, aliases, _, _ in rows]
+    
+    def renew(self, worker, labels) :
+        """
+        Extend the lease of the given jobs still leased by the worker, 
+        and return the labels of the ones leased again by another worker
+        """
+        self.connection.execute("BEGIN IMMEDIATE")
+        try :
+            expiry = time.time() + self.lease_duration
+            lost = [label for label in labels if self.connection.execute(
+                "UPDATE jobs SET lease_expiry = ? WHERE label = ? AND worker = ? AND state = ?", 
+                (expiry, label, worker, LEASED)).rowcount == 0]
+            self.connection.execute("COMMIT")
+        except sqlite3.Error :
+            self.connection.execute("ROLLBACK")
+            raise
+        return lost
+    
+    def set_state(self, worker, labels, state) :
+        """
+        Set the state of the given jobs if they are still leased by the worker
+        """
+        self.connection.executemany("UPDATE jobs SET state = ?, lease_expiry = NULL WHERE label = ? AND worker = ? AND state = ?", 
+                                    [(state, label, worker, LEASED) for label in labels])
+    
+    def complete(self, worker, labels) :
+        """
+        Mark the given jobs as done
+        """
+        self.set_state(worker, labels, DONE)
+    
+    def fail(self, worker, labels) :
+        """
+        Mark the given jobs as failed, they are not leased again
+        """
+        self.set_state(worker, labels, FAILED)
+    
+    def release(self, worker, labels) :
+        """
+        Give the given jobs back to the queue
+        """
+        self.set_state(worker, labels, PENDING)
+    
+    def get_next_expiry(self) :
+        """
+        Return the expiry time of the first lease to expire, or None if no job is left to lease
+        """
+        pending, next_expiry = self.connection.execute("SELECT SUM(state = ?), MIN(CASE WHEN state = ? THEN lease_expiry END) FROM jobs", 
+                                                       (PENDING, LEASED)).fetchone()
+        if pending :
+            return time.time()
+        return next_expiry
+    
+    def get_counts(self) :
+        """
+        Return the number of jobs in each state
+        """
+        return dict(self.connection.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+    
+    def close(self) :
+        self.connection.close()
+
+#######################################################################################################################
+
+class QueueWorker(object):
+    """
+    Export the mappings leased from a work queue until every one of them is done
+    """
+    
+    def __init__(self, export, logit):
+        if export.options.archive not in [NONE, NPY] :
+            raise RuntimeError("The queue workers write separate files or the rows of a dataset and cannot share an archive")
+        self.export = export
+        self.logit = logit
+        self.worker = get_worker_id()
+        self.queue = WorkQueue(export.options.queue, export.options.queue_lease, logit)
+    
+    def fill(self, compute, groups, on_setup) :
+        """
+        Add a job per distinct render of the mappings to the queue, 
+        and return whether this worker set the queue up
+        """
+        aliases = dict()
+        for mapping, equivalent_mapping in groups.get_equivalent_mappings() :
+            aliases.setdefault(compute.get_mapping_label(mapping), []).append(format_mapping_row(equivalent_mapping))
+        return self.queue.fill(self.worker, ((compute.get_mapping_label(mapping), format_mapping_row(mapping), 
+                                              "\n".join(aliases.pop(compute.get_mapping_label(mapping), []))) 
+                                             for mapping in groups.get_rendered_mappings()), on_setup)
+    
+    def renew(self, labels) :
+        """
+        Extend the lease of the given jobs while they are exported
+        """
+        lost = self.queue.renew(self.worker, labels)
+        if len(lost) > 0 :
+            logging.warning(f"The leases of {', '.join(lost)} expired, another worker exports them again")
+    
+    def export_batch(self, compute, batch, memory_guard) :
+        """
+        Export the mappings of a leased batch and wait for their renders
+        """
+        labels = [label for label, _, _ in batch]
+        mappings = [parse_mapping_row(mapping.split(",")) for _, mapping, _ in batch]
+        if self.export.has_previews() :
+            for mapping in mappings :
+                compute.export_mapping(mapping, self.export.preview, self.logit)
+                memory_guard.check(self.export.scheduler)
+                self.renew(labels)
+        for mapping in mappings :
+            self.logit(f"Exporting {compute.get_mapping_label(mapping)}")
+            compute.export_mapping(mapping, self.export.export, self.logit)
+            memory_guard.check(self.export.scheduler)
+            self.renew(labels)
+        # The leases are renewed while the renders run, however long they take
+        while not self.export.scheduler.wait(self.queue.lease_duration / LEASE_RENEWALS) :
+            self.renew(labels)
+        
+        failed_labels = [label for label, _, _ in batch if label in self.export.scheduler.failures]
+        done_labels = [label for label, _, _ in batch if label not in self.export.scheduler.failures]
+        for label, _, aliases in batch :
+            if label in done_labels :
+                equivalent_mappings = [parse_mapping_row(row.split(",")) for row in aliases.split("\n") if row != ""]
+                for equivalent_mapping in equivalent_mappings :
+                    self.export.output.alias(compute.get_mapping_label(equivalent_mapping), label)
+                self.export.progress.aliased(len(equivalent_mappings))
+        self.queue.complete(self.worker, done_labels)
+        self.queue.fail(self.worker, failed_labels)
+    
+    def run(self) :
+        """
+        Fill the queue with the mappings of the configuration, then lease and export 
+        batches of them until no job is left, waiting for the leases of the other workers to end
+        """
+        compute = ComputeSVG(self.export)
+        mappings = compute.prepare(self.logit)
+        groups = MappingGroups(mappings, compute.get_drawn_slots())
+        # The worker setting the queue up starts the shared outputs before the others can lease jobs
+        if not self.fill(compute, groups, lambda : self.export.output.start(mappings, compute.get_mapping_label)) :
+            self.export.output.start(mappings, compute.get_mapping_label, coordinating=False)
+        # The progress of a worker counts the jobs it leased
+        self.export.progress.start(0, 0)
+        if self.export.options.splice :
+            compute.splicer = compute.create_splicer(self.logit)
+        memory_guard = MemoryGuard(self.export.options.max_memory, self.logit)
+        
+        batches = 0
+        try :
+            while True :
+                batch = self.queue.lease(self.worker, self.export.options.queue_batch)
+                if len(batch) == 0 :
+                    next_expiry = self.queue.get_next_expiry()
+                    if next_expiry is None :
+                        break
+                    # The jobs leased by the other workers are leased again if their lease expires
+                    time.sleep(min(QUEUE_POLL_INTERVAL, max(0.0, next_expiry - time.time())) + 0.01)
+                    continue
+                self.export.progress.add(sum(1 + len([row for row in aliases.split("\n") if row != ""]) for _, _, aliases in batch), 
+                                         len(batch))
+                try :
+                    self.export_batch(compute, batch, memory_guard)
+                except BaseException :
+                    self.queue.release(self.worker, [label for label, _, _ in batch])
+                    raise
+                batches += 1
+        finally :
+            compute.remove_definitions()
+            counts = self.queue.get_counts()
+            self.queue.close()
+        logging.warning(f"Exported {batches} batches in {self.worker}, queue: " 
+                        + ", ".join(f"{count} {state}" for state, count in sorted(counts.items())))
+
+#######################################################################################################################
@@ -0,0 +1,80 @@
+#! /usr/bin/env python3
+#######################################################################################################################
+#  Copyright (c) 2023 Vincent LAMBERT
+#  License: MIT
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+# 
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+# 
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+#
+#######################################################################################################################
+# NOTES
+#
+# Developing extensions:
+#   SEE: https://inkscape.org/develop/extensions/
+#   SEE: https://wiki.inkscape.org/wiki/Python_modules_for_extensions
+#   SEE: https://wiki.inkscape.org/wiki/Using_the_Command_Line
+#
+# Implementation References:
+#   SEE: https://github.com/nshkurkin/inkscape-export-layer-combos
+
+import os
+import sys
+
+import pytest
+from lxml import etree
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EXTENSION = os.path.join(ROOT, "mapping_commands")
+DOCUMENT = os.path.join(ROOT, "AandB_Fu-Fd-Su-Sd-Tt-Tm-Tb.svg")
+SLOTS = ["tap_tip", "tap_middle", "tap_base", "swipe_up", "swipe_down", "flex_up", "flex_down"]
+COMMANDS = ["banana", "blackberry", "cherry", "kiwi", "pineapple", "plum", "watermelon"]
+ICON = """<svg xmlns="http://www.w3.org/2000/svg" xmlns:inkscape="http://www.inkscape.org/namespaces/inkscape" width="10" height="10" viewBox="0 0 10 10">
+ <g inkscape:groupmode="layer" inkscape:label="Layer" id="layer1">
+  <circle cx="5" cy="5" r="1" mgrep-icon="centroid" style="display:none"/>
+  <g mgrep-icon="command" id="icon-{0}"><path d="M 4,4 L 6,4 L 6,6 Z"/></g>
+ </g>
+</svg>
+"""
+
+# The extension modules import each other as top level modules, as Inkscape runs them from their folder
+sys.path.insert(0, EXTENSION)
+
+#######################################################################################################################
+
+@pytest.fixture
+def sources(tmp_path) :
+    """
+    The sample document with an id on every group, and an icon per command
+    """
+    document = etree.parse(DOCUMENT)
+    for index, group in enumerate(document.getroot().iter("{http://www.w3.org/2000/svg}g")) :
+        if "id" not in group.attrib :
+            group.set("id", f"group{index}")
+    document.write(str(tmp_path / "document.svg"))
+    (tmp_path / "icons").mkdir()
+    for command in COMMANDS :
+        (tmp_path / "icons" / f"{command}.svg").write_text(ICON.format(command))
+    return tmp_path
+
+@pytest.fixture
+def extension_folder(monkeypatch) :
+    """
+    Run from the folder of the extension, where it finds its template icon
+    """
+    monkeypatch.chdir(EXTENSION)
+    return EXTENSION
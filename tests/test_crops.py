@@ -0,0 +1,115 @@
+#! /usr/bin/env python3
+#######################################################################################################################
+#  Copyright (c) 2023 Vincent LAMBERT
+#  License: MIT
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+# 
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+# 
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+#
+#######################################################################################################################
+# NOTES
+#
+# Developing extensions:
+#   SEE: https://inkscape.org/develop/extensions/
+#   SEE: https://wiki.inkscape.org/wiki/Python_modules_for_extensions
+#   SEE: https://wiki.inkscape.org/wiki/Using_the_Command_Line
+#
+# Implementation References:
+#   SEE: https://github.com/nshkurkin/inkscape-export-layer-combos
+
+import io
+import itertools
+import os
+
+import inkex
+import pytest
+from lxml import etree
+from PIL import Image
+
+import mapping_commands
+from utils import *
+from conftest import SLOTS, COMMANDS
+
+#######################################################################################################################
+
+class StubRenderer(object):
+    filetypes = []
+    
+    def close(self) :
+        pass
+
+class RecordingExport(mapping_commands.CommandExport):
+    """
+    Record the document and the crop boxes of every mapping without rendering it
+    """
+    def export(self, label, logit, svg_document=None):
+        if svg_document is None :
+            svg_document = etree.tostring(self.document)
+        self.documents[label] = (svg_document, dict(self.mapping_crop_boxes[label]))
+
+@pytest.fixture
+def export(sources, extension_folder, monkeypatch) :
+    monkeypatch.setattr(mapping_commands, "create_renderer", lambda *args : StubRenderer())
+    with open(sources / "config.csv", "w") as file :
+        for commands in itertools.islice(itertools.permutations(COMMANDS), 0, 500, 100) :
+            file.write(",".join(f"{slot}-{command}" for slot, command in zip(SLOTS, commands)) + "\n")
+    export = RecordingExport()
+    export.documents = dict()
+    export.run([f"--icon={sources / 'icons'}", f"--config={sources / 'config.csv'}", f"--path={sources / 'output'}", 
+                "--icon_cache=", "--progress_interval=0", "--crops=layers", str(sources / "document.svg")], 
+               output=open(os.devnull, "wb"))
+    return export
+
+#######################################################################################################################
+
+def test_crop_boxes_contain_the_layers_of_each_mapping(export) :
+    assert len(export.documents) == 5
+    widened = 0
+    for label, (svg_document, crop_boxes) in export.documents.items() :
+        document = inkex.load_svg(svg_document).getroot()
+        layers = document.xpath("//*[@mgrep-microgesture-layer]")
+        assert set(crop_boxes) == set(layer.get("id") for layer in layers)
+        for layer in layers :
+            box = layer.bounding_box(layer.getparent().composed_transform())
+            left, top, right, bottom = crop_boxes[layer.get("id")]
+            assert left - 1e-6 <= box.left and top - 1e-6 <= box.top
+            assert box.right <= right + 1e-6 and box.bottom <= bottom + 1e-6
+        widened += crop_boxes != dict(export.crop_boxes)
+    # The placed commands overflow some of the layers of the source document
+    assert widened > 0
+
+def test_retried_rasters_are_cropped_with_the_widened_boxes(export, monkeypatch) :
+    label, (_, crop_boxes) = next((label, documented) for label, documented in export.documents.items() 
+                                  if documented[1] != dict(export.crop_boxes))
+    export.mapping_crop_boxes[label] = crop_boxes
+    used_boxes = []
+    
+    def write_crops(label, image, crop_boxes, filetypes, dpis) :
+        used_boxes.append(dict(crop_boxes))
+        if len(used_boxes) == 1 :
+            raise OSError("disk full")
+    
+    monkeypatch.setattr(export, "write_file", lambda *args : None)
+    monkeypatch.setattr(export, "write_crops", write_crops)
+    png = io.BytesIO()
+    Image.new("RGBA", (40, 20)).save(png, "PNG")
+    with pytest.raises(OSError) :
+        export.write_rasters(label, png.getvalue(), [PNG], [90.0])
+    export.write_rasters(label, png.getvalue(), [PNG], [90.0])
+    assert used_boxes == [crop_boxes, crop_boxes]
+    assert label not in export.mapping_crop_boxes
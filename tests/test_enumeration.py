@@ -0,0 +1,96 @@
+#! /usr/bin/env python3
+#######################################################################################################################
+#  Copyright (c) 2023 Vincent LAMBERT
+#  License: MIT
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+# 
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+# 
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+#
+#######################################################################################################################
+# NOTES
+#
+# Developing extensions:
+#   SEE: https://inkscape.org/develop/extensions/
+#   SEE: https://wiki.inkscape.org/wiki/Python_modules_for_extensions
+#   SEE: https://wiki.inkscape.org/wiki/Using_the_Command_Line
+#
+# Implementation References:
+#   SEE: https://github.com/nshkurkin/inkscape-export-layer-combos
+
+import itertools
+import random
+
+import pytest
+
+import enumeration
+from enumeration import *
+
+#######################################################################################################################
+
+SLOTS = [("tap", "tip"), ("tap", "middle"), ("swipe", "up"), ("swipe", "down"), ("flex", "up")]
+COMMANDS = ["banana", "cherry", "kiwi", "plum", "watermelon"]
+
+def get_brute_force_mappings(slots, commands, size, pinned, forbidden, allowed) :
+    """
+    Return every injective assignment of commands to size of the slots satisfying the constraints
+    """
+    mappings = []
+    for chosen_slots in itertools.combinations(slots, size) :
+        for chosen_commands in itertools.permutations(commands, size) :
+            mapping = dict(zip(chosen_slots, chosen_commands))
+            if any(mapping.get(slot) != command for slot, command in pinned.items()) :
+                continue
+            if any(command not in allowed.get(slot, commands) for slot, command in mapping.items()) :
+                continue
+            if any(all(mapping.get(slot) == command for slot, command in pair) for pair in forbidden) :
+                continue
+            mappings.append(sorted(mapping.items(), key=lambda assignment : slots.index(assignment[0])))
+    return mappings
+
+def get_random_constraints(generator) :
+    slots = SLOTS[:generator.randint(2, len(SLOTS))]
+    commands = COMMANDS[:generator.randint(2, len(COMMANDS))]
+    size = generator.randint(1, min(len(slots), len(commands)))
+    pinned = dict()
+    if generator.random() < 0.3 :
+        pinned[generator.choice(slots)] = generator.choice(commands)
+    assignments = [(slot, command) for slot in slots for command in commands]
+    # The pairs may share their slot or repeat an assignment
+    forbidden = [(generator.choice(assignments), generator.choice(assignments)) for _ in range(generator.randint(0, 5))]
+    allowed = dict((slot, generator.sample(commands, generator.randint(1, len(commands)))) 
+                   for slot in slots if generator.random() < 0.3)
+    return slots, commands, size, pinned, forbidden, allowed
+
+#######################################################################################################################
+
+@pytest.mark.parametrize("seed", range(200))
+def test_count_and_enumeration_match_the_brute_force(seed) :
+    slots, commands, size, pinned, forbidden, allowed = get_random_constraints(random.Random(seed))
+    expected = get_brute_force_mappings(slots, commands, size, pinned, forbidden, allowed)
+    enumerator = MappingEnumerator(slots, commands, size, pinned, forbidden, allowed)
+    assert enumerator.count() == len(expected)
+    mappings = list(enumerator)
+    assert sorted(mappings) == sorted(expected)
+    assert len(set(tuple(mapping) for mapping in mappings)) == len(mappings)
+
+def test_count_enumerates_beyond_the_counted_pairs(monkeypatch) :
+    forbidden = [((SLOTS[0], COMMANDS[0]), (SLOTS[1], COMMANDS[1])), ((SLOTS[0], COMMANDS[1]), (SLOTS[1], COMMANDS[0])),
+                 ((SLOTS[1], COMMANDS[0]), (SLOTS[0], COMMANDS[1]))]
+    expected = get_brute_force_mappings(SLOTS[:2], COMMANDS[:3], 2, dict(), forbidden, dict())
+    monkeypatch.setattr(enumeration, "MAX_COUNTED_PAIRS", 2)
+    assert MappingEnumerator(SLOTS[:2], COMMANDS[:3], 2, forbidden=forbidden).count() == len(expected) == 4
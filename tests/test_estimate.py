@@ -0,0 +1,63 @@
+#! /usr/bin/env python3
+#######################################################################################################################
+#  Copyright (c) 2023 Vincent LAMBERT
+#  License: MIT
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+# 
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+# 
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+#
+#######################################################################################################################
+# NOTES
+#
+# Developing extensions:
+#   SEE: https://inkscape.org/develop/extensions/
+#   SEE: https://wiki.inkscape.org/wiki/Python_modules_for_extensions
+#   SEE: https://wiki.inkscape.org/wiki/Using_the_Command_Line
+#
+# Implementation References:
+#   SEE: https://github.com/nshkurkin/inkscape-export-layer-combos
+
+import logging
+import os
+
+import pytest
+
+import mapping_commands
+from estimate import *
+from rasters import *
+from conftest import SLOTS, COMMANDS
+
+#######################################################################################################################
+
+def test_render_commands_call_the_in_process_renderers() :
+    commands = [lambda document : document.upper(), ["cat"], lambda document : document + b"!"]
+    assert run_render_commands(commands, b"<svg/>", 10) == b"<SVG/>!"
+
+@pytest.mark.skipif(not has_cairosvg(), reason="CairoSVG and the cairo library are needed")
+def test_estimate_with_an_in_process_renderer(sources, extension_folder, caplog) :
+    with open(sources / "config.csv", "w") as file :
+        for index in range(4) :
+            file.write(",".join(f"{slot}-{COMMANDS[(index + offset) % len(COMMANDS)]}" for offset, slot in enumerate(SLOTS)) + "\n")
+    with caplog.at_level(logging.WARNING) :
+        mapping_commands.CommandExport().run([f"--icon={sources / 'icons'}", f"--config={sources / 'config.csv'}", 
+                                              f"--path={sources / 'output'}", "--icon_cache=", "--renderer=cairosvg", 
+                                              "--estimate=true", "--estimate_samples=2", str(sources / "document.svg")], 
+                                             output=open(os.devnull, "wb"))
+    assert "Estimate for 4 mappings" in caplog.text
+    assert "sampled renders: 2" in caplog.text
+    assert not os.path.exists(sources / "output")
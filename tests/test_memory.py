@@ -0,0 +1,128 @@
+#! /usr/bin/env python3
+#######################################################################################################################
+#  Copyright (c) 2023 Vincent LAMBERT
+#  License: MIT
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+# 
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+# 
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+#
+#######################################################################################################################
+# NOTES
+#
+# Developing extensions:
+#   SEE: https://inkscape.org/develop/extensions/
+#   SEE: https://wiki.inkscape.org/wiki/Python_modules_for_extensions
+#   SEE: https://wiki.inkscape.org/wiki/Using_the_Command_Line
+#
+# Implementation References:
+#   SEE: https://github.com/nshkurkin/inkscape-export-layer-combos
+
+import itertools
+import os
+import tracemalloc
+
+import pytest
+from lxml import etree
+
+import mapping_commands
+import memory_guard
+import validation
+from ref_and_specs import *
+from conftest import SLOTS, COMMANDS
+
+#######################################################################################################################
+
+class StubRenderer(object):
+    def close(self) :
+        pass
+
+class SerializingExport(mapping_commands.CommandExport):
+    """
+    Build and serialize the document of every mapping without rendering it
+    """
+    def export(self, label, logit, svg_document=None):
+        if svg_document is None :
+            svg_document = etree.tostring(self.document)
+
+class WaitingScheduler(object):
+    waits = 0
+    
+    def wait(self) :
+        self.waits += 1
+
+def write_configuration(path, count) :
+    with open(path, "w") as file :
+        for commands in itertools.islice(itertools.permutations(COMMANDS), count) :
+            file.write(",".join(f"{slot}-{command}" for slot, command in zip(SLOTS, commands)) + "\n")
+
+def get_export_peak(sources, count) :
+    """
+    Return the peak of the memory allocated by the export of the given number of mappings
+    """
+    write_configuration(sources / "config.csv", count)
+    tracemalloc.start()
+    try :
+        SerializingExport().run([f"--icon={sources / 'icons'}", f"--config={sources / 'config.csv'}", 
+                                 f"--path={sources / 'output'}", "--icon_cache=", "--progress_interval=0", 
+                                 str(sources / "document.svg")], output=open(os.devnull, "wb"))
+        return tracemalloc.get_traced_memory()[1]
+    finally :
+        tracemalloc.stop()
+
+#######################################################################################################################
+
+def test_peak_memory_is_flat_in_the_number_of_mappings(sources, extension_folder, monkeypatch) :
+    monkeypatch.setattr(mapping_commands, "create_renderer", lambda *args : StubRenderer())
+    # Rows are validated by chunks, which must be smaller than the configurations to stay flat
+    monkeypatch.setattr(validation, "VALIDATION_CHUNK_SIZE", 16)
+    # The first export imports and caches what every export uses
+    get_export_peak(sources, 10)
+    peak = get_export_peak(sources, 60)
+    larger_peak = get_export_peak(sources, 240)
+    # Each serialized document is about 40 KB, keeping them would add megabytes
+    assert larger_peak < 1.1 * peak
+
+def test_layer_references_are_slotted(sources) :
+    layer = etree.parse(str(sources / "document.svg")).getroot().find(".//{http://www.w3.org/2000/svg}g[@mgrep-microgesture-layer]")
+    layer_ref = LayerRef(layer)
+    assert not hasattr(layer_ref, "__dict__")
+    assert all(not hasattr(spec, "__dict__") for spec in layer_ref.mg_export_specs)
+    with pytest.raises(AttributeError) :
+        layer_ref.cached_document = None
+
+def test_memory_guard_is_off_without_a_current_measure(monkeypatch) :
+    monkeypatch.setattr(memory_guard, "get_memory_usage", lambda : None)
+    guard = memory_guard.MemoryGuard(1, print)
+    scheduler = WaitingScheduler()
+    guard.check(scheduler)
+    assert guard.max_memory == 0 and scheduler.waits == 0
+
+def test_memory_guard_waits_then_gives_up_or_goes_on(monkeypatch) :
+    readings = iter([10 * memory_guard.MEGABYTE, 200 * memory_guard.MEGABYTE, 50 * memory_guard.MEGABYTE])
+    monkeypatch.setattr(memory_guard, "get_memory_usage", lambda : next(readings))
+    guard = memory_guard.MemoryGuard(100, print)
+    scheduler = WaitingScheduler()
+    guard.check(scheduler)
+    assert scheduler.waits == 1
+    
+    readings = iter([200 * memory_guard.MEGABYTE, None, 200 * memory_guard.MEGABYTE, 150 * memory_guard.MEGABYTE])
+    # An unknown reading after the wait is not an excess
+    guard.check(scheduler)
+    with pytest.raises(RuntimeError) :
+        guard.check(scheduler)
+    assert scheduler.waits == 3
@@ -0,0 +1,157 @@
+#! /usr/bin/env python3
+#######################################################################################################################
+#  Copyright (c) 2023 Vincent LAMBERT
+#  License: MIT
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+# 
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+# 
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+#
+#######################################################################################################################
+# NOTES
+#
+# Developing extensions:
+#   SEE: https://inkscape.org/develop/extensions/
+#   SEE: https://wiki.inkscape.org/wiki/Python_modules_for_extensions
+#   SEE: https://wiki.inkscape.org/wiki/Using_the_Command_Line
+#
+# Implementation References:
+#   SEE: https://github.com/nshkurkin/inkscape-export-layer-combos
+
+import random
+
+import numpy as np
+import pytest
+import svg.path
+
+from mg_maths import *
+
+#######################################################################################################################
+
+def get_reference_TRS_matrix(path, reference_vector, start_position, logit) :
+    """
+    The TRS matrix computed as before it was cached, by applying the matrices to a copy of the path
+    """
+    reference_path = svg.path.parse_path(path.d())
+    start_point = convert_from_complex(reference_path[0].start)
+    translation_matrix_to_origin = get_translation_matrix(start_point, [0, 0])
+    reference_path = apply_matrix_to_path(reference_path, {}, translation_matrix_to_origin, logit)
+    start_point = convert_from_complex(reference_path[0].start)
+    end_point = convert_from_complex(reference_path[-1].end)
+    initial_path_vector = vector(start_point, end_point)
+    scaling_matrix = get_scaling_matrix(initial_path_vector, reference_vector)
+    rotation_matrix = get_rotation_matrix(initial_path_vector, reference_vector)
+    reference_path = apply_matrix_to_path(reference_path, {}, rotation_matrix @ scaling_matrix, logit)
+    start_point = convert_from_complex(reference_path[0].start)
+    translation_matrix = get_translation_matrix(start_point, start_position)
+    return translation_matrix @ rotation_matrix @ scaling_matrix @ translation_matrix_to_origin
+
+def get_random_path(generator) :
+    """
+    A path made of a line and a cubic bezier with random points
+    """
+    points = [f"{generator.uniform(-200, 200):.3f} {generator.uniform(-200, 200):.3f}" for _ in range(5)]
+    return svg.path.parse_path(f"M {points[0]} L {points[1]} C {points[2]} {points[3]} {points[4]}")
+
+def logit(*args, **kwargs) :
+    pass
+
+@pytest.fixture(autouse=True)
+def clear_cache() :
+    get_TRS_matrix_from_ends.cache_clear()
+    yield
+    get_TRS_matrix_from_ends.cache_clear()
+
+#######################################################################################################################
+
+def test_matches_reference_implementation() :
+    generator = random.Random(0)
+    for _ in range(200) :
+        path = get_random_path(generator)
+        reference_vector = [generator.uniform(-50, 50), generator.uniform(-50, 50)]
+        start_position = [generator.uniform(-100, 100), generator.uniform(-100, 100)]
+        expected = get_reference_TRS_matrix(path, reference_vector, start_position, logit)
+        # The reference re-parses the 6 significant digits of the d() string
+        np.testing.assert_allclose(get_TRS_matrix(path, reference_vector, start_position, logit), expected, 
+                                   rtol=1e-4, atol=1e-3)
+
+def test_matches_reference_on_the_transformed_path() :
+    path = svg.path.parse_path("M 10 20 L 30 25 C 40 30 45 50 60 70")
+    matrix = get_TRS_matrix(path, [0, -15], [100, 200], logit)
+    expected = get_reference_TRS_matrix(path, [0, -15], [100, 200], logit)
+    transformed = apply_matrix_to_path(svg.path.parse_path(path.d()), {}, matrix, logit)
+    expected_transformed = apply_matrix_to_path(svg.path.parse_path(path.d()), {}, expected, logit)
+    for segment, expected_segment in zip(transformed, expected_transformed) :
+        assert abs(segment.start - expected_segment.start) < 1e-6
+        assert abs(segment.end - expected_segment.end) < 1e-6
+    # The path starts at the start position and its ends follow the reference vector
+    assert abs(transformed[0].start - complex(100, 200)) < 1e-9
+    assert abs(transformed[-1].end - complex(100, 185)) < 1e-9
+
+def test_paths_with_the_same_ends_hit_the_cache() :
+    first_path = svg.path.parse_path("M 0 0 L 5 5 L 10 0")
+    second_path = svg.path.parse_path("M 0 0 C 3 8 7 8 10 0")
+    first_matrix = get_TRS_matrix(first_path, [0, 20], [1, 2], logit)
+    assert get_TRS_matrix_from_ends.cache_info().misses == 1
+    second_matrix = get_TRS_matrix(second_path, [0, 20], [1, 2], logit)
+    assert get_TRS_matrix_from_ends.cache_info().hits == 1
+    np.testing.assert_array_equal(first_matrix, second_matrix)
+    np.testing.assert_allclose(second_matrix, get_reference_TRS_matrix(second_path, [0, 20], [1, 2], logit), atol=1e-9)
+
+def test_vectors_given_as_arrays_or_lists_share_the_cache() :
+    path = svg.path.parse_path("M 1 1 L 4 5")
+    get_TRS_matrix(path, [3, 4], [0, 0], logit)
+    get_TRS_matrix(path, np.array([3.0, 4.0]), (0, 0), logit)
+    assert get_TRS_matrix_from_ends.cache_info().hits == 1
+    assert get_TRS_matrix_from_ends.cache_info().currsize == 1
+
+def test_different_ends_miss_the_cache() :
+    get_TRS_matrix(svg.path.parse_path("M 1 1 L 4 5"), [3, 4], [0, 0], logit)
+    get_TRS_matrix(svg.path.parse_path("M 1 1 L 4 6"), [3, 4], [0, 0], logit)
+    get_TRS_matrix(svg.path.parse_path("M 1 1 L 4 5"), [3, 4], [0, 1], logit)
+    assert get_TRS_matrix_from_ends.cache_info().misses == 3
+    assert get_TRS_matrix_from_ends.cache_info().hits == 0
+
+def test_returned_matrices_are_independent_copies() :
+    path = svg.path.parse_path("M 1 1 L 4 5")
+    first_matrix = get_TRS_matrix(path, [3, 4], [10, 10], logit)
+    expected = first_matrix.copy()
+    first_matrix[0, 2] = 1000
+    first_matrix *= 2
+    second_matrix = get_TRS_matrix(path, [3, 4], [10, 10], logit)
+    assert get_TRS_matrix_from_ends.cache_info().hits == 1
+    assert second_matrix is not first_matrix
+    np.testing.assert_array_equal(second_matrix, expected)
+    third_matrix = get_TRS_matrix(path, [3, 4], [10, 10], logit)
+    assert not np.shares_memory(second_matrix, third_matrix)
+
+def test_zero_length_reference_vector() :
+    path = svg.path.parse_path("M 1 1 L 4 5")
+    matrix = get_TRS_matrix(path, [0, 0], [7, 8], logit)
+    np.testing.assert_allclose(matrix, get_reference_TRS_matrix(path, [0, 0], [7, 8], logit), atol=1e-9)
+    # Every point collapses on the start position
+    np.testing.assert_allclose(matrix @ np.array([4, 5, 1]), [7, 8, 1], atol=1e-9)
+
+def test_zero_length_path_fails_like_the_reference() :
+    path = svg.path.parse_path("M 1 1 L 5 3 L 1 1")
+    with np.errstate(all="raise") :
+        with pytest.raises(FloatingPointError) :
+            get_reference_TRS_matrix(path, [3, 4], [0, 0], logit)
+        with pytest.raises(FloatingPointError) :
+            get_TRS_matrix(path, [3, 4], [0, 0], logit)
+    # A failed computation is not cached
+    assert get_TRS_matrix_from_ends.cache_info().currsize == 0
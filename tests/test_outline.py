@@ -0,0 +1,110 @@
+#! /usr/bin/env python3
+#######################################################################################################################
+#  Copyright (c) 2023 Vincent LAMBERT
+#  License: MIT
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+# 
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+# 
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+#
+#######################################################################################################################
+# NOTES
+#
+# Developing extensions:
+#   SEE: https://inkscape.org/develop/extensions/
+#   SEE: https://wiki.inkscape.org/wiki/Python_modules_for_extensions
+#   SEE: https://wiki.inkscape.org/wiki/Using_the_Command_Line
+#
+# Implementation References:
+#   SEE: https://github.com/nshkurkin/inkscape-export-layer-combos
+
+import itertools
+import os
+
+import inkex
+import numpy as np
+from lxml import etree
+
+import compute_svg
+import mapping_commands
+from conftest import SLOTS, COMMANDS
+
+#######################################################################################################################
+
+class StubRenderer(object):
+    filetypes = []
+    
+    def close(self) :
+        pass
+
+def outline_texts(svg_document, timeout=None) :
+    """
+    Replace each text by a group with the same id and transform holding a path drawn 
+    in the coordinates of the text, as Inkscape draws the glyphs of an outlined text
+    """
+    root = etree.fromstring(svg_document)
+    for text in list(root.iter(inkex.addNS('text', 'svg'))) :
+        tspan = text.find(inkex.addNS('tspan', 'svg'))
+        x = float(tspan.get('x', text.get('x', 0)))
+        y = float(tspan.get('y', text.get('y', 0)))
+        width = 8.0 * len("".join(text.itertext()))
+        group = etree.Element(inkex.addNS('g', 'svg'), id=text.get('id'), outlined="true")
+        for name in ['transform', 'style'] :
+            if text.get(name) is not None :
+                group.set(name, text.get(name))
+        etree.SubElement(group, inkex.addNS('path', 'svg'), d=f"M {x},{y - 10} H {x + width} V {y} H {x} Z")
+        text.getparent().replace(text, group)
+    return etree.tostring(root)
+
+def get_label_boxes(svg_document) :
+    """
+    Return the sorted bounding boxes of the visible outlined texts of a document
+    """
+    document = inkex.load_svg(svg_document).getroot()
+    boxes = []
+    for group in document.xpath("//svg:g[@outlined]", namespaces=inkex.NSS) :
+        if any("display:none" in (element.get('style') or "") for element in [group] + list(group.iterancestors())) :
+            continue
+        box = group.bounding_box(group.getparent().composed_transform())
+        boxes.append((box.left, box.top, box.right, box.bottom))
+    return sorted(boxes)
+
+def export_documents(sources, name, options) :
+    output = sources / name
+    mapping_commands.CommandExport().run([f"--icon={sources / 'icons'}", f"--config={sources / 'config.csv'}", 
+                                          f"--path={output}", "--icon_cache=", "--progress_interval=0", 
+                                          "--filetype=svg"] + options + [str(sources / "document.svg")], 
+                                         output=open(os.devnull, "wb"))
+    return dict((file_name, (output / file_name).read_bytes()) for file_name in sorted(os.listdir(output)))
+
+#######################################################################################################################
+
+def test_outlined_labels_keep_the_boxes_of_the_texts(sources, extension_folder, monkeypatch) :
+    monkeypatch.setattr(mapping_commands, "create_renderer", lambda *args : StubRenderer())
+    monkeypatch.setattr(compute_svg, "convert_text_to_paths", outline_texts)
+    with open(sources / "config.csv", "w") as file :
+        for commands in itertools.islice(itertools.permutations(COMMANDS), 0, 300, 100) :
+            file.write(",".join(f"{slot}-{command}" for slot, command in zip(SLOTS, commands)) + "\n")
+    texts = export_documents(sources, "texts", [])
+    labels = export_documents(sources, "labels", ["--outline_text=true"])
+    assert list(labels) == list(texts)
+    for file_name in texts :
+        expected = get_label_boxes(outline_texts(texts[file_name]))
+        boxes = get_label_boxes(labels[file_name])
+        assert len(expected) > 0 and len(boxes) == len(expected)
+        # The transforms are serialized with 6 significant digits
+        assert np.allclose(boxes, expected, atol=1e-3)
@@ -0,0 +1,71 @@
+#! /usr/bin/env python3
+#######################################################################################################################
+#  Copyright (c) 2023 Vincent LAMBERT
+#  License: MIT
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+# 
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+# 
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+#
+#######################################################################################################################
+# NOTES
+#
+# Developing extensions:
+#   SEE: https://inkscape.org/develop/extensions/
+#   SEE: https://wiki.inkscape.org/wiki/Python_modules_for_extensions
+#   SEE: https://wiki.inkscape.org/wiki/Using_the_Command_Line
+#
+# Implementation References:
+#   SEE: https://github.com/nshkurkin/inkscape-export-layer-combos
+
+import threading
+
+import mapping_commands
+
+#######################################################################################################################
+
+class RecordingOutput(object):
+    def __init__(self) :
+        self.files = set()
+    
+    def write(self, label, file_name, content) :
+        self.files.add(file_name)
+    
+    def remove(self, label, file_name) :
+        self.files.discard(file_name)
+
+def test_previews_are_replaced_again_in_the_next_export() :
+    export = mapping_commands.CommandExport()
+    export.parse_arguments(["--preview_dpi=30", "--filetype=png"])
+    export.output = RecordingOutput()
+    export.replaced_previews = set()
+    export.preview_lock = threading.Lock()
+    file_name = export.get_preview_file_name("mapping")
+    
+    export.reset_previews()
+    export.write_preview("mapping", file_name, b"")
+    export.replace_preview("mapping")
+    # A preview rendered after the raster of its mapping is not written
+    export.write_preview("mapping", file_name, b"")
+    assert export.output.files == set()
+    
+    # The mapping is exported again after a change of the sources
+    export.reset_previews()
+    export.write_preview("mapping", file_name, b"")
+    assert export.output.files == {file_name}
+    export.replace_preview("mapping")
+    assert export.output.files == set()
@@ -0,0 +1,67 @@
+#! /usr/bin/env python3
+#######################################################################################################################
+#  Copyright (c) 2023 Vincent LAMBERT
+#  License: MIT
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+# 
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+# 
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+#
+#######################################################################################################################
+# NOTES
+#
+# Developing extensions:
+#   SEE: https://inkscape.org/develop/extensions/
+#   SEE: https://wiki.inkscape.org/wiki/Python_modules_for_extensions
+#   SEE: https://wiki.inkscape.org/wiki/Using_the_Command_Line
+#
+# Implementation References:
+#   SEE: https://github.com/nshkurkin/inkscape-export-layer-combos
+
+from progress import *
+
+#######################################################################################################################
+
+def logit(*args, **kwargs) :
+    pass
+
+def test_start_resets_the_counters_of_the_previous_export() :
+    progress = ProgressTracker(0, None, logit)
+    progress.start(4, 3)
+    for label in ["a", "b", "c"] :
+        progress.expect(label, 2)
+        progress.render_ended(label, True)
+        progress.render_ended(label, label != "c")
+    progress.aliased()
+    with progress.time(BUILD) :
+        pass
+    status = progress.get_status()
+    assert (status["mappings_done"], status["renders_done"], status["render_jobs_done"], status["render_failures"]) == (4, 3, 6, 1)
+    
+    # The next export of a watch only renders the affected mappings
+    progress.start(2, 1)
+    status = progress.get_status()
+    assert (status["mappings_done"], status["mappings_total"], status["renders_done"], status["renders_total"]) == (0, 2, 0, 1)
+    assert (status["render_jobs_done"], status["render_failures"]) == (0, 0)
+    assert status["stages"][BUILD]["count"] == 0
+    progress.expect("d", 1)
+    progress.render_ended("d", True)
+    progress.aliased()
+    status = progress.get_status()
+    assert (status["mappings_done"], status["renders_done"]) == (2, 1)
+    assert status["eta_seconds"] == 0
+    progress.close()
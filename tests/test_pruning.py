@@ -0,0 +1,99 @@
+#! /usr/bin/env python3
+#######################################################################################################################
+#  Copyright (c) 2023 Vincent LAMBERT
+#  License: MIT
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+# 
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+# 
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+#
+#######################################################################################################################
+# NOTES
+#
+# Developing extensions:
+#   SEE: https://inkscape.org/develop/extensions/
+#   SEE: https://wiki.inkscape.org/wiki/Python_modules_for_extensions
+#   SEE: https://wiki.inkscape.org/wiki/Using_the_Command_Line
+#
+# Implementation References:
+#   SEE: https://github.com/nshkurkin/inkscape-export-layer-combos
+
+import glob
+import itertools
+import os
+
+from lxml import etree
+
+import mapping_commands
+from conftest import SLOTS, COMMANDS
+
+#######################################################################################################################
+
+SVG_NS = "{http://www.w3.org/2000/svg}"
+NAMEDVIEW = "{http://sodipodi.sourceforge.net/DTD/sodipodi-0.dtd}namedview"
+INKSCAPE_NS = "{http://www.inkscape.org/namespaces/inkscape}"
+
+class StubRenderer(object):
+    filetypes = []
+    
+    def close(self) :
+        pass
+
+def add_definitions(path) :
+    """
+    Add a gradient used through another one, an unused gradient and a hidden unreferenced group
+    """
+    document = etree.parse(str(path))
+    root = document.getroot()
+    defs = root.find(f"{SVG_NS}defs")
+    etree.SubElement(defs, f"{SVG_NS}linearGradient", id="stops").append(etree.Element(f"{SVG_NS}stop", offset="0"))
+    etree.SubElement(defs, f"{SVG_NS}linearGradient", {"id" : "used", "{http://www.w3.org/1999/xlink}href" : "#stops"})
+    etree.SubElement(defs, f"{SVG_NS}linearGradient", id="unused")
+    layer = root.find(f"{SVG_NS}g")
+    etree.SubElement(layer, f"{SVG_NS}rect", id="filled", width="1", height="1", style="fill:url(#used)")
+    etree.SubElement(layer, f"{SVG_NS}g", id="hidden", style="display:none")
+    document.write(str(path))
+
+#######################################################################################################################
+
+def test_pruned_export_keeps_what_is_rendered(sources, extension_folder, monkeypatch) :
+    monkeypatch.setattr(mapping_commands, "create_renderer", lambda *args : StubRenderer())
+    add_definitions(sources / "document.svg")
+    with open(sources / "config.csv", "w") as file :
+        for commands in itertools.islice(itertools.permutations(COMMANDS), 2) :
+            file.write(",".join(f"{slot}-{command}" for slot, command in zip(SLOTS, commands)) + "\n")
+    mapping_commands.CommandExport().run([f"--icon={sources / 'icons'}", f"--config={sources / 'config.csv'}", 
+                                          f"--path={sources / 'output'}", "--icon_cache=", "--progress_interval=0", 
+                                          "--filetype=svg", "--prune=true", str(sources / "document.svg")], 
+                                         output=open(os.devnull, "wb"))
+    
+    source = etree.parse(str(sources / "document.svg")).getroot()
+    layer_ids = set(layer.get("id") for layer in source.iterfind(".//*[@mgrep-microgesture-layer]"))
+    exported = sorted(glob.glob(str(sources / "output" / "**" / "*.svg"), recursive=True))
+    assert len(exported) == 2
+    for path in exported :
+        root = etree.parse(path).getroot()
+        ids = set(element.get("id") for element in root.iter() if isinstance(element.tag, str))
+        assert layer_ids <= ids
+        assert {"used", "stops", "filled"} <= ids
+        assert len({"unused", "hidden"} & ids) == 0
+        # Inkscape renders the page background from the named view
+        namedview = root.find(NAMEDVIEW)
+        assert namedview is not None
+        assert (namedview.get("pagecolor"), namedview.get(f"{INKSCAPE_NS}pageopacity")) == ("#ffffff", "1")
+        assert namedview.get(f"{INKSCAPE_NS}zoom") is None
+        assert len(namedview) == 0
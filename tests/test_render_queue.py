@@ -0,0 +1,79 @@
+#! /usr/bin/env python3
+#######################################################################################################################
+#  Copyright (c) 2023 Vincent LAMBERT
+#  License: MIT
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+# 
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+# 
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+#
+#######################################################################################################################
+# NOTES
+#
+# Developing extensions:
+#   SEE: https://inkscape.org/develop/extensions/
+#   SEE: https://wiki.inkscape.org/wiki/Python_modules_for_extensions
+#   SEE: https://wiki.inkscape.org/wiki/Using_the_Command_Line
+#
+# Implementation References:
+#   SEE: https://github.com/nshkurkin/inkscape-export-layer-combos
+
+import render_queue
+from render_queue import *
+
+#######################################################################################################################
+
+def logit(*args, **kwargs) :
+    pass
+
+def test_a_failing_render_frees_its_slot_during_the_backoff(monkeypatch) :
+    monkeypatch.setattr(render_queue, "RETRY_BACKOFF", 0.5)
+    scheduler = RenderScheduler(1, 10.0, 1, logit)
+    attempts = []
+    ended = []
+    
+    def fail_once(document) :
+        attempts.append(document)
+        if len(attempts) == 1 :
+            raise RuntimeError("crashed")
+        return document
+    
+    try :
+        scheduler.submit("failing", b"failing", [fail_once], ended.append)
+        scheduler.submit("healthy", b"healthy", [lambda document : document], ended.append)
+    finally :
+        scheduler.close()
+    # The healthy render runs during the backoff of the failing one, in the only slot
+    assert ended == [b"healthy", b"failing"]
+    assert len(attempts) == 2
+    scheduler.report_failures()
+
+def test_a_render_failing_every_attempt_is_reported(monkeypatch) :
+    monkeypatch.setattr(render_queue, "RETRY_BACKOFF", 0.01)
+    scheduler = RenderScheduler(2, 10.0, 2, logit)
+    attempts = []
+    
+    def fail(document) :
+        attempts.append(document)
+        raise RuntimeError("crashed")
+    
+    try :
+        scheduler.submit("failing", b"failing", [fail], attempts.append)
+    finally :
+        scheduler.close()
+    assert len(attempts) == 3
+    assert list(scheduler.failures) == ["failing"]
@@ -0,0 +1,78 @@
+#! /usr/bin/env python3
+#######################################################################################################################
+#  Copyright (c) 2023 Vincent LAMBERT
+#  License: MIT
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+# 
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+# 
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+#
+#######################################################################################################################
+# NOTES
+#
+# Developing extensions:
+#   SEE: https://inkscape.org/develop/extensions/
+#   SEE: https://wiki.inkscape.org/wiki/Python_modules_for_extensions
+#   SEE: https://wiki.inkscape.org/wiki/Using_the_Command_Line
+#
+# Implementation References:
+#   SEE: https://github.com/nshkurkin/inkscape-export-layer-combos
+
+import itertools
+import os
+import shutil
+
+import pytest
+
+import mapping_commands
+from conftest import SLOTS, COMMANDS
+
+#######################################################################################################################
+
+class StubRenderer(object):
+    filetypes = []
+    
+    def close(self) :
+        pass
+
+def export_documents(sources, name, options) :
+    """
+    Export the documents of the configuration as svg files and return their contents by file name
+    """
+    output = sources / name
+    mapping_commands.CommandExport().run([f"--icon={sources / 'icons'}", f"--config={sources / 'config.csv'}", 
+                                          f"--path={output}", "--icon_cache=", "--progress_interval=0", 
+                                          "--filetype=svg"] + options + [str(sources / "document.svg")], 
+                                         output=open(os.devnull, "wb"))
+    return dict((file_name, (output / file_name).read_bytes()) for file_name in os.listdir(output))
+
+#######################################################################################################################
+
+@pytest.mark.parametrize("options", [[], ["--minify=true"], ["--prune=true"], 
+    pytest.param(["--outline_text=true"], marks=pytest.mark.skipif(shutil.which("inkscape") is None, reason="Inkscape outlines the labels")),
+    pytest.param(["--outline_text=true", "--minify=true"], marks=pytest.mark.skipif(shutil.which("inkscape") is None, reason="Inkscape outlines the labels"))])
+def test_spliced_documents_are_the_built_ones(sources, extension_folder, monkeypatch, options) :
+    if "--outline_text=true" not in options :
+        monkeypatch.setattr(mapping_commands, "create_renderer", lambda *args : StubRenderer())
+    with open(sources / "config.csv", "w") as file :
+        # Mappings sharing commands reuse the fragments of the splicer
+        for commands in itertools.islice(itertools.permutations(COMMANDS), 0, 600, 100) :
+            file.write(",".join(f"{slot}-{command}" for slot, command in zip(SLOTS, commands)) + "\n")
+    built = export_documents(sources, "built", options)
+    spliced = export_documents(sources, "spliced", options + ["--splice=true"])
+    assert len(built) == 6
+    assert spliced == built
@@ -0,0 +1,88 @@
+#! /usr/bin/env python3
+#######################################################################################################################
+#  Copyright (c) 2023 Vincent LAMBERT
+#  License: MIT
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+# 
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+# 
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+#
+#######################################################################################################################
+# NOTES
+#
+# Developing extensions:
+#   SEE: https://inkscape.org/develop/extensions/
+#   SEE: https://wiki.inkscape.org/wiki/Python_modules_for_extensions
+#   SEE: https://wiki.inkscape.org/wiki/Using_the_Command_Line
+#
+# Implementation References:
+#   SEE: https://github.com/nshkurkin/inkscape-export-layer-combos
+
+import pytest
+
+import validation
+from validation import *
+from conftest import SLOTS, COMMANDS
+
+#######################################################################################################################
+
+def logit(*args, **kwargs) :
+    pass
+
+# Every slot has a layer except flex_down
+MG_LAYER_REFS = {"tap" : {"tip" : [1], "middle" : [1], "base" : [1]}, "swipe" : {"up" : [1], "down" : [1]}, 
+                 "flex" : {"up" : [1], "down" : []}}
+
+def get_rows() :
+    valid = [f"{slot}-{command}" for slot, command in zip(SLOTS[:-1], COMMANDS)]
+    rows = [(line, valid) for line in range(1, 101)]
+    rows += [(101, valid[:-1] + ["flex_down-banana"]), 
+             (102, valid[:-1] + ["tapmiddle-banana"]), 
+             (103, valid[:-1] + ["wiggle_up-banana"]), 
+             (104, valid + ["tap_tip-kiwi"]), 
+             (105, valid[:-1] + ["flex_up-durian"])]
+    rows += [(line, valid[:-1] + ["flex_down-plum"]) for line in range(106, 206)]
+    return rows
+
+#######################################################################################################################
+
+def test_errors_are_reported_by_row_and_warnings_by_gesture(monkeypatch) :
+    monkeypatch.setattr(validation, "VALIDATION_CHUNK_SIZE", 16)
+    report = validate_configuration(get_rows(), MG_LAYER_REFS, COMMANDS, logit)
+    assert report.row_count == 205
+    assert not report.is_valid()
+    assert report.get_invalid_lines() == [102, 103, 104, 105]
+    kinds = dict((line, [kind for kind, _, _ in problems]) for line, problems in report.problems.items())
+    assert kinds == {102 : [MALFORMED], 103 : [UNKNOWN_GESTURE], 104 : [DUPLICATE_GESTURE], 105 : [MISSING_ICON]}
+    # The rows only drawing nothing for a gesture are valid and counted once for it
+    assert list(report.warnings) == [(MISSING_LAYER, "flex_down")]
+    message, count, first_line = report.warnings[(MISSING_LAYER, "flex_down")]
+    assert (count, first_line) == (101, 101)
+    assert len(report.mappings) == 201
+    assert sum(1 for _ in report.mappings) == 201
+    assert len(report.to_dict()["warnings"]) == 1
+
+def test_report_logs_a_bounded_number_of_lines() :
+    rows = [(line, [f"tap_tip-durian{line}", "flex_down-banana"]) for line in range(1, 1001)]
+    report = validate_configuration(rows, MG_LAYER_REFS, COMMANDS, logit)
+    lines = str(report).split("\n")
+    assert lines[0] == "Configuration check: 1000 invalid rows out of 1000"
+    assert len(lines) == 1 + MAX_REPORTED_ERRORS + 2
+    assert lines[-2] == f"  ... and {1000 - MAX_REPORTED_ERRORS} more errors"
+    assert lines[-1] == "  warning: no layer for gesture 'flex_down', nothing is drawn, used by 1000 rows, first at line 1"
+    with pytest.raises(ValidationError) :
+        check_configuration(rows, MG_LAYER_REFS, COMMANDS, logit)
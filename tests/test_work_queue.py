@@ -0,0 +1,152 @@
+#! /usr/bin/env python3
+#######################################################################################################################
+#  Copyright (c) 2023 Vincent LAMBERT
+#  License: MIT
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+# 
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+# 
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+#
+#######################################################################################################################
+# NOTES
+#
+# Developing extensions:
+#   SEE: https://inkscape.org/develop/extensions/
+#   SEE: https://wiki.inkscape.org/wiki/Python_modules_for_extensions
+#   SEE: https://wiki.inkscape.org/wiki/Using_the_Command_Line
+#
+# Implementation References:
+#   SEE: https://github.com/nshkurkin/inkscape-export-layer-combos
+
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import work_queue
+from work_queue import *
+
+#######################################################################################################################
+
+JOBS = [(f"mapping{index}", f"row{index}", "") for index in range(12)]
+
+def logit(*args, **kwargs) :
+    pass
+
+#######################################################################################################################
+
+def test_expired_leases_are_leased_again(tmp_path) :
+    queue = WorkQueue(str(tmp_path / "queue.sqlite"), 0.2, logit)
+    assert queue.fill("a", JOBS[:3])
+    leased = [label for label, _, _ in queue.lease("a", 2)]
+    assert leased == ["mapping0", "mapping1"]
+    assert [label for label, _, _ in queue.lease("b", 2)] == ["mapping2"]
+    assert queue.lease("b", 2) == []
+    
+    time.sleep(0.3)
+    assert [label for label, _, _ in queue.lease("b", 2)] == leased
+    # The jobs of the expired lease are not completed by their first worker anymore
+    assert queue.renew("a", leased) == leased
+    queue.complete("a", leased)
+    assert queue.get_counts() == {LEASED : 3}
+    queue.complete("b", ["mapping0", "mapping1", "mapping2"])
+    assert queue.get_counts() == {DONE : 3}
+    assert queue.get_next_expiry() is None
+    queue.close()
+
+def test_renewed_leases_are_kept(tmp_path) :
+    queue = WorkQueue(str(tmp_path / "queue.sqlite"), 0.2, logit)
+    queue.fill("a", JOBS[:2])
+    leased = [label for label, _, _ in queue.lease("a", 2)]
+    for _ in range(4) :
+        time.sleep(0.1)
+        assert queue.renew("a", leased) == []
+        assert queue.lease("b", 2) == []
+    queue.complete("a", leased)
+    assert queue.get_counts() == {DONE : 2}
+    queue.close()
+
+def test_two_workers_export_every_job_once(tmp_path) :
+    exported = {"a" : [], "b" : []}
+    
+    def work(worker) :
+        queue = WorkQueue(str(tmp_path / "queue.sqlite"), 60.0, logit)
+        queue.fill(worker, JOBS)
+        while True :
+            batch = queue.lease(worker, 2)
+            if len(batch) == 0 :
+                break
+            time.sleep(0.01)
+            exported[worker].extend(label for label, _, _ in batch)
+            queue.complete(worker, [label for label, _, _ in batch])
+        queue.close()
+    
+    workers = [threading.Thread(target=work, args=(worker,)) for worker in exported]
+    for worker in workers :
+        worker.start()
+    for worker in workers :
+        worker.join()
+    labels = exported["a"] + exported["b"]
+    assert sorted(labels) == sorted(label for label, _, _ in JOBS)
+    assert len(exported["a"]) > 0 and len(exported["b"]) > 0
+
+def test_a_single_worker_sets_the_empty_queue_up(tmp_path, monkeypatch) :
+    monkeypatch.setattr(work_queue, "QUEUE_POLL_INTERVAL", 0.05)
+    path = str(tmp_path / "queue.sqlite")
+    WorkQueue(path, 60.0, logit).close()
+    setups = []
+    results = dict()
+    
+    def set_up(worker) :
+        # The setup runs out of any transaction, the database stays writable
+        connection = sqlite3.connect(path, timeout=0.5, isolation_level=None)
+        connection.execute("BEGIN IMMEDIATE")
+        connection.execute("ROLLBACK")
+        connection.close()
+        time.sleep(0.2)
+        setups.append(worker)
+    
+    def fill(worker) :
+        queue = WorkQueue(path, 60.0, logit)
+        results[worker] = queue.fill(worker, JOBS, lambda : set_up(worker))
+        # The queue is set up before any worker can lease its jobs
+        results[worker] = (results[worker], len(setups), len(queue.lease(worker, 1)))
+        queue.close()
+    
+    workers = [threading.Thread(target=fill, args=(f"worker{index}",)) for index in range(4)]
+    for worker in workers :
+        worker.start()
+    for worker in workers :
+        worker.join()
+    assert len(setups) == 1
+    assert sorted(results.values()) == [(False, 1, 1)] * 3 + [(True, 1, 1)]
+    assert results[setups[0]][0]
+
+def test_a_failed_setup_is_claimed_again(tmp_path) :
+    queue = WorkQueue(str(tmp_path / "queue.sqlite"), 60.0, logit)
+    
+    def fail() :
+        raise RuntimeError("setup failed")
+    
+    with pytest.raises(RuntimeError) :
+        queue.fill("a", JOBS, fail)
+    assert queue.get_counts() == {}
+    assert queue.fill("b", JOBS, lambda : None)
+    assert not queue.fill("a", JOBS, lambda : None)
+    assert queue.get_counts() == {PENDING : len(JOBS)}
+    queue.close()